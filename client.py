@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2013 Andrian Nord
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#
+# A thin client for the "main.py --serve" decompilation server. It imports
+# only the client part of ljd, so it starts much faster than main.py.
+#
+
+import argparse
+import sys
+
+import ljd.client
+
+
+def main():
+    args = _parse_arguments()
+
+    mode = "asm" if args.asm else "lua"
+
+    client = ljd.client.Client(args.socket)
+
+    retval = 0
+
+    try:
+        for path in args.files:
+            if path == "-":
+                data = sys.stdin.buffer.read()
+                response = client.decompile_bytes(data, "<stdin>", mode)
+            else:
+                response = client.decompile_file(path, mode)
+
+            if response["ok"]:
+                sys.stdout.write(response["output"])
+            else:
+                print(path + ": " + response["error"], file=sys.stderr)
+                retval = 1
+    finally:
+        client.close()
+
+    return retval
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Client for the LuaJIT decompilation server")
+
+    parser.add_argument("files", nargs="+", metavar="file",
+        help="raw LuaJIT bytecode dump, \"-\" to read it from stdin")
+
+    parser.add_argument("-s", "--socket", required=True,
+        help="unix domain socket of the server")
+
+    parser.add_argument("--asm", action="store_true",
+        help="request the disassembly instead of the decompiled source")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,7 @@
 
 #zzw 20180714 support str encode
-gFlagDic = {'strEncode' : 'ascii'}
\ No newline at end of file
+# validate - percentage of the functions to check the AST of, 0 to skip
+# budget_seconds, budget_steps - limits of the work on a single function
+# fallback - errors to write the disassembly of a function on, see ljd.pipeline
+gFlagDic = {'strEncode' : 'ascii', 'validate' : 0,
+    'budget_seconds' : None, 'budget_steps' : None, 'fallback' : 'budget'}
\ No newline at end of file
@@ -0,0 +1,4 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
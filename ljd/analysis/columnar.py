@@ -0,0 +1,238 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import ljd.bytecode.instructions as ins
+import ljd.rawdump.code
+import ljd.rawdump.prototype
+import ljd.rawdump.scanner as scanner
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+OPCODES_COUNT = 256
+
+_JUMP_BIAS = 0x8000
+
+# Per raw opcode lookup tables, built on the first use
+_tables = None
+
+
+class Columns():
+	def __init__(self):
+		self.origin = ""
+
+		# One element per instruction, the function headers are not
+		# stored in the dump and are not here either. B is zero for
+		# the instructions without it.
+		self.opcode = None
+		self.A = None
+		self.B = None
+		self.CD = None
+
+		# One element per prototype, in the dump order - the children
+		# go first and the main prototype is the last one. The offsets
+		# have an extra element with the total instructions count, so
+		# the prototype i spans offsets[i]:offsets[i + 1].
+		self.offsets = None
+		self.flags = None
+		self.framesizes = None
+
+	def __len__(self):
+		return len(self.opcode)
+
+	@property
+	def prototypes_count(self):
+		return len(self.flags)
+
+	def prototype_index(self):
+		counts = numpy.diff(self.offsets)
+
+		return numpy.repeat(numpy.arange(len(counts)), counts)
+
+	# Instruction addresses inside their prototypes, as in the disassembly
+	def addresses(self):
+		starts = numpy.repeat(self.offsets[:-1], numpy.diff(self.offsets))
+
+		return numpy.arange(len(self.opcode)) - starts + 1
+
+
+class Corpus():
+	def __init__(self):
+		self.files_count = 0
+		self.prototypes_count = 0
+		self.instructions_count = 0
+
+		self.histogram = None
+		self.bigrams = None
+
+		self.ffi_files = []
+		self.iloop_files = []
+
+		# File name to the error message
+		self.errors = {}
+
+	def add(self, columns):
+		if self.histogram is None:
+			self.histogram = numpy.zeros(OPCODES_COUNT, numpy.int64)
+			self.bigrams = numpy.zeros((OPCODES_COUNT, OPCODES_COUNT),
+								numpy.int64)
+
+		self.files_count += 1
+		self.prototypes_count += columns.prototypes_count
+		self.instructions_count += len(columns)
+
+		self.histogram += histogram(columns)
+		self.bigrams += bigrams(columns)
+
+		if numpy.any(columns.flags & ljd.rawdump.prototype.FLAG_HAS_FFI):
+			self.ffi_files.append(columns.origin)
+
+		if numpy.any(columns.flags
+				& ljd.rawdump.prototype.FLAG_HAS_ILOOP):
+			self.iloop_files.append(columns.origin)
+
+
+def from_bytes(data, origin=""):
+	_require_numpy()
+
+	summary = scanner.Summary()
+	layouts = []
+
+	scanner.walk(data, 0, summary, layouts)
+
+	dtype = ">u4" if summary.is_big_endian else "<u4"
+
+	words = numpy.concatenate([numpy.zeros(0, dtype)] + [
+		numpy.frombuffer(data, dtype, layout.instructions_count,
+						layout.instructions_offset)
+			for layout in layouts
+	]).astype(numpy.uint32)
+
+	tables = _get_tables()
+
+	columns = Columns()
+	columns.origin = origin
+
+	columns.opcode = (words & 0xFF).astype(numpy.uint8)
+	columns.A = ((words >> 8) & 0xFF).astype(numpy.uint8)
+
+	D = (words >> 16).astype(numpy.uint16)
+	has_B = tables.has_B[columns.opcode]
+
+	columns.B = numpy.where(has_B, D >> 8, 0).astype(numpy.uint8)
+	columns.CD = numpy.where(has_B, D & 0xFF, D).astype(numpy.uint16)
+
+	counts = [layout.instructions_count for layout in layouts]
+
+	columns.offsets = numpy.zeros(len(layouts) + 1, numpy.int64)
+	numpy.cumsum(counts, out=columns.offsets[1:])
+
+	columns.flags = numpy.array([layout.flags for layout in layouts],
+								numpy.uint8)
+	columns.framesizes = numpy.array(
+				[layout.framesize for layout in layouts],
+								numpy.uint8)
+
+	return columns
+
+
+def from_file(filename):
+	with open(filename, 'rb') as fd:
+		data = fd.read()
+
+	return from_bytes(data, filename)
+
+
+def aggregate(filenames):
+	_require_numpy()
+
+	corpus = Corpus()
+
+	for filename in filenames:
+		try:
+			columns = from_file(filename)
+		except (OSError, scanner.ScanError) as e:
+			corpus.errors[filename] = str(e)
+			continue
+
+		corpus.add(columns)
+
+	return corpus
+
+
+def opcode_names():
+	return [ljd.rawdump.code.get_definition(opcode).name
+					for opcode in range(OPCODES_COUNT)]
+
+
+def histogram(columns):
+	return numpy.bincount(columns.opcode, minlength=OPCODES_COUNT)
+
+
+# Counts of the adjacent opcode pairs inside the same prototype
+def bigrams(columns):
+	pairs = columns.opcode[:-1].astype(numpy.int64) * OPCODES_COUNT \
+					+ columns.opcode[1:]
+
+	index = columns.prototype_index()
+	pairs = pairs[index[:-1] == index[1:]]
+
+	counts = numpy.bincount(pairs, minlength=OPCODES_COUNT ** 2)
+
+	return counts.reshape(OPCODES_COUNT, OPCODES_COUNT)
+
+
+# Jump target addresses in the disassembly terms, -1 for the non-jumps
+def jump_targets(columns):
+	is_jump = _get_tables().is_jump[columns.opcode]
+
+	targets = columns.addresses() + 1 \
+			+ columns.CD.astype(numpy.int64) - _JUMP_BIAS
+
+	return numpy.where(is_jump, targets, -1)
+
+
+# Instructions writing the slot A, or only the given slot
+def slot_writes(columns, slot=None):
+	mask = _get_tables().writes_A[columns.opcode]
+
+	if slot is not None:
+		mask &= columns.A == slot
+
+	return mask
+
+
+class _Tables():
+	def __init__(self):
+		definitions = [ljd.rawdump.code.get_definition(opcode)
+					for opcode in range(OPCODES_COUNT)]
+
+		self.has_B = numpy.array(
+			[definition.args_count == 3 for definition in definitions])
+
+		self.is_jump = numpy.array(
+			[definition.CD_type == ins.T_JMP
+					for definition in definitions])
+
+		self.writes_A = numpy.array(
+			[definition.A_type == ins.T_DST
+					for definition in definitions])
+
+
+def _get_tables():
+	global _tables
+
+	if _tables is None:
+		_tables = _Tables()
+
+	return _tables
+
+
+def _require_numpy():
+	if numpy is None:
+		raise ImportError("NumPy is required for the columnar"
+					" instruction arrays")
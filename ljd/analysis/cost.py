@@ -0,0 +1,192 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+#
+# Where the decompilation time goes: the features of the prototypes and the
+# least squares fit of the time on them, written by main.py --calibrate. The
+# coefficients are for a reader to compare, nothing picks the model up.
+#
+
+import io
+import json
+import time
+
+import ljd.bytecode.instructions as ins
+import ljd.bytecode.prototype
+import ljd.lua.writer
+import ljd.pipeline
+
+
+# The unwarper work grows with the jumps of a function much faster than
+# linearly, hence the squared jumps
+FEATURES = (
+	"instructions",
+	"jumps",
+	"backward_jumps",
+	"squared_jumps",
+	"max_framesize",
+	"children"
+)
+
+# Keeps the fit solvable when a feature is the same in all the samples
+_RIDGE = 1e-9
+
+
+class Features():
+	def __init__(self):
+		self.instructions = 0
+		self.jumps = 0
+		self.backward_jumps = 0
+		self.squared_jumps = 0
+		self.max_framesize = 0
+		self.children = 0
+
+	def as_vector(self):
+		return [getattr(self, name) for name in FEATURES]
+
+
+class Model():
+	def __init__(self, intercept, coefficients):
+		self.intercept = intercept
+		self.coefficients = tuple(coefficients)
+
+	# Estimated decompilation time in seconds
+	def predict(self, features):
+		cost = self.intercept
+
+		for coefficient, value in zip(self.coefficients,
+							features.as_vector()):
+			cost += coefficient * value
+
+		return max(cost, 0.0)
+
+	def as_dict(self):
+		return {
+			"intercept": self.intercept,
+			"coefficients": dict(zip(FEATURES, self.coefficients))
+		}
+
+
+# Features of the prototype and all of its children
+def extract(prototype):
+	features = Features()
+
+	pending = [prototype]
+
+	while len(pending) > 0:
+		prototype = pending.pop()
+
+		jumps = 0
+
+		for instruction in prototype.instructions[1:]:
+			if instruction.CD_type != ins.T_JMP:
+				continue
+
+			jumps += 1
+
+			if instruction.CD < 0:
+				features.backward_jumps += 1
+
+		features.instructions += len(prototype.instructions) - 1
+		features.jumps += jumps
+		features.squared_jumps += jumps * jumps
+
+		features.max_framesize = max(features.max_framesize,
+							prototype.framesize)
+
+		for constant in prototype.constants.complex_constants:
+			if isinstance(constant, ljd.bytecode.prototype.Prototype):
+				features.children += 1
+				pending.append(constant)
+
+	return features
+
+
+def save(fd, model):
+	json.dump(model.as_dict(), fd, indent=1, sort_keys=True)
+	fd.write("\n")
+
+
+# Time of the whole decompilation - the passes and the writer, the best one of
+# the repeats to keep the noise out. A function falling back would be timed
+# short of the real work, so there is neither budget nor fallback here - the
+# errors are passed on and the sample is to be skipped.
+def measure(prototype, repeats=3):
+	manager = ljd.pipeline.create_default_manager(validate=0)
+	manager.budget = None
+	manager.fallback = ljd.pipeline.FALLBACK_OFF
+
+	best = None
+
+	for i in range(repeats):
+		start = time.perf_counter()
+
+		ast = ljd.pipeline.decompile(prototype, manager)
+		ljd.lua.writer.write(io.StringIO(), ast)
+
+		elapsed = time.perf_counter() - start
+
+		if best is None or elapsed < best:
+			best = elapsed
+
+	return best
+
+
+#
+# Least squares fit of the (Features, seconds) samples, solved through the
+# normal equations - there are just a few features, so no need for NumPy here
+#
+def fit(samples):
+	rows = [[1.0] + features.as_vector() for features, _seconds in samples]
+	targets = [seconds for _features, seconds in samples]
+
+	size = len(FEATURES) + 1
+
+	matrix = [[0.0] * size for i in range(size)]
+	vector = [0.0] * size
+
+	for row, target in zip(rows, targets):
+		for i in range(size):
+			vector[i] += row[i] * target
+
+			for j in range(size):
+				matrix[i][j] += row[i] * row[j]
+
+	for i in range(size):
+		matrix[i][i] += _RIDGE * (matrix[i][i] + 1.0)
+
+	solution = _solve(matrix, vector)
+
+	return Model(solution[0], solution[1:])
+
+
+def _solve(matrix, vector):
+	size = len(vector)
+
+	for column in range(size):
+		pivot = max(range(column, size),
+				key=lambda row: abs(matrix[row][column]))
+
+		matrix[column], matrix[pivot] = matrix[pivot], matrix[column]
+		vector[column], vector[pivot] = vector[pivot], vector[column]
+
+		for row in range(column + 1, size):
+			factor = matrix[row][column] / matrix[column][column]
+
+			for i in range(column, size):
+				matrix[row][i] -= factor * matrix[column][i]
+
+			vector[row] -= factor * vector[column]
+
+	solution = [0.0] * size
+
+	for row in reversed(range(size)):
+		value = vector[row]
+
+		for i in range(row + 1, size):
+			value -= matrix[row][i] * solution[i]
+
+		solution[row] = value / matrix[row][row]
+
+	return solution
@@ -41,6 +41,7 @@ def _build_function_definition(prototype):
 	node._upvalues = prototype.constants.upvalue_references
 	node._debuginfo = prototype.debuginfo
 	node._instructions_count = len(prototype.instructions)
+	node._prototype = prototype
 
 	node.arguments.contents = _build_function_arguments(state, prototype)
 
@@ -50,6 +51,7 @@ def _build_function_definition(prototype):
 	instructions = prototype.instructions
 	#print (len(instructions))
 	node.statements.contents = _build_function_blocks(state, instructions)
+	node._is_flow_only = _is_flow_only(node.statements.contents)
 
 	return node
 
@@ -97,6 +99,17 @@ def _build_function_blocks(state, instructions):
 	return state.blocks
 
 
+def _is_flow_only(blocks):
+	for block in blocks[:-1]:
+		warp = block.warp
+
+		if not isinstance(warp, nodes.UnconditionalWarp) \
+				or warp.type != nodes.UnconditionalWarp.T_FLOW:
+			return False
+
+	return True
+
+
 _JUMP_WARP_INSTRUCTIONS = set((
 	ins.UCLO.opcode,
 	ins.ISNEXT.opcode,
@@ -704,54 +717,12 @@ def _build_function(state, slot):
 def _build_table_copy(state, slot):
 	node = nodes.TableConstructor()
 
-	table = state.constants.complex_constants[slot]
-
-	i = 0
-
-	for value in table.array:
-		record = nodes.ArrayRecord()
-		record.value = _build_table_record_item(value)
-
-		node.array.contents.append(record)
-
-		i += 1
-
-	for key, value in table.dictionary:
-		record = nodes.TableRecord()
-		record.key = _build_table_record_item(key)
-		record.value = _build_table_record_item(value)
-
-		node.records.contents.append(record)
+	# The records are built only if some pass needs them
+	node._template = state.constants.complex_constants[slot]
 
 	return node
 
 
-def _build_table_record_item(value):
-	if value is None:
-		item = nodes.Primitive()
-		item.type = nodes.Primitive.T_NIL
-	elif value is True:
-		item = nodes.Primitive()
-		item.type = nodes.Primitive.T_TRUE
-	elif value is False:
-		item = nodes.Primitive()
-		item.type = nodes.Primitive.T_FALSE
-	elif isinstance(value, int):
-		item = nodes.Constant()
-		item.value = value
-		item.type = nodes.Constant.T_INTEGER
-	elif isinstance(value, float):
-		item = nodes.Constant()
-		item.value = value
-		item.type = nodes.Constant.T_FLOAT
-	elif isinstance(value, str):
-		item = nodes.Constant()
-		item.value = value
-		item.type = nodes.Constant.T_STRING
-
-	return item
-
-
 _COMPARISON_MAP = [None] * 255
 
 # Mind the inversion - comparison operators are affecting JMP to the next block
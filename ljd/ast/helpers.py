@@ -1,8 +1,11 @@
 import ljd.ast.nodes as nodes
+import ljd.ast.structure as structure
 import ljd.ast.traverse as traverse
 
 
 def insert_table_record(constructor, key, value):
+	expand_table_template(constructor)
+
 	array = constructor.array.contents
 	records = constructor.records.contents
 
@@ -54,39 +57,127 @@ def insert_table_record(constructor, key, value):
 		records.append(record)
 
 
+def expand_table_template(constructor):
+	table = constructor._template
+
+	if table is None:
+		return
+
+	constructor._template = None
+
+	array = constructor.array.contents
+	records = constructor.records.contents
+
+	for is_array, key, value in table.items():
+		if is_array:
+			record = nodes.ArrayRecord()
+			record.value = _build_table_record_item(value)
+
+			array.append(record)
+		else:
+			record = nodes.TableRecord()
+			record.key = _build_table_record_item(key)
+			record.value = _build_table_record_item(value)
+
+			records.append(record)
+
+
+def _build_table_record_item(value):
+	if value is None:
+		item = nodes.Primitive()
+		item.type = nodes.Primitive.T_NIL
+	elif value is True:
+		item = nodes.Primitive()
+		item.type = nodes.Primitive.T_TRUE
+	elif value is False:
+		item = nodes.Primitive()
+		item.type = nodes.Primitive.T_FALSE
+	elif isinstance(value, int):
+		item = nodes.Constant()
+		item.value = value
+		item.type = nodes.Constant.T_INTEGER
+	elif isinstance(value, float):
+		item = nodes.Constant()
+		item.value = value
+		item.type = nodes.Constant.T_FLOAT
+	elif isinstance(value, str):
+		item = nodes.Constant()
+		item.value = value
+		item.type = nodes.Constant.T_STRING
+
+	return item
+
+
+# Whether the table - if it is a table element itself, like self.x - is used in
+# the expression, so the expression can't go into the constructor of the table
 def has_same_table(node, table):
-	class Checker(traverse.Visitor):
-		def __init__(self, table):
-			self.found = False
-			self.table = table
+	key = structure.get_key(table)
 
-		def visit_table_element(self, node):
-			if is_equal(self.table, node):
-				self.found = True
+	if key is None:
+		return False
 
-		def _visit(self, node):
-			if not self.found:
-				traverse.Visitor._visit(self, node)
+	return key in get_table_references(node)
 
-		def _visit_list(self, nodes_list):
-			if not self.found:
-				traverse.Visitor._visit_list(self, nodes_list)
 
-	checker = Checker(table)
-	traverse.traverse(checker, node)
+#
+# Structure keys of all the table elements in the expression, nested functions
+# included. The keys are cached on the expression and on every function
+# definition inside until the next structure.invalidate() - the primary pass
+# queries the final expressions only, so a run of N table fills costs O(N),
+# not a walk per fill over the same functions.
+#
+def get_table_references(node):
+	refs = _get_cached_references(node)
 
-	return checker.found
+	if refs is None:
+		collector = _TableReferencesCollector()
+		node._accept(collector)
 
+		refs = frozenset(collector.refs)
+		node._table_refs = (structure.get_generation(), refs)
 
-def is_equal(a, b):
-	if type(a) != type(b):
-		return False
+	return refs
 
-	if isinstance(a, nodes.Identifier):
-		return a.type == b.type and a.slot == b.slot
-	elif isinstance(a, nodes.TableElement):
-		return is_equal(a.table, b.table)		\
-			and is_equal(a.key, b.key)
-	else:
-		assert isinstance(a, nodes.Constant)
-		return a.type == b.type and a.value == b.value
+
+def _get_cached_references(node):
+	cached = getattr(node, "_table_refs", None)
+
+	if cached is None or cached[0] != structure.get_generation():
+		return None
+
+	return cached[1]
+
+
+class _TableReferencesCollector(traverse.Visitor):
+	def __init__(self):
+		self.refs = set()
+
+	def visit_table_element(self, node):
+		key = structure.get_key(node)
+
+		if key is not None:
+			self.refs.add(key)
+
+	def _visit(self, node):
+		refs = _get_cached_references(node)
+
+		if refs is None and isinstance(node, nodes.FunctionDefinition):
+			refs = get_table_references(node)
+
+		if refs is not None:
+			self.refs |= refs
+		else:
+			traverse.Visitor._visit(self, node)
+
+
+#
+# Compares the structure keys, so the result is valid within a single pass run
+# only: the keys cached on the nodes are not updated when a node changes, just
+# dropped by the next structure.invalidate(), which the pass manager calls
+# before every pass. A pass comparing the nodes it has changed itself has to
+# call structure.invalidate() first. The primary pass compares the table
+# expressions and the table element destinations only - it moves them into the
+# constructors, but never changes them.
+#
+def is_equal(a, b):
+	return structure.is_equal(a, b)
@@ -0,0 +1,37 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+#
+# Changes of the functions between the pass manager runs. A function is marked
+# clean with the digest of its tree and is dirty while the digest is not the
+# same, so any rewrite is noticed - in place or not, by a pass or by anything
+# else. The digest of a function covers the nested ones.
+#
+# A fresh function is dirty, as is a function with the blocks still left - the
+# blocks have no digest, see ljd.ast.structure.
+#
+# The digests are cached on the nodes until the next structure.invalidate(),
+# so it has to be called after the tree is changed and before it is checked.
+#
+
+import ljd.ast.structure as structure
+
+
+class Journal():
+	def __init__(self):
+		self._digests = structure.Digests()
+
+	def mark_clean(self, function):
+		function._clean = (self, self._digests.get(function))
+
+	def mark_dirty(self, function):
+		function._clean = None
+
+	def is_dirty(self, function):
+		clean = getattr(function, "_clean", None)
+
+		if clean is None or clean[0] is not self or clean[1] is None:
+			return True
+
+		return self._digests.get(function) != clean[1]
@@ -2,24 +2,95 @@
 # Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
 #
 
+import heapq
 
 import ljd.ast.nodes as nodes
 import ljd.ast.traverse as traverse
 
 
-def mark_locals(ast):
-	traverse.traverse(_LocalsMarker(), ast)
+def mark_locals(ast, nested=True):
+	traverse.traverse(_LocalsMarker(), ast, nested)
 
 
-def mark_local_definitions(ast):
-	traverse.traverse(_LocalDefinitionsMarker(), ast)
+def mark_local_definitions(ast, nested=True):
+	traverse.traverse(_LocalDefinitionsMarker(), ast, nested)
+
+
+#
+# The visible variables at the current address, swept forward through the
+# address ordered starts and ends of the debug info ranges. The slot N is the
+# N-th visible one, just as in DebugInformation.lookup_local_name.
+#
+class _VariablesSweep():
+	def __init__(self, debuginfo):
+		if debuginfo.loader is not None:
+			debuginfo.load()
+
+		self._infos = debuginfo.variable_info
+		self._reset()
+
+	def _reset(self):
+		self.addr = -1
+		self.visible = []
+
+		self._next = 0
+		self._ends = []
+
+	# Moves the sweep to the address, returns True if the visible
+	# variables have changed
+	def advance(self, addr):
+		if addr == self.addr:
+			return False
+
+		changed = False
+
+		if addr < self.addr:
+			self._reset()
+			changed = True
+
+		self.addr = addr
+
+		infos = self._infos
+
+		while self._next < len(infos):
+			info = infos[self._next]
+
+			if info.start_addr > addr:
+				break
+
+			self.visible.append(self._next)
+			heapq.heappush(self._ends, (info.end_addr, self._next))
+
+			self._next += 1
+			changed = True
+
+		ended = set()
+
+		while len(self._ends) > 0 and self._ends[0][0] <= addr:
+			ended.add(heapq.heappop(self._ends)[1])
+
+		if len(ended) > 0:
+			self.visible = [i for i in self.visible if i not in ended]
+			changed = True
+
+		return changed
+
+	def lookup(self, slot):
+		if slot < len(self.visible):
+			return self._infos[self.visible[slot]]
+
+		return None
 
 
 class _LocalsMarker(traverse.Visitor):
 	class _State():
 		def __init__(self):
 			self.pending_slots = {}
-			self.debuginfo = None
+
+			# The slots pending since the last lookup
+			self.new_slots = set()
+
+			self.sweep = None
 			self.addr = -1
 
 	def __init__(self):
@@ -36,18 +107,26 @@ class _LocalsMarker(traverse.Visitor):
 	def _state(self):
 		return self._states[-1]
 
+	# Every pending slot is looked up once the visible variables change,
+	# otherwise only the ones added since the last time
 	def _process_slots(self, addr):
-		debuginfo = self._state().debuginfo
+		state = self._state()
 
-		cleanup = []
+		if state.sweep.advance(addr):
+			slots = list(state.pending_slots.keys())
+		else:
+			slots = [slot for slot in state.new_slots
+						if slot in state.pending_slots]
 
-		for slot, nodes in self._state().pending_slots.items():
-			varinfo = debuginfo.lookup_local_name(addr, slot)
+		state.new_slots.clear()
+
+		for slot in slots:
+			varinfo = state.sweep.lookup(slot)
 
 			if varinfo is None:
 				continue
 
-			cleanup.append(slot)
+			nodes = state.pending_slots.pop(slot)
 
 			if varinfo.type == varinfo.T_INTERNAL:
 				continue
@@ -59,9 +138,6 @@ class _LocalsMarker(traverse.Visitor):
                 #zzw.20180712
 				setattr(node, "_varinfo", varinfo)
 
-		for slot in cleanup:
-			del self._state().pending_slots[slot]
-
 	def _reset_slot(self, slot):
 		self._state().pending_slots.pop(slot, None)
 
@@ -74,7 +150,7 @@ class _LocalsMarker(traverse.Visitor):
 
 	def visit_function_definition(self, node):
 		self._push_state()
-		self._state().debuginfo = node._debuginfo
+		self._state().sweep = _VariablesSweep(node._debuginfo)
 
 	def leave_function_definition(self, node):
 		addr = node._instructions_count
@@ -102,6 +178,8 @@ class _LocalsMarker(traverse.Visitor):
 
 			slots.append(node)
 
+			self._state().new_slots.add(node.slot)
+
 	# ##
 
 	def _process_worthy_node(self, node):
@@ -198,14 +198,16 @@ class MutatorVisitor(traverse.Visitor):
 
 			dst = statement.destinations.contents[0]
 
-			i += self._fill_constructor(dst, src, node.contents[i + 1:])
+			i += self._fill_constructor(dst, src, node.contents, i + 1)
 
 		node.contents = patched
 
-	def _fill_constructor(self, table, constructor, statements):
+	def _fill_constructor(self, table, constructor, statements, start):
 		consumed = 0
 
-		for statement in statements:
+		for i in range(start, len(statements)):
+			statement = statements[i]
+
 			if not isinstance(statement, nodes.Assignment):
 				break
 
@@ -233,13 +235,13 @@ class MutatorVisitor(traverse.Visitor):
 		return consumed
 
 
-def pre_pass(ast):
-	traverse.traverse(SimpleLoopWarpSwapper(), ast)
+def pre_pass(ast, nested=True):
+	traverse.traverse(SimpleLoopWarpSwapper(), ast, nested)
 
 	return ast
 
 
-def primary_pass(ast):
-	traverse.traverse(MutatorVisitor(), ast)
+def primary_pass(ast, nested=True):
+	traverse.traverse(MutatorVisitor(), ast, nested)
 
 	return ast
@@ -15,7 +15,20 @@ class FunctionDefinition():
 		self._debuginfo = None
 		self._instructions_count = 0
 
+		# No jumps at all, every block just flows into the next one. Any
+		# if or loop, however simple, makes it False.
+		self._is_flow_only = False
+
+		self._prototype = None
+
+		# Comment lines to write instead of the body, which is left empty
+		# if the function failed to decompile
+		self._fallback = None
+
 	def _accept(self, visitor):
+		if visitor._scope is not None and visitor._scope is not self:
+			return
+
 		visitor._visit_node(visitor.visit_function_definition, self)
 
 		visitor._visit(self.arguments)
@@ -29,6 +42,11 @@ class TableConstructor():
 		self.array = RecordsList()
 		self.records = RecordsList()
 
+		# A TDUP template table (ljd.bytecode.constants.Table) which is
+		# not turned into the records yet, see
+		# ljd.ast.helpers.expand_table_template
+		self._template = None
+
 	def _accept(self, visitor):
 		visitor._visit_node(visitor.visit_table_constructor, self)
 
@@ -4,18 +4,19 @@
 
 import ljd.ast.nodes as nodes
 import ljd.ast.traverse as traverse
+import ljd.util.budget as budget
 from ljd.ast.helpers import insert_table_record
 
 
-def eliminate_temporary(ast):
-	_eliminate_multres(ast)
+def eliminate_temporary(ast, nested=True):
+	_eliminate_multres(ast, nested)
 
-	slots, unused = _collect_slots(ast)
+	slots, unused = _collect_slots(ast, nested)
 	_eliminate_temporary(slots)
 
 	# _remove_unused(unused)
 
-	_cleanup_invalid_nodes(ast)
+	_cleanup_invalid_nodes(ast, nested)
 
 	return ast
 
@@ -27,6 +28,8 @@ def _eliminate_temporary(slots):
 	iterators = []
 
 	for info in slots:
+		budget.step()
+
 		assignment = info.assignment
 
 		if not isinstance(assignment, nodes.Assignment):
@@ -231,16 +234,16 @@ def _remove_unused(unused):
 	pass
 
 
-def _collect_slots(ast):
+def _collect_slots(ast, nested=True):
 	collector = _SlotsCollector()
-	traverse.traverse(collector, ast)
+	traverse.traverse(collector, ast, nested)
 
 	return collector.slots, collector.unused
 
 
-def _eliminate_multres(ast):
-	traverse.traverse(_MultresEliminator(), ast)
-	_cleanup_invalid_nodes(ast)
+def _eliminate_multres(ast, nested=True):
+	traverse.traverse(_MultresEliminator(), ast, nested)
+	_cleanup_invalid_nodes(ast, nested)
 
 
 class _MultresEliminator(traverse.Visitor):
@@ -455,8 +458,8 @@ class _SlotsCollector(traverse.Visitor):
 		traverse.Visitor._visit(self, node)
 
 
-def _cleanup_invalid_nodes(ast):
-	traverse.traverse(_TreeCleanup(), ast)
+def _cleanup_invalid_nodes(ast, nested=True):
+	traverse.traverse(_TreeCleanup(), ast, nested)
 
 
 class _TreeCleanup(traverse.Visitor):
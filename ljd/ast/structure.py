@@ -0,0 +1,294 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+#
+# Structural keys of the nodes. The structurally equal nodes get the same
+# small integer key - the keys are hash consed out of the node type, its
+# scalar fields and the keys of its children, so a key is computed once per
+# node and compared in O(1).
+#
+# The keys are cached on the nodes and are valid until the next invalidate()
+# call. The pass manager calls it before every pass run, a pass changing the
+# nodes in between has to call it itself before asking for the keys of the
+# changed ones.
+#
+# The warps and the blocks have no key - they point to each other - and so has
+# nothing containing them.
+#
+# The digests are the same, but with the names of the identifiers and kept for
+# as long as their table lives, so they are comparable across the invalidate()
+# calls. See ljd.ast.journal.
+#
+
+import ljd.ast.nodes as nodes
+import ljd.ast.traverse as traverse
+
+
+_CHILDREN = {
+	nodes.FunctionDefinition: ("arguments", "statements"),
+	nodes.TableConstructor: ("array", "records"),
+	nodes.ArrayRecord: ("value",),
+	nodes.TableRecord: ("key", "value"),
+	nodes.Assignment: ("destinations", "expressions"),
+	nodes.BinaryOperator: ("left", "right"),
+	nodes.UnaryOperator: ("operand",),
+	nodes.StatementsList: ("contents",),
+	nodes.IdentifiersList: ("contents",),
+	nodes.RecordsList: ("contents",),
+	nodes.VariablesList: ("contents",),
+	nodes.ExpressionsList: ("contents",),
+	nodes.Identifier: (),
+	nodes.MULTRES: (),
+	nodes.TableElement: ("table", "key"),
+	nodes.Vararg: (),
+	nodes.FunctionCall: ("function", "arguments"),
+	nodes.If: ("expression", "then_block", "elseifs", "else_block"),
+	nodes.ElseIf: ("expression", "then_block"),
+	nodes.Return: ("returns",),
+	nodes.Break: (),
+	nodes.While: ("expression", "statements"),
+	nodes.RepeatUntil: ("expression", "statements"),
+	nodes.NumericFor: ("variable", "expressions", "statements"),
+	nodes.IteratorFor: ("expressions", "identifiers", "statements"),
+	nodes.Constant: (),
+	nodes.Primitive: ()
+}
+
+_SCALARS = {
+	nodes.Assignment: ("type",),
+	nodes.BinaryOperator: ("type",),
+	nodes.UnaryOperator: ("type",),
+	nodes.Primitive: ("type",)
+}
+
+# Only these are reported as duplicates, the rest are too small or are not
+# expressions
+_EXPRESSION_TYPES = (
+	nodes.FunctionDefinition,
+	nodes.TableConstructor,
+	nodes.BinaryOperator,
+	nodes.UnaryOperator,
+	nodes.TableElement,
+	nodes.FunctionCall
+)
+
+_UNHASHABLE = object()
+
+_generation = 0
+_keys = {}
+
+
+def invalidate():
+	global _generation
+
+	_generation += 1
+	_keys.clear()
+
+
+def get_generation():
+	return _generation
+
+
+def get_key(node):
+	cached = getattr(node, "_structure", None)
+
+	if cached is not None and cached[0] == _generation:
+		return cached[1]
+
+	key = _build_key(node)
+
+	node._structure = (_generation, key)
+
+	return key
+
+
+# Structurally equal nodes are equal, the nodes without a key only to
+# themselves
+def is_equal(a, b):
+	if a is b:
+		return True
+
+	key = get_key(a)
+
+	return key is not None and key == get_key(b)
+
+
+# Groups of the structurally equal expressions and functions under the node,
+# in the traversal order
+def find_duplicates(node):
+	collector = _DuplicatesCollector()
+	traverse.traverse(collector, node)
+
+	return [group for group in collector.groups.values() if len(group) > 1]
+
+
+def _build_key(node):
+	node_type = type(node)
+
+	# The name is not a part of the key, as it was not in the old
+	# helpers.is_equal
+	if node_type == nodes.Identifier:
+		parts = (node_type, node.type, node.slot)
+	else:
+		parts = _build_parts(node, node_type, get_key)
+
+		if parts is None:
+			return None
+
+	return _intern(_keys, parts)
+
+
+def _intern(table, parts):
+	key = table.get(parts)
+
+	if key is None:
+		key = len(table)
+		table[parts] = key
+
+	return key
+
+
+def _build_parts(node, node_type, get_part):
+	if node_type == nodes.Constant:
+		part = _get_constant_part(node.type, node.value)
+
+		if part is _UNHASHABLE:
+			return None
+
+		return (node_type, part)
+
+	children = _CHILDREN.get(node_type)
+
+	if children is None:
+		return None
+
+	parts = [node_type]
+
+	for name in _SCALARS.get(node_type, ()):
+		parts.append(getattr(node, name))
+
+	if node_type == nodes.TableConstructor:
+		part = _get_template_part(node._template)
+
+		if part is _UNHASHABLE:
+			return None
+
+		parts.append(part)
+
+	for name in children:
+		part = _get_child_part(getattr(node, name), get_part)
+
+		if part is _UNHASHABLE:
+			return None
+
+		parts.append(part)
+
+	return tuple(parts)
+
+
+def _get_child_part(child, get_part):
+	if child is None:
+		return None
+
+	if isinstance(child, list):
+		parts = []
+
+		for node in child:
+			key = get_part(node)
+
+			if key is None:
+				return _UNHASHABLE
+
+			parts.append(key)
+
+		return tuple(parts)
+
+	key = get_part(child)
+
+	if key is None:
+		return _UNHASHABLE
+
+	return key
+
+
+def _get_constant_part(constant_type, value):
+	value_type = type(value)
+
+	if value_type == str or value_type == int:
+		return (constant_type, value_type, value)
+
+	# NaN is not equal to itself
+	if value != value:
+		return _UNHASHABLE
+
+	try:
+		hash(value)
+	except TypeError:
+		return _UNHASHABLE
+
+	# Keeps True apart from 1 and 1 apart from 1.0
+	return (constant_type, value_type, value)
+
+
+def _get_template_part(table):
+	if table is None:
+		return None
+
+	parts = []
+
+	for is_array, key, value in table.items():
+		key = _get_constant_part(None, key)
+		value = _get_constant_part(None, value)
+
+		if key is _UNHASHABLE or value is _UNHASHABLE:
+			return _UNHASHABLE
+
+		parts.append((is_array, key, value))
+
+	return tuple(parts)
+
+
+class Digests():
+	def __init__(self):
+		self._table = {}
+
+	def get(self, node):
+		cached = getattr(node, "_digest", None)
+
+		if cached is not None and cached[0] == _generation \
+						and cached[1] is self:
+			return cached[2]
+
+		digest = self._build(node)
+
+		node._digest = (_generation, self, digest)
+
+		return digest
+
+	def _build(self, node):
+		node_type = type(node)
+
+		if node_type == nodes.Identifier:
+			parts = (node_type, node.type, node.slot, node.name)
+		else:
+			parts = _build_parts(node, node_type, self.get)
+
+			if parts is None:
+				return None
+
+		return _intern(self._table, parts)
+
+
+class _DuplicatesCollector(traverse.Visitor):
+	def __init__(self):
+		self.groups = {}
+
+	def _visit_node(self, handler, node):
+		if isinstance(node, _EXPRESSION_TYPES):
+			key = get_key(node)
+
+			if key is not None:
+				self.groups.setdefault(key, []).append(node)
+
+		traverse.Visitor._visit_node(self, handler, node)
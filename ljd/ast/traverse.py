@@ -1,4 +1,8 @@
 class Visitor():
+	# The function definition the traversal is limited to. The functions
+	# nested into it are not entered if set.
+	_scope = None
+
 	def __init__(self):
 		pass
 
@@ -244,7 +248,10 @@ class Visitor():
 			self._visit(node)
 
 
-def traverse(visitor, node):
+def traverse(visitor, node, nested=True):
+	if not nested:
+		visitor._scope = node
+
 	if isinstance(node, list):
 		visitor._visit_list(node)
 	else:
@@ -3,6 +3,7 @@ import copy
 import ljd.ast.nodes as nodes
 import ljd.ast.traverse as traverse
 import ljd.ast.slotworks as slotworks
+import ljd.util.budget as budget
 
 binop = nodes.BinaryOperator
 
@@ -26,66 +27,112 @@ class _StatementsCollector(traverse.Visitor):
 			self.result.append(node)
 
 
-def unwarp(node):
+def unwarp(node, nested=True):
+	# There is nothing to unwarp in a function without jumps, so just glue
+	# its blocks together. Anything with a jump goes the full way below.
+	if not nested and node._is_flow_only:
+		_glue_statements(node.statements)
+		return
+
 	# There could be many negative jumps within while conditions, so
 	# filter them first
-	_run_step(_unwarp_loops, node, repeat_until=False)
+	_run_step(_unwarp_loops, node, nested, repeat_until=False)
+
+	_run_step(_unwarp_loops, node, nested, repeat_until=True)
+	_run_step(_unwarp_expressions, node, nested)
+	_run_step(_unwarp_ifs, node, nested)
 
-	_run_step(_unwarp_loops, node, repeat_until=True)
-	_run_step(_unwarp_expressions, node)
-	_run_step(_unwarp_ifs, node)
+	_glue_flows(node, nested)
 
-	_glue_flows(node)
 
+def _run_step(step, node, nested, **kargs):
+	for statements in _gather_statements_lists(node, nested):
+		budget.step()
 
-def _run_step(step, node, **kargs):
-	for statements in _gather_statements_lists(node):
 		statements.contents = step(statements.contents, **kargs)
 
 	# Fix block indices in case anything was moved
-	for statements in _gather_statements_lists(node):
+	for statements in _gather_statements_lists(node, nested):
 		for i, block in enumerate(statements.contents):
 			block.index = i
 
 
-def _gather_statements_lists(node):
+def _gather_statements_lists(node, nested=True):
 	collector = _StatementsCollector()
-	traverse.traverse(collector, node)
+	traverse.traverse(collector, node, nested)
 	return collector.result
 
 
-def _glue_flows(node):
-	for statements in _gather_statements_lists(node):
-		blocks = statements.contents
+def _glue_flows(node, nested=True):
+	for statements in _gather_statements_lists(node, nested):
+		_glue_statements(statements)
 
-		if hasattr(blocks[-1], 'warp'):
-			assert isinstance(blocks[-1].warp, nodes.EndWarp)
 
-			for i, block in enumerate(blocks[:-1]):
-				warp = block.warp
+def _glue_statements(statements):
+	blocks = statements.contents
 
-				assert _is_flow(warp)
+	if hasattr(blocks[-1], 'warp'):
+		assert isinstance(blocks[-1].warp, nodes.EndWarp)
 
-				target = warp.target
+		for i, block in enumerate(blocks[:-1]):
+			warp = block.warp
+
+			assert _is_flow(warp)
+
+			target = warp.target
 
-				assert target == blocks[i + 1]
+			assert target == blocks[i + 1]
 
-				target.contents = block.contents + target.contents
-				block.contents = []
+			target.contents = block.contents + target.contents
+			block.contents = []
 
-			statements.contents = blocks[-1].contents
+		statements.contents = blocks[-1].contents
 
 
 # ##
 # ## IFs AND EXPRESSIONs PROCESSING
 # ##
 
+#
+# The expressions found so far in the blocks list. A range of the blocks is
+# identified by its start and end - all the blocks in between are in the list
+# - so the results are memoized by the pair, until the list is changed.
+#
+class _ExpressionsSearch():
+	def __init__(self, blocks):
+		self.blocks = blocks
+		self.positions = {block: i for i, block in enumerate(blocks)}
+
+		# The position of the nearest end warp without a target at or
+		# after the position
+		self.next_bare_end = [len(blocks)] * (len(blocks) + 1)
+
+		for i in reversed(range(len(blocks))):
+			warp = blocks[i].warp
+
+			if isinstance(warp, nodes.EndWarp) \
+					and getattr(warp, "_target", None) is None:
+				self.next_bare_end[i] = i
+			else:
+				self.next_bare_end[i] = self.next_bare_end[i + 1]
+
+		self.expressions = {}
+		self.subexpressions = {}
+
+		# See _find_subexpression_end
+		self.scans = {}
+
+
 def _unwarp_expressions(blocks):
 	pack = []
 	pack_set = set()
 
+	search = _ExpressionsSearch(blocks)
+
 	start_index = 0
 	while start_index < len(blocks) - 1:
+		budget.step()
+
 		start = blocks[start_index]
 		warp = start.warp
 
@@ -101,7 +148,7 @@ def _unwarp_expressions(blocks):
 			raise NotImplementedError("GOTO statements are not"
 								" supported")
 
-		expressions = _find_expressions(start, body, end)
+		expressions = _find_expressions(start, body, end, search)
 
 		assert pack_set.isdisjoint(expressions)
 
@@ -142,6 +189,8 @@ def _unwarp_ifs(blocks, top_end=None, topmost_end=None):
 	start_index = 0
 
 	while start_index < len(blocks) - 1:
+		budget.step()
+
 		start = blocks[start_index]
 		warp = start.warp
 
@@ -301,7 +350,22 @@ def _gather_slots(node):
 	return collector.slots
 
 
-def _find_expressions(start, body, end):
+def _find_expressions(start, body, end, search):
+	key = (start, end)
+
+	try:
+		return search.expressions[key]
+	except KeyError:
+		pass
+
+	expressions = _find_expressions_uncached(start, body, end, search)
+
+	search.expressions[key] = expressions
+
+	return expressions
+
+
+def _find_expressions_uncached(start, body, end, search):
 	# Explicitly allow the local a = x ~= "b" case
 	slot, slot_type = _get_simple_local_assignment_slot(start, body, end)
 
@@ -319,13 +383,16 @@ def _find_expressions(start, body, end):
 	sure_expression = False
 
 	while i < len(extbody):
+		budget.step()
+
 		block = extbody[i]
 
-		subs = _find_subexpressions(block, body[i:])
+		subs = _find_subexpressions(block, end, search)
 
 		if len(subs) != 0:
 			endest_end = _find_endest_end(subs)
-			new_i = extbody.index(endest_end)
+			new_i = search.positions[endest_end] \
+						- search.positions[start]
 
 			# Loop? No way!
 			if new_i <= i:
@@ -444,17 +511,96 @@ def _find_expressions(start, body, end):
 	return expressions + [(start, end, slot, slot_type)]
 
 
-def _find_subexpressions(start, body):
+# The subexpressions starting at the start block and ending before the limit
+def _find_subexpressions(start, limit, search):
+	key = (start, limit)
+
 	try:
-		body, end, _end_index = _extract_if_body(0, [start] + body, None)
-	except ValueError:
-		# a warp target is not in a list
-		return []
+		return search.subexpressions[key]
+	except KeyError:
+		pass
+
+	expressions = _find_subexpressions_uncached(start, limit, search)
+
+	search.subexpressions[key] = expressions
+
+	return expressions
+
+
+def _find_subexpressions_uncached(start, limit, search):
+	first = search.positions[start]
+	last = search.positions[limit]
 
-	if body is None:
+	end = _find_subexpression_end(first, last, search)
+
+	end_index = search.positions.get(end, last)
+
+	if end_index < first or end_index >= last:
 		return []
 
-	return _find_expressions(start, body, end)
+	body = search.blocks[first + 1:end_index]
+
+	return _find_expressions(start, body, end, search)
+
+
+#
+# The same as _find_branching_end over the blocks from the first position up
+# to the last one. The rest of a scan depends only on the position and the end
+# found so far, and the scans from the different starts meet at the same
+# states, so the result is memoized for every state passed.
+#
+# The end never goes back, so the scan is also cut once it is past the last
+# block - there is no subexpression then. Unless there is an end warp without
+# a target still ahead, as _find_branching_end asserts on it.
+#
+def _find_subexpression_end(first, last, search):
+	blocks = search.blocks
+	limit = blocks[last]
+
+	passed = []
+
+	end = blocks[first]
+	result = None
+
+	for i in range(first, last):
+		state = (i, end, last)
+
+		result = search.scans.get(state)
+
+		if result is not None:
+			break
+
+		passed.append(state)
+
+		block = blocks[i]
+		warp = block.warp
+
+		target = _get_target(warp, allow_end=True)
+
+		if isinstance(warp, nodes.EndWarp) and target is None:
+			assert block == end
+			result = block
+			break
+
+		if isinstance(warp, nodes.UnconditionalWarp) and target == end:
+			result = end
+			break
+
+		if target.index > end.index:
+			end = target
+
+			if end.index >= limit.index \
+					and search.next_bare_end[i + 1] >= last:
+				result = end
+				break
+
+	if result is None:
+		result = end
+
+	for state in passed:
+		search.scans[state] = result
+
+	return result
 
 
 def _get_simple_local_assignment_slot(start, body, end):
@@ -1105,6 +1251,8 @@ def _unwarp_loops(blocks, repeat_until):
 	fixed = _cleanup_breaks_and_if_ends(loops, blocks)
 
 	for start, end in fixed:
+		budget.step()
+
 		start_index = blocks.index(start)
 		end_index = blocks.index(end)
 
@@ -1427,6 +1575,8 @@ def _gather_possible_ends(block):
 	ends = set((block,))
 
 	while _is_jump(warp):
+		budget.step()
+
 		block = warp.target
 		warp = block.warp
 
@@ -2,28 +2,13 @@
 # Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
 #
 
-import ljd.ast.nodes as nodes
-import ljd.ast.traverse as traverse
-
-
-class TypeRestriction():
-	def __init__(self, default, specific):
-		if isinstance(default, dict) and specific == {}:
-			specific = default
-			default = None
+import random
 
-		self.default = default
-		self.specific = specific
-
-	def check(self, node):
-		try:
-			typespec = self.specific[node]
-		except KeyError:
-			typespec = self.default
+import ljd.ast.nodes as nodes
 
-		#assert typespec, "Unknown node: {0}".format(node)
 
-		#assert isinstance(node, typespec),"Invalid node type: {0} should be: {1}".format(type(node), typespec)
+class ValidationError(Exception):
+	pass
 
 
 STATEMENT_TYPES = (
@@ -67,272 +52,356 @@ WARP_TYPES = (
 )
 
 
-class Visitor(traverse.Visitor):
-	def __init__(self, warped=True):
-		# Restrictions for the upmost level
-		self.restrictions = [None]
-		self.warped = warped
-
-	def _set_restrictions(self, default, specific={}):
-		self.restrictions[-1] = TypeRestriction(default, specific)
+BINARY_OPERATOR_TYPES = (
+	nodes.BinaryOperator.T_LOGICAL_OR,
+	nodes.BinaryOperator.T_LOGICAL_AND,
 
-	# ##
+	nodes.BinaryOperator.T_LESS_THEN,
+	nodes.BinaryOperator.T_GREATER_THEN,
+	nodes.BinaryOperator.T_LESS_OR_EQUAL,
+	nodes.BinaryOperator.T_GREATER_OR_EQUAL,
 
-	def visit_function_definition(self, node):
-		self._set_restrictions(nodes.Block, {
-			node.arguments: nodes.IdentifiersList,
-			node.statements: nodes.StatementsList
-		})
+	nodes.BinaryOperator.T_NOT_EQUAL,
+	nodes.BinaryOperator.T_EQUAL,
 
-	# ##
+	nodes.BinaryOperator.T_CONCAT,
 
-	def visit_table_constructor(self, node):
-		self._set_restrictions(nodes.RecordsList)
-
-	def visit_array_record(self, node):
-		self._set_restrictions(EXPRESSION_TYPES)
+	nodes.BinaryOperator.T_ADD,
+	nodes.BinaryOperator.T_SUBTRACT,
 
-	def visit_table_record(self, node):
-		self._set_restrictions(EXPRESSION_TYPES)
+	nodes.BinaryOperator.T_MULTIPLY,
+	nodes.BinaryOperator.T_DIVISION,
+	nodes.BinaryOperator.T_MOD,
 
-	# ##
+	nodes.BinaryOperator.T_POW
+)
 
-	def visit_assignment(self, node):
-		self._set_restrictions({
-			node.destinations: nodes.VariablesList,
-			node.expressions: nodes.ExpressionsList
-		})
+UNARY_OPERATOR_TYPES = (
+	nodes.UnaryOperator.T_NOT,
+	nodes.UnaryOperator.T_LENGTH_OPERATOR,
+	nodes.UnaryOperator.T_MINUS
+)
 
-		if not isinstance(node.destinations.contents[0], nodes.Identifier):
-			return
+CONSTANT_TYPES = (
+	nodes.Constant.T_CDATA,
+	nodes.Constant.T_FLOAT,
+	nodes.Constant.T_INTEGER,
+	nodes.Constant.T_STRING
+)
 
-		if node.destinations.contents[0].type != nodes.Identifier.T_LOCAL:
-			return
-
-		# Don't test type flag here
-	# ##
+PRIMITIVE_TYPES = (
+	nodes.Primitive.T_NIL,
+	nodes.Primitive.T_TRUE,
+	nodes.Primitive.T_FALSE
+)
+
+RECORD_TYPES = (
+	nodes.TableRecord,
+	nodes.ArrayRecord,
+	nodes.FunctionCall,
+	nodes.Vararg
+)
+
+# Children of every node type - (attribute, allowed types, is a list of them)
+_CHILDREN = {
+	nodes.FunctionDefinition: (
+		("arguments", nodes.IdentifiersList, False),
+		("statements", nodes.StatementsList, False)
+	),
+
+	nodes.TableConstructor: (
+		("array", nodes.RecordsList, False),
+		("records", nodes.RecordsList, False)
+	),
+	nodes.ArrayRecord: (
+		("value", EXPRESSION_TYPES, False),
+	),
+	nodes.TableRecord: (
+		("key", EXPRESSION_TYPES, False),
+		("value", EXPRESSION_TYPES, False)
+	),
+
+	nodes.Assignment: (
+		("expressions", nodes.ExpressionsList, False),
+		("destinations", nodes.VariablesList, False)
+	),
+
+	nodes.BinaryOperator: (
+		("left", EXPRESSION_TYPES, False),
+		("right", EXPRESSION_TYPES, False)
+	),
+	nodes.UnaryOperator: (
+		("operand", EXPRESSION_TYPES, False),
+	),
+
+	# The statements list depends on the warped flag, see _compile
+	nodes.IdentifiersList: (
+		("contents", (nodes.Identifier, nodes.Vararg), True),
+	),
+	nodes.RecordsList: (
+		("contents", RECORD_TYPES, True),
+	),
+	nodes.VariablesList: (
+		("contents", VARIABLE_TYPES, True),
+	),
+	nodes.ExpressionsList: (
+		("contents", EXPRESSION_TYPES, True),
+	),
+
+	nodes.Identifier: (),
+	nodes.MULTRES: (),
+	nodes.TableElement: (
+		("key", EXPRESSION_TYPES, False),
+		("table", EXPRESSION_TYPES, False)
+	),
+	nodes.Vararg: (),
+	nodes.FunctionCall: (
+		("arguments", nodes.ExpressionsList, False),
+		("function", VARIABLE_TYPES, False)
+	),
+
+	nodes.If: (
+		("expression", EXPRESSION_TYPES, False),
+		("then_block", nodes.StatementsList, False),
+		("elseifs", nodes.ElseIf, True),
+		("else_block", nodes.StatementsList, False)
+	),
+	nodes.ElseIf: (
+		("expression", EXPRESSION_TYPES, False),
+		("then_block", nodes.StatementsList, False)
+	),
+
+	nodes.Block: (
+		("contents", STATEMENT_TYPES, True),
+		("warp", WARP_TYPES, False)
+	),
+	nodes.UnconditionalWarp: (),
+	nodes.ConditionalWarp: (
+		("condition", EXPRESSION_TYPES, False),
+	),
+	nodes.IteratorWarp: (
+		("variables", nodes.VariablesList, False),
+		("controls", nodes.ExpressionsList, False)
+	),
+	nodes.NumericLoopWarp: (
+		("index", nodes.Identifier, False),
+		("controls", nodes.ExpressionsList, False)
+	),
+	nodes.EndWarp: (),
+
+	nodes.Return: (
+		("returns", nodes.ExpressionsList, False),
+	),
+	nodes.Break: (),
+	nodes.While: (
+		("expression", EXPRESSION_TYPES, False),
+		("statements", nodes.StatementsList, False)
+	),
+	nodes.RepeatUntil: (
+		("statements", nodes.StatementsList, False),
+		("expression", EXPRESSION_TYPES, False)
+	),
+	nodes.NumericFor: (
+		("variable", VARIABLE_TYPES, False),
+		("expressions", nodes.ExpressionsList, False),
+		("statements", nodes.StatementsList, False)
+	),
+	nodes.IteratorFor: (
+		("expressions", nodes.ExpressionsList, False),
+		("identifiers", nodes.VariablesList, False),
+		("statements", nodes.StatementsList, False)
+	),
+
+	nodes.Constant: (),
+	nodes.Primitive: ()
+}
+
+
+def _check(condition, message, node):
+	if not condition:
+		raise ValidationError("{0}: {1}".format(type(node).__name__,
+								message))
+
+
+def _check_binary_operator(node):
+	_check(node.type in BINARY_OPERATOR_TYPES,
+			"Invalid operator type: {0}".format(node.type), node)
+
+
+def _check_unary_operator(node):
+	_check(node.type in UNARY_OPERATOR_TYPES,
+			"Invalid operator type: {0}".format(node.type), node)
+
+
+def _check_records_list(node):
+	if len(node.contents) == 0:
+		return
+
+	is_array = isinstance(node.contents[0], nodes.ArrayRecord)
+
+	for i, x in enumerate(node.contents):
+		if is_array:
+			_check(isinstance(x, nodes.ArrayRecord),
+				"Mixed array and hash records", node)
+		elif not isinstance(x, nodes.TableRecord):
+			_check(i == len(node.contents) - 1,
+				"Multiple results in the middle", node)
+
+
+def _check_identifier(node):
+	_check(node.type == nodes.Identifier.T_SLOT
+			or node.type == nodes.Identifier.T_BUILTIN
+			or node.type == nodes.Identifier.T_UPVALUE
+			or (node.name is not None
+				and node.type == nodes.Identifier.T_LOCAL),
+		"Invalid identifier type: {0}".format(node.type), node)
+
+	_check(node.type == nodes.Identifier.T_BUILTIN or node.slot >= 0,
+		"Invalid slot: {0}".format(node.slot), node)
 
-	def visit_binary_operator(self, node):
-		self._set_restrictions(EXPRESSION_TYPES)
-
-		assert	node.type == nodes.BinaryOperator.T_LOGICAL_OR		\
-			or node.type == nodes.BinaryOperator.T_LOGICAL_AND	\
-										\
-			or node.type == nodes.BinaryOperator.T_LESS_THEN	\
-			or node.type == nodes.BinaryOperator.T_GREATER_THEN	\
-			or node.type == nodes.BinaryOperator.T_LESS_OR_EQUAL	\
-			or node.type == nodes.BinaryOperator.T_GREATER_OR_EQUAL	\
-										\
-			or node.type == nodes.BinaryOperator.T_NOT_EQUAL	\
-			or node.type == nodes.BinaryOperator.T_EQUAL		\
-										\
-			or node.type == nodes.BinaryOperator.T_CONCAT		\
-										\
-			or node.type == nodes.BinaryOperator.T_ADD		\
-			or node.type == nodes.BinaryOperator.T_SUBTRACT		\
-										\
-			or node.type == nodes.BinaryOperator.T_MULTIPLY		\
-			or node.type == nodes.BinaryOperator.T_DIVISION		\
-			or node.type == nodes.BinaryOperator.T_MOD		\
-										\
-			or node.type == nodes.BinaryOperator.T_POW
 
-	def visit_unary_operator(self, node):
-		self._set_restrictions(EXPRESSION_TYPES)
+def _check_block(node):
+	_check(node.index >= 0, "Invalid index: {0}".format(node.index), node)
 
-		assert node.type == nodes.UnaryOperator.T_NOT			\
-			or node.type == nodes.UnaryOperator.T_LENGTH_OPERATOR	\
-			or node.type == nodes.UnaryOperator.T_MINUS
+	_check(node.first_address >= 0
+			and node.first_address <= node.last_address,
+		"Invalid addresses: {0}-{1}".format(node.first_address,
+							node.last_address),
+		node)
 
-	# ##
+	# if false produce a statements without warps in
+	# assert node.warpins_count > 0
 
-	def visit_statements_list(self, node):
-		if self.warped:
-			types = nodes.Block
-		else:
-			types = STATEMENT_TYPES
 
-		self._set_restrictions(types)
+def _check_unconditional_warp(node):
+	_check(node.target is not None, "No target", node)
 
-	def visit_identifiers_list(self, node):
-		# HACK
-		self._set_restrictions((nodes.Identifier, nodes.Vararg))
+	_check(node.type == nodes.UnconditionalWarp.T_JUMP
+			or node.type == nodes.UnconditionalWarp.T_FLOW,
+		"Invalid warp type: {0}".format(node.type), node)
 
-	def visit_records_list(self, node):
-		self._set_restrictions((nodes.TableRecord,
-					nodes.ArrayRecord,
-					nodes.FunctionCall,
-					nodes.Vararg))
 
-		if len(node.contents) == 0:
-			return
+def _check_conditional_warp(node):
+	_check(node.true_target is not None, "No true target", node)
+	_check(node.false_target is not None, "No false target", node)
 
-		is_array = isinstance(node.contents[0], nodes.ArrayRecord)
-
-		for i, x in enumerate(node.contents):
-			if is_array:
-				assert isinstance(x, nodes.ArrayRecord)
-			elif not isinstance(x, nodes.TableRecord):
-				assert i == (len(node.contents) - 1)
+	# It might happen in case of if blabla or true stuff
+	# or in case of a = a and foo(a) or a type expression
+	# assert node.true_target != node.false_target
 
-	def visit_variables_list(self, node):
-		self._set_restrictions(VARIABLE_TYPES)
 
-	def visit_expressions_list(self, node):
-		self._set_restrictions(EXPRESSION_TYPES)
+def _check_iterator_warp(node):
+	_check(node.body is not None, "No body", node)
+	_check(node.way_out is not None, "No way out", node)
 
-	# ##
+	_check(node.way_out.index > node.body.index,
+		"The way out is before the body", node)
 
-	def visit_identifier(self, node):
-		assert node.type == nodes.Identifier.T_SLOT		\
-			or node.type == nodes.Identifier.T_BUILTIN	\
-			or node.type == nodes.Identifier.T_UPVALUE	\
-			or (node.name is not None			\
-				and node.type == nodes.Identifier.T_LOCAL)
-
-		assert node.type == nodes.Identifier.T_BUILTIN or node.slot >= 0
-
-	def visit_table_element(self, node):
-		self._set_restrictions(EXPRESSION_TYPES)
-
-	def visit_function_call(self, node):
-		self._set_restrictions({
-			node.function: VARIABLE_TYPES,
-			node.arguments: nodes.ExpressionsList
-		})
-
-	# ##
-
-	def visit_if(self, node):
-		self._set_restrictions(nodes.ElseIf, {
-			node.expression: EXPRESSION_TYPES,
-			node.then_block: nodes.StatementsList,
-			node.else_block: nodes.StatementsList
-		})
-
-	def visit_elseif(self, node):
-		self._set_restrictions({
-			node.expression: EXPRESSION_TYPES,
-			node.then_block: nodes.StatementsList
-		})
-
-	# ##
-
-	def visit_block(self, node):
-		self._set_restrictions(STATEMENT_TYPES, {
-			node.warp: WARP_TYPES
-		})
-
-		assert node.index >= 0
-
-		assert node.first_address >= 0			\
-			and node.first_address <= node.last_address
 
-		# if false produce a statements without warps in
-		# assert node.warpins_count > 0
+def _check_numeric_loop_warp(node):
+	_check(node.body is not None, "No body", node)
+	_check(node.way_out is not None, "No way out", node)
 
-	def visit_unconditional_warp(self, node):
-		assert node.target is not None
 
-		assert node.type == nodes.UnconditionalWarp.T_JUMP	\
-			or node.type == nodes.UnconditionalWarp.T_FLOW
+def _check_constant(node):
+	_check(node.type in CONSTANT_TYPES,
+		"Invalid constant type: {0}".format(node.type), node)
 
-	def visit_conditional_warp(self, node):
-		self._set_restrictions({
-			node.condition: EXPRESSION_TYPES
-		})
 
-		assert node.true_target is not None
-		assert node.false_target is not None
+def _check_primitive(node):
+	_check(node.type in PRIMITIVE_TYPES,
+		"Invalid primitive type: {0}".format(node.type), node)
 
-		# It might happen in case of if blabla or true stuff
-		# or in case of a = a and foo(a) or a type expression
-		# assert node.true_target != node.false_target
-		# assert node.true_target.index != node.false_target.index
 
-	def visit_iterator_warp(self, node):
-		assert node.body is not None
-		assert node.way_out is not None
+_CHECKS = {
+	nodes.BinaryOperator: _check_binary_operator,
+	nodes.UnaryOperator: _check_unary_operator,
+	nodes.RecordsList: _check_records_list,
+	nodes.Identifier: _check_identifier,
+	nodes.Block: _check_block,
+	nodes.UnconditionalWarp: _check_unconditional_warp,
+	nodes.ConditionalWarp: _check_conditional_warp,
+	nodes.IteratorWarp: _check_iterator_warp,
+	nodes.NumericLoopWarp: _check_numeric_loop_warp,
+	nodes.Constant: _check_constant,
+	nodes.Primitive: _check_primitive
+}
 
-		assert node.way_out.index > node.body.index
 
-		self._set_restrictions(nodes.Block, {
-			node.variables: nodes.VariablesList,
-			node.controls: nodes.ExpressionsList
-		})
+# Node type to its (children, check) for the warped and the unwarped trees
+def _compile(warped):
+	table = {}
 
-	def visit_numeric_loop_warp(self, node):
-		assert node.body is not None
-		assert node.way_out is not None
+	for node_type, children in _CHILDREN.items():
+		table[node_type] = (children, _CHECKS.get(node_type))
 
-		self._set_restrictions(nodes.Block, {
-			node.index: nodes.Identifier,
-			node.controls: nodes.ExpressionsList
-		})
+	statements = nodes.Block if warped else STATEMENT_TYPES
 
-	# ##
+	table[nodes.StatementsList] = (
+		(("contents", statements, True),),
+		None
+	)
 
-	def visit_return(self, node):
-		self._set_restrictions(nodes.ExpressionsList)
+	return table
 
-	# ##
 
-	def visit_while(self, node):
-		self._set_restrictions({
-			node.expression: EXPRESSION_TYPES,
-			node.statements: nodes.StatementsList
-		})
+_TABLES = {
+	True: _compile(True),
+	False: _compile(False)
+}
 
-	def visit_repeat_until(self, node):
-		self._set_restrictions({
-			node.expression: EXPRESSION_TYPES,
-			node.statements: nodes.StatementsList
-		})
 
-	def visit_numeric_for(self, node):
-		self._set_restrictions({
-			node.expressions: nodes.ExpressionsList,
-			node.statements: nodes.StatementsList,
-			node.variable: VARIABLE_TYPES
-		})
+def validate(ast, warped=True, nested=True):
+	table = _TABLES[warped]
+
+	pending = [ast]
+
+	while len(pending) > 0:
+		node = pending.pop()
+
+		try:
+			children, check = table[type(node)]
+		except KeyError:
+			raise ValidationError("Unknown node: {0}".format(node))
 
-	def visit_iterator_for(self, node):
-		self._set_restrictions({
-			node.expressions: nodes.ExpressionsList,
-			node.identifiers: nodes.VariablesList,
-			node.statements: nodes.StatementsList
-		})
+		if check is not None:
+			check(node)
 
-	# ##
+		if not nested and node is not ast \
+				and isinstance(node, nodes.FunctionDefinition):
+			continue
 
-	def visit_constant(self, node):
-		assert	node.type == nodes.Constant.T_CDATA		\
-			or node.type == nodes.Constant.T_FLOAT		\
-			or node.type == nodes.Constant.T_INTEGER	\
-			or node.type == nodes.Constant.T_STRING
+		for name, types, is_list in children:
+			value = getattr(node, name)
 
-	def visit_primitive(self, node):
-		assert	node.type == nodes.Primitive.T_NIL		\
-			or node.type == nodes.Primitive.T_TRUE		\
-			or node.type == nodes.Primitive.T_FALSE
+			for child in (value if is_list else (value,)):
+				if not isinstance(child, types):
+					raise ValidationError(
+						"Invalid node type in {0}.{1}:"
+						" {2} should be: {3}".format(
+							type(node).__name__, name,
+							type(child).__name__,
+							_get_names(types)))
 
-	# ##
+				pending.append(child)
 
-	def _visit(self, node):
-		restrictions = self.restrictions[-1]
 
-		if restrictions is not None:
-			restrictions.check(node)
+def _get_names(types):
+	if not isinstance(types, tuple):
+		types = (types,)
 
-		# Add layer for the child node
-		self.restrictions.append(None)
+	return " or ".join(t.__name__ for t in types)
 
-		traverse.Visitor._visit(self, node)
 
-		# And pop it back
-		self.restrictions.pop()
+# Validates the function with the given probability in percent. The function
+# is picked once, so the warped and the unwarped validation check the same
+# ones.
+def validate_sampled(function, percent, warped=True):
+	sampled = getattr(function, "_validation_sampled", None)
 
+	if sampled is None:
+		sampled = random.random() * 100 < percent
+		setattr(function, "_validation_sampled", sampled)
 
-def validate(ast, warped=True):
-	visitor = Visitor(warped)
-	traverse.traverse(visitor, ast)
+	if sampled:
+		validate(function, warped, nested=False)
@@ -0,0 +1,264 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import atexit
+import collections
+import functools
+import io
+import mmap
+import multiprocessing
+import multiprocessing.util
+import os
+import queue
+import zipfile
+
+import ljd.rawdump.parser
+import ljd.rawdump.debuginfo
+import ljd.pipeline
+import ljd.pseudoasm.writer
+import ljd.lua.writer
+
+import gconfig
+
+
+MODE_LUA = "lua"
+MODE_ASM = "asm"
+
+OUTPUT_SUFFIXES = {
+	MODE_LUA: ".lua",
+	MODE_ASM: ".asm"
+}
+
+# Chunks of the sources are handed to the workers at once to cut down the
+# IPC overhead on the big amounts of the small files
+_CHUNK_SIZE = 8
+
+# The last read zip archive. It is kept open, so the central directory is read
+# once per worker instead of once per member - the members of an archive come
+# one after another.
+_zip_file = None
+
+
+class File():
+	def __init__(self, path, output_name):
+		self.path = path
+
+		self.name = path
+		self.output_name = output_name
+
+	def read(self):
+		with open(self.path, 'rb') as fd:
+			return fd.read()
+
+
+class FileRegion():
+	def __init__(self, path, offset, size, suffix=".lua"):
+		self.path = path
+		self.offset = offset
+		self.size = size
+
+		self.name = "{0}@{1:#x}".format(path, offset)
+		self.output_name = "{0}@{1:08x}{2}".format(
+					os.path.basename(path), offset, suffix)
+
+	def read(self):
+		with open(self.path, 'rb') as fd:
+			with mmap.mmap(fd.fileno(), 0,
+					access=mmap.ACCESS_READ) as data:
+				return data[self.offset:self.offset + self.size]
+
+
+class ArchiveMember():
+	def __init__(self, path, member, output_name):
+		self.path = path
+		self.member = member
+
+		self.name = path + ":" + member
+		self.output_name = output_name
+
+	def read(self):
+		return _open_zip(self.path).read(self.member)
+
+
+class Buffer():
+	def __init__(self, name, data, output_name, id=None):
+		self.data = data
+		self.id = id
+
+		self.name = name
+		self.output_name = output_name
+
+	def read(self):
+		return self.data
+
+
+class Result():
+	def __init__(self, source):
+		self.name = source.name
+		self.output_name = source.output_name
+		self.id = getattr(source, "id", None)
+
+		self.text = None
+		self.error = None
+
+		# Functions written as the disassembly, see ljd.pipeline
+		self.fallbacks = 0
+
+
+def run(sources, jobs=None, mode=MODE_LUA, ordered=True,
+			debuginfo=ljd.rawdump.debuginfo.MODE_FULL):
+	handler = functools.partial(process, mode=mode, debuginfo=debuginfo)
+
+	# Not worth the pool - and keeps the things debuggable
+	if jobs == 1:
+		try:
+			yield from map(handler, sources)
+		finally:
+			close_archives()
+
+		return
+
+	if jobs is None:
+		jobs = os.cpu_count() or 1
+
+	# Keep a bounded window of the chunks in processing, so an endless
+	# source like a stream is not read ahead of the results without a limit
+	window = jobs * 4
+
+	flags = dict(gconfig.gFlagDic)
+
+	with multiprocessing.Pool(jobs, init_worker, (flags,)) as pool:
+		if ordered:
+			chunks = _split(sources, _CHUNK_SIZE)
+			yield from _run_ordered(pool, handler, chunks, window)
+		else:
+			# Chunks would hold the finished results back
+			chunks = _split(sources, 1)
+			yield from _run_unordered(pool, handler, chunks, window)
+
+		# Let the workers exit on their own and close their archives,
+		# leaving the context terminates them
+		pool.close()
+		pool.join()
+
+
+def process(source, mode=MODE_LUA,
+			debuginfo=ljd.rawdump.debuginfo.MODE_FULL):
+	result = Result(source)
+
+	try:
+		data = source.read()
+
+		header, prototype = ljd.rawdump.parser.parse_bytes(data,
+							source.name, debuginfo)
+
+		if prototype is None:
+			result.error = "Failed to parse the dump"
+			return result
+
+		fd = io.StringIO()
+
+		if mode == MODE_ASM:
+			ljd.pseudoasm.writer.write(fd, header, prototype)
+		else:
+			ast = ljd.pipeline.decompile(prototype)
+			ljd.lua.writer.write(fd, ast)
+
+			result.fallbacks = ljd.pipeline.count_fallbacks(ast)
+
+		result.text = fd.getvalue()
+	except Exception as e:
+		result.error = "{0}: {1}".format(type(e).__name__, e)
+
+	return result
+
+
+def close_archives():
+	global _zip_file
+
+	if _zip_file is not None:
+		_zip_file.close()
+		_zip_file = None
+
+
+def init_worker(flags):
+	# Workers are not guaranteed to be forked from the configured process
+	gconfig.gFlagDic.update(flags)
+
+	# The workers skip the atexit handlers
+	multiprocessing.util.Finalize(None, close_archives, exitpriority=0)
+
+
+def _process_all(sources, handler):
+	return [handler(source) for source in sources]
+
+
+def _split(sources, size):
+	chunk = []
+
+	for source in sources:
+		chunk.append(source)
+
+		if len(chunk) >= size:
+			yield chunk
+			chunk = []
+
+	if len(chunk) > 0:
+		yield chunk
+
+
+def _run_ordered(pool, handler, chunks, window):
+	pending = collections.deque()
+
+	for chunk in chunks:
+		pending.append(pool.apply_async(_process_all, (chunk, handler)))
+
+		if len(pending) >= window:
+			yield from pending.popleft().get()
+
+	while len(pending) > 0:
+		yield from pending.popleft().get()
+
+
+def _run_unordered(pool, handler, chunks, window):
+	done = queue.Queue()
+	pending = 0
+
+	for chunk in chunks:
+		pool.apply_async(_process_all, (chunk, handler),
+					callback=done.put, error_callback=done.put)
+		pending += 1
+
+		if pending >= window:
+			yield from _get_done(done)
+			pending -= 1
+
+	while pending > 0:
+		yield from _get_done(done)
+		pending -= 1
+
+
+def _get_done(done):
+	results = done.get()
+
+	if isinstance(results, BaseException):
+		raise results
+
+	return results
+
+
+def _open_zip(path):
+	global _zip_file
+
+	if _zip_file is not None and _zip_file.filename == path:
+		return _zip_file
+
+	close_archives()
+
+	_zip_file = zipfile.ZipFile(path)
+
+	return _zip_file
+
+
+atexit.register(close_archives)
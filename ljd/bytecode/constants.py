@@ -9,11 +9,55 @@ T_TRUE = 2
 
 class Table():
 	def __init__(self):
-		self.array = []
+		self._array = []
 
 		# Use a list so we can keep the original items order in the
 		# table
-		self.dictionary = []
+		self._dictionary = []
+
+		# The raw template the items are decoded from on the first
+		# access, if they were not decoded with the rest of the dump.
+		# Its items() yields the same as the items() below.
+		self.template = None
+
+	@property
+	def array(self):
+		if self.template is not None:
+			self._decode()
+
+		return self._array
+
+	@property
+	def dictionary(self):
+		if self.template is not None:
+			self._decode()
+
+		return self._dictionary
+
+	# Yields (is_array, key, value) in the dump order, where the key is the
+	# index for the array items. Doesn't store the undecoded items.
+	def items(self):
+		if self.template is not None:
+			return self.template.items()
+
+		return self._iterate_items()
+
+	def _iterate_items(self):
+		for index, value in enumerate(self._array):
+			yield True, index, value
+
+		for key, value in self._dictionary:
+			yield False, key, value
+
+	def _decode(self):
+		template = self.template
+		self.template = None
+
+		for is_array, key, value in template.items():
+			if is_array:
+				self._array.append(value)
+			else:
+				self._dictionary.append((key, value))
 
 
 class Constants():
@@ -20,13 +20,29 @@ class DebugInformation():
 		self.upvalue_variable_names = []
 		self.variable_info = []
 
+		# Fills in the fields above on the first lookup if they were
+		# not decoded with the rest of the dump
+		self.loader = None
+
+	def load(self):
+		loader = self.loader
+		self.loader = None
+
+		loader(self)
+
 	def lookup_line_number(self, addr):
+		if self.loader is not None:
+			self.load()
+
 		try:
 			return self.addr_to_line_map[addr]
 		except IndexError:
 			return 0
 
 	def lookup_local_name(self, addr, slot):
+		if self.loader is not None:
+			self.load()
+
 		for info in self.variable_info:
 			if info.start_addr > addr:
 				break
@@ -40,6 +56,9 @@ class DebugInformation():
 		return None
 
 	def lookup_upvalue_name(self, slot):
+		if self.loader is not None:
+			self.load()
+
 		try:
 			return self.upvalue_variable_names[slot]
 		except IndexError:
@@ -0,0 +1,125 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+#
+# Both the client and the wire format of the decompilation server. Keep it
+# free of the other ljd imports - the whole point of the client is to start
+# fast.
+#
+# Every message is a 4-byte big-endian length followed by a UTF-8 JSON object.
+#
+# Request: {"path": ...} or {"data": base64, "name": ...}, plus the options:
+#	"mode" - either "lua" or "asm"
+#	"debuginfo" - "full", "lazy" or "skip", as the --debuginfo of main.py
+#	"fallback" - "off", "budget" or "all", as the --fallback of main.py
+#	"budget", "budget_steps" - as the --budget and --budget-steps
+# An option left out is the one the server is started with.
+#
+# Response: {"ok": true, "output": ..., "fallbacks": ...} or
+# {"ok": false, "error": ...}, "fallbacks" is the number of the functions
+# written as the disassembly.
+#
+
+import base64
+import json
+import os
+import socket
+import struct
+
+
+_LENGTH = struct.Struct(">I")
+
+
+def send_message(sock, message):
+	data = json.dumps(message).encode("utf-8")
+
+	sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+# A message over the max_size is skipped, so the next one can still be read
+def receive_message(sock, max_size=None):
+	header = _receive_exactly(sock, _LENGTH.size)
+
+	if header is None:
+		return None
+
+	length = _LENGTH.unpack(header)[0]
+
+	if max_size is not None and length > max_size:
+		_skip_exactly(sock, length)
+
+		raise ValueError("Message of {0} bytes is over the limit of {1}"
+							.format(length, max_size))
+
+	data = _receive_exactly(sock, length)
+
+	if data is None:
+		raise IOError("Connection closed in the middle of a message")
+
+	message = json.loads(data.decode("utf-8"))
+
+	if not isinstance(message, dict):
+		raise ValueError("Message is not a JSON object")
+
+	return message
+
+
+def _receive_exactly(sock, size):
+	chunks = []
+
+	while size > 0:
+		chunk = sock.recv(min(size, 1024 * 1024))
+
+		if chunk == b'':
+			if len(chunks) == 0:
+				return None
+
+			raise IOError("Connection closed in the middle of a message")
+
+		chunks.append(chunk)
+		size -= len(chunk)
+
+	return b''.join(chunks)
+
+
+def _skip_exactly(sock, size):
+	while size > 0:
+		chunk = sock.recv(min(size, 1024 * 1024))
+
+		if chunk == b'':
+			raise IOError("Connection closed in the middle of a message")
+
+		size -= len(chunk)
+
+
+class Client():
+	def __init__(self, socket_path):
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.connect(socket_path)
+
+	def close(self):
+		self.sock.close()
+
+	def decompile_file(self, path, mode="lua", **options):
+		return self._request(dict(options,
+			path=os.path.abspath(path),
+			mode=mode
+		))
+
+	def decompile_bytes(self, data, name="", mode="lua", **options):
+		return self._request(dict(options,
+			data=base64.b64encode(data).decode("ascii"),
+			name=name,
+			mode=mode
+		))
+
+	def _request(self, request):
+		send_message(self.sock, request)
+
+		response = receive_message(self.sock)
+
+		if response is None:
+			raise IOError("Server closed the connection")
+
+		return response
@@ -2,6 +2,7 @@
 # Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
 #
 
+import itertools
 import re
 
 import ljd.ast.nodes as nodes
@@ -36,6 +37,23 @@ STATEMENT_FUNCTION = 9
 
 VALID_IDENTIFIER = re.compile(r'^\w[\w\d]*$')
 
+_STRING_ESCAPES = str.maketrans({
+	"\\": "\\\\",
+	"\t": "\\t",
+	"\n": "\\n",
+	"\r": "\\r",
+	"\"": "\\\""
+})
+
+# Rendered literals kept per written file, the cache is simply dropped when
+# it grows past this
+_LITERALS_CACHE_SIZE = 4096
+
+# A node is visited once per parent: the children are marked with the mark of
+# the parent visit. The marks are unique across the writers, so the marks left
+# on a tree by another writer never match.
+_marks = itertools.count(1)
+
 
 class _State():
 	def __init__(self):
@@ -50,9 +68,12 @@ class Visitor(traverse.Visitor):
 
 		self.print_queue = []
 
-		self._visited_nodes = [set()]
+		self._mark = next(_marks)
 		self._states = [_State()]
 
+		self._strings = {}
+		self._numbers = {}
+
 	# ##
 
 	def _start_statement(self, statement):
@@ -113,6 +134,11 @@ class Visitor(traverse.Visitor):
 
 		self._end_line()
 
+		if node._fallback is not None:
+			self._start_block()
+			self._write_fallback(node)
+			self._end_block()
+
 		self._visit(node.statements)
 
 		self._write("end")
@@ -120,9 +146,22 @@ class Visitor(traverse.Visitor):
 		if is_statement:
 			self._end_statement(STATEMENT_FUNCTION)
 
+	def _write_fallback(self, node):
+		for line in node._fallback:
+			self._write(("-- " + line).rstrip())
+			self._end_line()
+
 	# ##
 
 	def visit_table_constructor(self, node):
+		if node._template is not None:
+			self._write_table_template(node._template)
+
+			self._skip(node.array)
+			self._skip(node.records)
+
+			return
+
 		self._write("{")
 
 		if len(node.records.contents) + len(node.array.contents) > 0:
@@ -163,6 +202,46 @@ class Visitor(traverse.Visitor):
 
 		self._write("}")
 
+	# The same as above for the records built from the template, but
+	# without building them
+	def _write_table_template(self, table):
+		texts = []
+		items_count = 0
+
+		for is_array, key, value in table.items():
+			items_count += 1
+
+			if not is_array:
+				if isinstance(key, str) and VALID_IDENTIFIER.match(key):
+					text = key + " = "
+				else:
+					text = "[" + self._format_literal(key) + "] = "
+
+				texts.append(text + self._format_literal(value))
+			elif key != 0:
+				texts.append(self._format_literal(value))
+			elif value is not None:
+				texts.append("[0] = " + self._format_literal(value))
+
+		self._write("{")
+
+		if items_count > 0:
+			self._end_line()
+
+			self._start_block()
+
+			for text in texts[:-1]:
+				self._write(text + ",")
+				self._end_line()
+
+			if len(texts) > 0:
+				self._write(texts[-1])
+				self._end_line()
+
+			self._end_block()
+
+		self._write("}")
+
 	def visit_table_record(self, node):
 		if self._is_valid_name(node.key):
 			self._write(node.key.value)
@@ -703,30 +782,12 @@ class Visitor(traverse.Visitor):
 	# ##
 
 	def visit_constant(self, node):
-		if node.type != nodes.Constant.T_STRING:
-			self._write(node.value)
-			return
-
-		lines = node.value.count("\n")
-
-		if lines > 2:
-			self._write("[[")
-
-			self._write("\n")
-
+		if node.type == nodes.Constant.T_STRING:
+			self._write(self._format_string(node.value))
+		elif node.type == nodes.Constant.T_CDATA:
 			self._write(node.value)
-
-			self._write("]]")
 		else:
-			text = node.value
-
-			text = text.replace("\\", "\\\\")
-			text = text.replace("\t", "\\t")
-			text = text.replace("\n", "\\n")
-			text = text.replace("\r", "\\r")
-			text = text.replace("\"", "\\\"")
-
-			self._write('"' + text + '"')
+			self._write(self._format_number(node.value))
 
 	def visit_primitive(self, node):
 		if node.type == nodes.Primitive.T_FALSE:
@@ -736,25 +797,75 @@ class Visitor(traverse.Visitor):
 		else:
 			self._write("nil")
 
+	def _format_string(self, value):
+		text = self._strings.get(value)
+
+		if text is None:
+			if len(self._strings) >= _LITERALS_CACHE_SIZE:
+				self._strings.clear()
+
+			text = _format_string(value)
+			self._strings[value] = text
+
+		return text
+
+	def _format_number(self, value):
+		# 1 == 1.0 and 0.0 == -0.0, but they are written differently
+		key = (type(value), value, str(value)[0] == "-") \
+				if value == 0 else (type(value), value)
+
+		text = self._numbers.get(key)
+
+		if text is None:
+			if len(self._numbers) >= _LITERALS_CACHE_SIZE:
+				self._numbers.clear()
+
+			text = str(value)
+			self._numbers[key] = text
+
+		return text
+
+	# Renders a raw constant value just like the corresponding node
+	def _format_literal(self, value):
+		if value is None:
+			return "nil"
+		elif value is True:
+			return "true"
+		elif value is False:
+			return "false"
+		elif isinstance(value, str):
+			return self._format_string(value)
+		else:
+			return self._format_number(value)
+
 	def _skip(self, node):
-		self._visited_nodes[-1].add(node)
+		node._written_mark = self._mark
 
 	def _visit(self, node):
 		assert node is not None
 
-		if node in self._visited_nodes[-1]:
+		mark = self._mark
+
+		if getattr(node, "_written_mark", None) == mark:
 			return
 
-		self._visited_nodes[-1].add(node)
+		node._written_mark = mark
 
 		# TODO: add check
 		# "It looks like you forgot about some node changes..."
 
-		self._visited_nodes.append(set())
+		self._mark = next(_marks)
+
+		node._accept(self)
 
-		traverse.Visitor._visit(self, node)
+		self._mark = mark
 
-		self._visited_nodes.pop()
+
+def _format_string(value):
+	if value.count("\n") > 2:
+		return "[[\n" + value + "]]"
+
+	return '"' + value.translate(_STRING_ESCAPES) + '"'
 
 
 def write(fd, ast):
@@ -762,6 +873,9 @@ def write(fd, ast):
 
 	visitor = Visitor()
 
+	if ast._fallback is not None:
+		visitor._write_fallback(ast)
+
 	traverse.traverse(visitor, ast.statements)
 
 	_process_queue(fd, visitor.print_queue)
@@ -0,0 +1,396 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import functools
+import io
+import time
+
+import ljd.ast.builder
+import ljd.ast.validator
+import ljd.ast.locals
+import ljd.ast.slotworks
+import ljd.ast.structure
+import ljd.ast.unwarper
+import ljd.ast.mutator
+import ljd.ast.traverse as traverse
+import ljd.pseudoasm.writer
+import ljd.util.budget
+
+import gconfig
+
+
+# What a function falls back to its disassembly on: nothing, running out of
+# the budget and the unsupported constructs or any error
+FALLBACK_OFF = "off"
+FALLBACK_BUDGET = "budget"
+FALLBACK_ALL = "all"
+
+_FALLBACK_ERRORS = {
+	FALLBACK_OFF: (),
+	FALLBACK_BUDGET: (ljd.util.budget.BudgetExceeded, NotImplementedError),
+	FALLBACK_ALL: (Exception,)
+}
+
+
+class PipelineError(Exception):
+	pass
+
+
+class Pass():
+	def __init__(self, name, function, requires=(), per_function=False,
+							incremental=False):
+		self.name = name
+
+		# Called with the AST root. A per function pass is called with
+		# every function definition instead and must not enter the
+		# nested ones.
+		self.function = function
+
+		self.requires = tuple(requires)
+		self.per_function = per_function
+
+		# An incremental per function pass is skipped for the functions
+		# not changed since the last run of the manager, so it must
+		# not change a function it has been run over already
+		self.incremental = incremental
+
+
+#
+# Runs the passes over the AST in the order of their prerequisites. The
+# adjacent per function passes are run one function after another, innermost
+# first, so all of them are done with a function before the next one is
+# touched.
+#
+# With a journal the manager marks the functions clean at the end of a run, see
+# ljd.ast.journal. The incremental passes of the next run skip the functions
+# without changes since then, unless some other pass has been run over the
+# function before them.
+#
+# A hook is called as hook(pass_, node, run) instead of run(node) for every
+# pass run, so it may time the pass, skip it or run something else instead.
+#
+# A function over the budget or with an unsupported construct is left with an
+# empty body and its disassembly as a comment, while the rest of the functions
+# are decompiled as usual. With FALLBACK_ALL any error of the per function
+# passes is handled this way, except for the validation errors.
+#
+class PassManager():
+	def __init__(self, passes=()):
+		self.passes = []
+		self.hooks = []
+
+		# ljd.util.budget.Budget of every function in a per function
+		# passes group
+		self.budget = None
+		self.fallback = FALLBACK_BUDGET
+
+		# ljd.ast.journal.Journal for the incremental runs. Off by
+		# default, as marking the functions clean takes a walk over the
+		# whole tree, which a single run has no use of.
+		self.journal = None
+
+		self._skipped = set()
+
+		for pass_ in passes:
+			self.add(pass_)
+
+	def add(self, pass_):
+		if self._find(pass_.name) is not None:
+			raise PipelineError("Duplicate pass: " + pass_.name)
+
+		self.passes.append(pass_)
+
+	def replace(self, name, function):
+		pass_ = self._get(name)
+
+		self.passes[self.passes.index(pass_)] = Pass(name, function,
+							pass_.requires,
+							pass_.per_function,
+							pass_.incremental)
+
+	# The skipped pass still satisfies the prerequisites of the others
+	def skip(self, name, skip=True):
+		self._get(name)
+
+		if skip:
+			self._skipped.add(name)
+		else:
+			self._skipped.discard(name)
+
+	def add_hook(self, hook):
+		self.hooks.append(hook)
+
+	def schedule(self):
+		scheduled = []
+		done = set()
+
+		pending = list(self.passes)
+
+		while len(pending) > 0:
+			for pass_ in pending:
+				if all(name in done for name in pass_.requires):
+					break
+			else:
+				raise PipelineError(
+					"Unknown or cyclic prerequisites of: "
+					+ ", ".join(p.name for p in pending))
+
+			pending.remove(pass_)
+			done.add(pass_.name)
+
+			if pass_.name not in self._skipped:
+				scheduled.append(pass_)
+
+		return scheduled
+
+	def run(self, ast):
+		schedule = self.schedule()
+
+		# The passes move the functions around, but never add or drop
+		# them, so the list is only gathered again after a whole tree
+		# pass
+		functions = None
+
+		i = 0
+
+		while i < len(schedule):
+			pass_ = schedule[i]
+
+			if not pass_.per_function:
+				self._run_pass(pass_, ast)
+				functions = None
+				i += 1
+				continue
+
+			group_end = i + 1
+
+			while group_end < len(schedule) \
+					and schedule[group_end].per_function:
+				group_end += 1
+
+			if functions is None:
+				functions = _gather_functions(ast)
+
+			for function in functions:
+				self._run_function(schedule[i:group_end], function)
+
+			i = group_end
+
+		if self.journal is not None:
+			self._mark_clean(ast)
+
+		return ast
+
+	def _mark_clean(self, ast):
+		ljd.ast.structure.invalidate()
+
+		for function in _gather_functions(ast):
+			self.journal.mark_clean(function)
+
+	def _run_function(self, passes, function):
+		if function._fallback is not None:
+			return
+
+		dirty = True
+
+		if self.journal is not None \
+				and any(pass_.incremental for pass_ in passes):
+			ljd.ast.structure.invalidate()
+			dirty = self.journal.is_dirty(function)
+
+		ljd.util.budget.activate(self.budget)
+
+		try:
+			for pass_ in passes:
+				ljd.util.budget.step(0)
+
+				if pass_.incremental and not dirty:
+					continue
+
+				self._run_pass(pass_, function)
+
+				dirty = True
+		except ljd.ast.validator.ValidationError:
+			raise
+		except _FALLBACK_ERRORS[self.fallback] as e:
+			_fall_back(function, e)
+		finally:
+			ljd.util.budget.activate(None)
+
+	def _run_pass(self, pass_, node):
+		run = pass_.function
+
+		for hook in self.hooks:
+			run = functools.partial(hook, pass_, run=run)
+
+		ljd.ast.structure.invalidate()
+
+		run(node)
+
+	def _find(self, name):
+		for pass_ in self.passes:
+			if pass_.name == name:
+				return pass_
+
+		return None
+
+	def _get(self, name):
+		pass_ = self._find(name)
+
+		if pass_ is None:
+			raise PipelineError("Unknown pass: " + name)
+
+		return pass_
+
+
+# Sums the time spent in every pass, to be added as a hook
+class PassTimer():
+	def __init__(self):
+		self.totals = {}
+
+	def __call__(self, pass_, node, run):
+		start = time.perf_counter()
+
+		run(node)
+
+		elapsed = time.perf_counter() - start
+
+		self.totals[pass_.name] = self.totals.get(pass_.name, 0) + elapsed
+
+
+def _fall_back(function, error):
+	lines = ["Failed to decompile: {0}: {1}".format(type(error).__name__,
+									error)]
+
+	if function._prototype is not None:
+		fd = io.StringIO()
+
+		# The disassembler has its own failures, the error alone is
+		# better than nothing then
+		try:
+			ljd.pseudoasm.writer.write_prototype(fd,
+							function._prototype)
+		except Exception:
+			pass
+		else:
+			lines.append("")
+			lines += fd.getvalue().rstrip().splitlines()
+
+	function._fallback = lines
+	function.statements.contents = []
+
+
+class _FunctionsCollector(traverse.Visitor):
+	def __init__(self):
+		self.result = []
+
+	def leave_function_definition(self, node):
+		self.result.append(node)
+
+
+def count_fallbacks(ast):
+	return sum(function._fallback is not None
+				for function in _gather_functions(ast))
+
+
+def _gather_functions(ast):
+	collector = _FunctionsCollector()
+	traverse.traverse(collector, ast)
+	return collector.result
+
+
+def _per_function(function, **kargs):
+	return functools.partial(function, nested=False, **kargs)
+
+
+# The validation passes check the given percentage of the functions
+def create_default_passes(validate=100):
+	return [
+		Pass("validate_warped",
+			functools.partial(_validate, percent=validate,
+								warped=True),
+			per_function=True,
+			incremental=True),
+
+		Pass("pre_pass",
+			_per_function(ljd.ast.mutator.pre_pass),
+			("validate_warped",),
+			per_function=True),
+
+		Pass("mark_locals",
+			_per_function(ljd.ast.locals.mark_locals),
+			("pre_pass",),
+			per_function=True),
+
+		Pass("eliminate_temporary",
+			_per_function(ljd.ast.slotworks.eliminate_temporary),
+			("mark_locals",),
+			per_function=True),
+
+		Pass("unwarp",
+			_per_function(ljd.ast.unwarper.unwarp),
+			("eliminate_temporary",),
+			per_function=True),
+
+		Pass("mark_local_definitions",
+			_per_function(ljd.ast.locals.mark_local_definitions),
+			("unwarp",),
+			per_function=True),
+
+		Pass("primary_pass",
+			_per_function(ljd.ast.mutator.primary_pass),
+			("mark_local_definitions",),
+			per_function=True,
+			incremental=True),
+
+		Pass("validate",
+			functools.partial(_validate, percent=validate,
+								warped=False),
+			("primary_pass",),
+			per_function=True,
+			incremental=True)
+	]
+
+
+# The validation is off unless asked for with the "validate" flag - the
+# percentage of the functions to check. The budget is set by the
+# "budget_seconds" and "budget_steps" flags, the fallback by the "fallback"
+# one.
+def create_default_manager(validate=None):
+	if validate is None:
+		validate = gconfig.gFlagDic.get("validate", 0)
+
+	manager = PassManager(create_default_passes(validate))
+
+	if validate <= 0:
+		manager.skip("validate_warped")
+		manager.skip("validate")
+
+	seconds = gconfig.gFlagDic.get("budget_seconds")
+	steps = gconfig.gFlagDic.get("budget_steps")
+
+	if seconds is not None or steps is not None:
+		manager.budget = ljd.util.budget.Budget(seconds, steps)
+
+	manager.fallback = gconfig.gFlagDic.get("fallback", FALLBACK_BUDGET)
+
+	return manager
+
+
+def _validate(function, percent, warped):
+	if percent >= 100:
+		ljd.ast.validator.validate(function, warped, nested=False)
+	else:
+		ljd.ast.validator.validate_sampled(function, percent, warped)
+
+
+def decompile(prototype, manager=None):
+	ast = ljd.ast.builder.build(prototype)
+
+	assert ast is not None
+
+	if manager is None:
+		manager = create_default_manager()
+
+	return manager.run(ast)
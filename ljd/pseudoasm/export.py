@@ -0,0 +1,142 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import csv
+import json
+
+import ljd.bytecode.instructions as ins
+from ljd.bytecode.constants import T_NIL, T_FALSE, T_TRUE
+
+
+FORMAT_JSONL = "jsonl"
+FORMAT_CSV = "csv"
+
+FIELDS = (
+	"file",
+	"prototype",
+	"addr",
+	"line",
+	"opcode",
+	"a",
+	"b",
+	"cd",
+	"constant",
+	"upvalue",
+	"target",
+	"local"
+)
+
+_MAIN_PATH = "main"
+
+_SLOT_TYPES = (ins.T_VAR, ins.T_DST, ins.T_BS, ins.T_RBS)
+
+
+#
+# Yields a record per instruction of the prototype and all of its children.
+# A child follows right after the FNEW instruction creating it, just as in
+# the disassembly. Prototypes are named by the path of the complex constant
+# indices from the main one, i.e. "main/3/1".
+#
+def iterate(prototype, origin, path=_MAIN_PATH):
+	instructions = prototype.instructions
+	debuginfo = prototype.debuginfo
+
+	# skip the first function header
+	addr = 1
+
+	while addr < len(instructions):
+		instruction = instructions[addr]
+
+		A = instruction.A if instruction.A_type is not None else None
+		B = instruction.B if instruction.B_type is not None else None
+		CD = instruction.CD if instruction.CD_type is not None else None
+
+		record = {
+			"file": origin,
+			"prototype": path,
+			"addr": addr,
+			"line": debuginfo.lookup_line_number(addr),
+			"opcode": instruction.name,
+			"a": A,
+			"b": B,
+			"cd": CD,
+			"constant": None,
+			"upvalue": None,
+			"target": None,
+			"local": None
+		}
+
+		_resolve(record, prototype, path, addr, A, instruction.A_type)
+		_resolve(record, prototype, path, addr, B, instruction.B_type)
+		_resolve(record, prototype, path, addr, CD, instruction.CD_type)
+
+		if instruction.A_type in _SLOT_TYPES:
+			info = debuginfo.lookup_local_name(addr, A)
+
+			if info is not None:
+				record["local"] = info.name
+
+		yield record
+
+		if instruction.opcode == ins.FNEW.opcode:
+			child = prototype.constants.complex_constants[instruction.CD]
+			child_path = path + "/" + str(instruction.CD)
+
+			yield from iterate(child, origin, child_path)
+
+		addr += 1
+
+
+def _resolve(record, prototype, path, addr, value, value_type):
+	constants = prototype.constants
+
+	if value_type == ins.T_STR or value_type == ins.T_CDT:
+		record["constant"] = constants.complex_constants[value]
+	elif value_type == ins.T_NUM:
+		record["constant"] = constants.numeric_constants[value]
+	elif value_type == ins.T_PRI:
+		if value is None or value == T_NIL:
+			record["constant"] = None
+		elif value is True or value == T_TRUE:
+			record["constant"] = True
+		else:
+			assert value is False or value == T_FALSE
+			record["constant"] = False
+	elif value_type == ins.T_TAB:
+		record["constant"] = "table#k" + str(value)
+	elif value_type == ins.T_FUN:
+		record["constant"] = path + "/" + str(value)
+	elif value_type == ins.T_UV:
+		record["upvalue"] = prototype.debuginfo.lookup_upvalue_name(value)
+	elif value_type == ins.T_JMP:
+		record["target"] = 1 + addr + value
+
+
+class JSONLinesWriter():
+	def __init__(self, fd):
+		self.fd = fd
+
+	def write(self, records):
+		write = self.fd.write
+
+		for record in records:
+			write(json.dumps(record, default=str) + "\n")
+
+
+class CSVWriter():
+	def __init__(self, fd):
+		self.writer = csv.DictWriter(fd, FIELDS)
+		self.writer.writeheader()
+
+	def write(self, records):
+		self.writer.writerows(records)
+
+
+def open_writer(fd, fmt):
+	if fmt == FORMAT_CSV:
+		return CSVWriter(fd)
+
+	assert fmt == FORMAT_JSONL
+
+	return JSONLinesWriter(fd)
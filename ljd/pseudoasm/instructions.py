@@ -2,13 +2,20 @@
 # Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
 #
 
+import bisect
+
 import ljd.bytecode.instructions as ins
 from ljd.bytecode.constants import T_NIL, T_FALSE, T_TRUE
 
 import ljd.pseudoasm.prototype
 
+_SLOTS_COUNT = 256
+
 _FORMAT = "{addr:3}\t[{line:3}]\t{name:<5}\t{a:3}\t{b}\t{c}\t; {description}"
 
+# The same columns as the _FORMAT, but positional and pre-bound
+_format_instruction = "{0:3}\t[{1:3}]\t{2:<5}\t{3:3}\t{4}\t{5}\t; {6}".format
+
 
 _DESCRIPTION_HANDLERS = [None] * 255
 
@@ -21,6 +28,12 @@ class _State():
 		self.prototype = prototype
 		self.instructions = instructions
 
+		self.definitions, self.range_definitions = \
+					_collect_definitions(instructions)
+
+		# Names of the already resolved definitions by address
+		self.definition_names = {}
+
 
 def write(writer, prototype):
 	global _MAP
@@ -29,12 +42,13 @@ def write(writer, prototype):
 	addr = 1
 
 	instructions = prototype.instructions
+	lookup_line_number = prototype.debuginfo.lookup_line_number
 
 	writer = _State(writer, prototype, instructions)
 
 	while addr < len(instructions):
 		instruction = instructions[addr]
-		line = prototype.debuginfo.lookup_line_number(addr)
+		line = lookup_line_number(addr)
 
 		if instruction.opcode == ins.FNEW.opcode:
 			_write_function(writer, addr, line, instruction)
@@ -47,16 +61,22 @@ def write(writer, prototype):
 def _write_instruction(writer, addr, line, instruction):
 	description = _translate_description(writer, addr, line, instruction)
 
-	writer.stream.write_multiline(_FORMAT,
-		addr=addr,
-		line=line,
-		name=instruction.name,
-		a=instruction.A if instruction.A_type is not None else "",
-		b=instruction.B	if instruction.B_type is not None else "",
-		c=instruction.CD if instruction.CD_type is not None else "",
-		description=description
+	text = _format_instruction(
+		addr,
+		line,
+		instruction.name,
+		instruction.A if instruction.A_type is not None else "",
+		instruction.B if instruction.B_type is not None else "",
+		instruction.CD if instruction.CD_type is not None else "",
+		description
 	)
 
+	# String constants may bring their own line breaks
+	if "\n" in text:
+		writer.stream.write_multiline(text)
+	else:
+		writer.stream.write_formatted_line(text)
+
 
 def _write_function(writer, addr, line, instruction):
 	prototype = writer.prototype.constants.complex_constants[instruction.CD]
@@ -102,8 +122,7 @@ def _translate(writer, addr, value, attr_type):
 		else:
 			return "slot" + str(value)
 	elif attr_type == ins.T_UV:
-		name = prototype.debuginfo.lookup_upvalue_name(value)
-		return "uv" + str(value) + '"' + name + '"'
+		return _format_upvalue(writer, value)
 	elif attr_type == ins.T_PRI:
 		if value is None or value == T_NIL:
 			return "nil"
@@ -132,78 +151,164 @@ def _translate(writer, addr, value, attr_type):
 
 
 def _lookup_variable_name(writer, addr, slot):
+	# MOV definitions which share the name with the one we are looking for
+	moves = []
+
 	while True:
-		result = _lookup_variable_name_step(writer, addr, slot)
+		name = _lookup_local_name(writer, addr, slot)
+
+		if name is not None:
+			break
+
+		definition = _find_definition(writer, addr, slot)
+
+		if definition is None:
+			break
+
+		if definition in writer.definition_names:
+			name = writer.definition_names[definition]
+			break
 
-		if isinstance(result, tuple):
-			addr = result[0]
-			slot = result[1]
+		instruction = writer.instructions[definition]
+
+		if instruction.opcode == ins.MOV.opcode:
+			moves.append(definition)
+
+			addr = definition
+			slot = instruction.CD
 			continue
 
-		return result
+		name = _get_definition_name(writer, definition, instruction)
+		writer.definition_names[definition] = name
+
+		break
 
+	for definition in moves:
+		writer.definition_names[definition] = name
 
-def _lookup_variable_name_step(writer, addr, slot):
+	return name
+
+
+def _lookup_local_name(writer, addr, slot):
 	info = writer.prototype.debuginfo.lookup_local_name(addr, slot)
 
-	if info is not None:
-		name = info.name
+	if info is None:
+		return None
 
-		if name[0] == '<':
-			name = "slot" + str(slot) + name
+	name = info.name
 
-		return name
+	if name[0] == '<':
+		name = "slot" + str(slot) + name
 
-	instructions = writer.instructions
+	return name
 
-	knil_opcode = ins.KNIL.opcode
+
+def _get_definition_name(writer, addr, instruction):
 	constants = writer.prototype.constants.complex_constants
 
-	while addr > 1:
-		addr -= 1
-		instruction = instructions[addr]
+	if instruction.A_type == ins.T_BS:
+		return None
 
-		if instruction.A_type == ins.T_BS:
-			if slot >= instruction.A 				\
-					and (instruction.opcode == knil_opcode	\
-						or slot <= instruction.CD):
-				return None
+	if instruction.opcode == ins.GGET.opcode:
+		return constants[instruction.CD]
 
-			continue
+	# field or method
+	if instruction.opcode == ins.TGETS.opcode:
+		table = _lookup_variable_name(writer, addr, instruction.B)
 
-		if instruction.A_type != ins.T_DST or instruction.A != slot:
-			continue
+		if table is None:
+			table = "<unknown table>"
 
-		if instruction.opcode == ins.MOV.opcode:
-			# Retry with new addr and slot
-			return addr, instruction.CD
+		binary = constants[instruction.CD]
+		return table + "." + binary
+
+	if instruction.opcode == ins.UGET.opcode:
+		return _format_upvalue(writer, instruction.CD)
 
-		if instruction.opcode == ins.GGET.opcode:
-			binary = constants[instruction.CD]
-			return binary
+	return None
+
+
+def _format_upvalue(writer, uv):
+	name = writer.prototype.debuginfo.lookup_upvalue_name(uv)
+
+	# No names in the stripped dumps
+	if name is None:
+		return "uv" + str(uv)
 
-		# field or method
-		if instruction.opcode == ins.TGETS.opcode:
-			table_slot = instruction.B
-			table = _lookup_variable_name_step(writer, addr, table_slot)
+	return "uv" + str(uv) + '"' + name + '"'
 
-			if table is None:
-				table = "<unknown table>"
 
-			binary = constants[instruction.CD]
-			return table + "." + binary
+#
+# The latest instruction before the addr which either writes the slot or
+# clobbers it as a part of a base-relative range. Instructions are scanned
+# in the address order, the control flow isn't taken into account.
+#
+def _find_definition(writer, addr, slot):
+	if slot < 0:
+		return None
+
+	if slot >= _SLOTS_COUNT:
+		return _find_wide_definition(writer, addr, slot)
 
-		if instruction.opcode == ins.UGET.opcode:
-			uv = instruction.CD
-			name = writer.prototype.debuginfo.lookup_upvalue_name(uv)
+	definitions = writer.definitions[slot]
 
-			return "uv" + str(uv) + '"' + name + '"'
+	i = bisect.bisect_left(definitions, addr)
 
+	if i == 0:
 		return None
 
+	return definitions[i - 1]
+
+
+# Slots can't be that high in a sane dump, but the operands may be anything
+def _find_wide_definition(writer, addr, slot):
+	knil_opcode = ins.KNIL.opcode
+
+	i = bisect.bisect_left(writer.range_definitions, addr)
+
+	while i > 0:
+		i -= 1
+
+		instruction = writer.instructions[writer.range_definitions[i]]
+
+		if slot >= instruction.A 				\
+				and (instruction.opcode == knil_opcode	\
+					or slot <= instruction.CD):
+			return writer.range_definitions[i]
+
 	return None
 
 
+def _collect_definitions(instructions):
+	definitions = [[] for _ in range(_SLOTS_COUNT)]
+	range_definitions = []
+
+	knil_opcode = ins.KNIL.opcode
+
+	addr = 1
+
+	while addr < len(instructions):
+		instruction = instructions[addr]
+
+		if instruction.A_type == ins.T_BS:
+			range_definitions.append(addr)
+
+			if instruction.opcode == knil_opcode:
+				last = _SLOTS_COUNT - 1
+			else:
+				last = min(instruction.CD, _SLOTS_COUNT - 1)
+
+			for slot in range(instruction.A, last + 1):
+				definitions[slot].append(addr)
+		elif instruction.A_type == ins.T_DST \
+				and instruction.A < _SLOTS_COUNT:
+			definitions[instruction.A].append(addr)
+
+		addr += 1
+
+	return definitions, range_definitions
+
+
 def _translate_standard(writer, addr, line, instruction):
 	A = None
 	B = None
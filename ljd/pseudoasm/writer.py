@@ -15,19 +15,31 @@ class _State():
 
 
 def write(fd, header, prototype):
+	source = "N/A" if header.flags.is_stripped else header.name
+
+	_write_header(fd, header, source)
+
+	write_prototype(fd, prototype, source)
+
+
+# Writes the prototype and its children only, without the dump header
+def write_prototype(fd, prototype, source="N/A"):
 	writer = _State()
 
 	writer.stream = ljd.util.indentedstream.IndentedStream(fd)
-	writer.flags = header.flags
-	writer.source = "N/A" if header.flags.is_stripped else header.name
+	writer.source = source
 
-	_write_header(writer, header)
+	# Whatever is written before a failure is still passed to the fd
+	try:
+		ljd.pseudoasm.prototype.write(writer, prototype)
+	finally:
+		writer.stream.flush()
 
-	ljd.pseudoasm.prototype.write(writer, prototype)
 
+def _write_header(fd, header, source):
+	stream = ljd.util.indentedstream.IndentedStream(fd)
 
-def _write_header(writer, header):
-	writer.stream.write_multiline("""
+	stream.write_multiline("""
 ;
 ; Disassemble of {origin}
 ;
@@ -40,7 +52,9 @@ def _write_header(writer, header):
 ;
 
 """, 		origin=header.origin,
-		source=writer.source,
+		source=source,
 		stripped="Yes" if header.flags.is_stripped else "No",
 		endianness="Big" if header.flags.is_big_endian else "Little",
 		ffi="Present" if header.flags.has_ffi else "Not present")
+
+	stream.flush()
@@ -0,0 +1,44 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import mmap
+import os
+
+import ljd.rawdump.header as header
+import ljd.rawdump.scanner as scanner
+
+
+#
+# Searches for the embedded dumps in an arbitrary binary. Every magic is only
+# a candidate - it has to survive the header and the prototype size chain walk
+# to be reported. The search goes on right after the end of a valid dump, so
+# dumps are never reported overlapped.
+#
+def carve(data, origin=""):
+	pos = data.find(header.MAGIC)
+
+	while pos >= 0:
+		summary = scanner.Summary()
+		summary.origin = origin
+		summary.is_luajit = True
+
+		try:
+			end = scanner.walk(data, pos, summary)
+		except scanner.ScanError:
+			pos = data.find(header.MAGIC, pos + 1)
+			continue
+
+		yield summary
+
+		pos = data.find(header.MAGIC, end)
+
+
+def carve_file(filename):
+	with open(filename, 'rb') as fd:
+		# mmap refuses empty files
+		if os.fstat(fd.fileno()).st_size == 0:
+			return
+
+		with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+			yield from carve(data, filename)
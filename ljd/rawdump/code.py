@@ -193,6 +193,16 @@ def read(parser):
 	return instruction
 
 
+# The instruction definition for the raw opcode
+def get_definition(opcode):
+	instruction_class = _MAP[opcode]
+
+	if instruction_class is None:
+		return instructions.UNKNW  # @UndefinedVariable
+
+	return instruction_class
+
+
 def _set_instruction_operands(parser, codeword, instruction):
 	if instruction.args_count == 3:
 		A = (codeword >> 8) & 0xFF
@@ -2,10 +2,12 @@
 # Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
 #
 
+import array
 import sys
 import struct
 
 import ljd.bytecode.constants
+import ljd.util.binstream
 
 import gconfig
 
@@ -25,6 +27,15 @@ BCDUMP_KTAB_NUM = 4
 BCDUMP_KTAB_STR = 5
 
 
+_INT32_MAX = 0xFFFFFFFF
+
+# Unsigned and signed typecodes of the same 32-bit width
+if array.array("I").itemsize == 4:
+	_UINT32_TYPECODE, _INT32_TYPECODE = "I", "i"
+else:
+	_UINT32_TYPECODE, _INT32_TYPECODE = "L", "l"
+
+
 def read(parser, constants):
 	r = True
 
@@ -47,6 +58,10 @@ def _read_upvalue_references(parser, references):
 
 
 def _read_complex_constants(parser, complex_constants):
+	# The rest of the prototype, peeked at the first template table
+	rest = None
+	rest_offset = 0
+
 	i = 0
 
 	while i < parser.complex_constants_count:
@@ -61,10 +76,14 @@ def _read_complex_constants(parser, complex_constants):
 			#zzw 20180714 support str encode
 			complex_constants.append(string.decode(gconfig.gFlagDic['strEncode']))
 		elif constant_type == BCDUMP_KGC_TAB:
-			table = ljd.bytecode.constants.Table()
+			if rest is None:
+				rest_offset = parser.stream.pos
+				rest = parser.stream.peek(parser.end - rest_offset)
+
+			start = parser.stream.pos - rest_offset
 
-			if not _read_table(parser, table):
-				return False
+			table = ljd.bytecode.constants.Table()
+			table.template = _read_table_template(parser, rest, start)
 
 			complex_constants.append(table)
 		elif constant_type != BCDUMP_KGC_CHILD:
@@ -83,22 +102,67 @@ def _read_complex_constants(parser, complex_constants):
 	return True
 
 
+#
+# The numeric constants are the last thing before the debug info, so the
+# whole section is read at once. The raw doubles and integers are collected
+# into the arrays first and reinterpreted all together afterwards.
+#
 def _read_numeric_constants(parser, numeric_constants):
+	size = parser.end - parser.debuginfo_size - parser.stream.pos
+
+	if size < 0:
+		raise IOError("Numeric constants are out of the prototype")
+
+	data = parser.stream.read_bytes(size)
+
+	decode_uleb128 = ljd.util.binstream.decode_uleb128
+	decode_uleb128_from33bit = ljd.util.binstream.decode_uleb128_from33bit
+
+	doubles = array.array("Q")
+	doubles_at = []
+
+	integers = array.array(_UINT32_TYPECODE)
+	integers_at = []
+
+	pos = 0
 	i = 0
 
-	while i < parser.numeric_constants_count:
-		isnum, lo = parser.stream.read_uleb128_from33bit()
+	try:
+		while i < parser.numeric_constants_count:
+			isnum, lo, pos = decode_uleb128_from33bit(data, pos)
 
-		if isnum:
-			hi = parser.stream.read_uleb128()
+			if isnum:
+				hi, pos = decode_uleb128(data, pos)
 
-			number = _assemble_number(lo, hi)
-		else:
-			number = _process_sign(lo)
+				doubles.append(_assemble_bits(lo, hi))
+				doubles_at.append(i)
 
-		numeric_constants.append(number)
+				numeric_constants.append(None)
+			elif lo <= _INT32_MAX:
+				integers.append(lo)
+				integers_at.append(i)
 
-		i += 1
+				numeric_constants.append(None)
+			else:
+				numeric_constants.append(_process_sign(lo))
+
+			i += 1
+	except (IndexError, OverflowError):
+		raise IOError("Broken numeric constants")
+
+	if pos != size:
+		raise IOError("Numeric constants size mismatch: {0} bytes"
+					" decoded instead of {1}".format(pos, size))
+
+	doubles = array.array("d", doubles.tobytes())
+
+	for i, number in zip(doubles_at, doubles):
+		numeric_constants[i] = number
+
+	integers = array.array(_INT32_TYPECODE, integers.tobytes())
+
+	for i, number in zip(integers_at, integers):
+		numeric_constants[i] = number
 
 	return True
 
@@ -110,20 +174,18 @@ def _read_number(parser):
 	return _assemble_number(lo, hi)
 
 
-def _read_signed_int(parser):
-	number = parser.stream.read_uleb128()
+def _assemble_number(lo, hi):
+	float_as_int = _assemble_bits(lo, hi)
 
-	return _process_sign(number)
+	raw_bytes = struct.pack("=Q", float_as_int)
+	return struct.unpack("=d", raw_bytes)[0]
 
 
-def _assemble_number(lo, hi):
+def _assemble_bits(lo, hi):
 	if sys.byteorder == 'big':
-		float_as_int = lo << 32 | hi
+		return lo << 32 | hi
 	else:
-		float_as_int = hi << 32 | lo
-
-	raw_bytes = struct.pack("=Q", float_as_int)
-	return struct.unpack("=d", raw_bytes)[0]
+		return hi << 32 | lo
 
 
 def _process_sign(number):
@@ -133,49 +195,115 @@ def _process_sign(number):
 		return number
 
 
-def _read_table(parser, table):
-	array_items_count = parser.stream.read_uleb128()
-	hash_items_count = parser.stream.read_uleb128()
+#
+# The template tables are only skipped over here and kept raw. They are
+# decoded on the first access to the table items, or rendered right from
+# the raw data.
+#
+def _read_table_template(parser, data, start):
+	try:
+		end = _skip_table(data, start)
+	except IndexError:
+		raise IOError("Unexpected end of the template table")
 
-	while array_items_count > 0:
-		constant = _read_table_item(parser)
+	parser.stream.skip(end - start)
 
-		table.array.append(constant)
+	return _TableTemplate(data[start:end], gconfig.gFlagDic['strEncode'])
 
-		array_items_count -= 1
 
-	while hash_items_count > 0:
-		key = _read_table_item(parser)
-		value = _read_table_item(parser)
+def _skip_table(data, pos):
+	array_items_count, pos = ljd.util.binstream.decode_uleb128(data, pos)
+	hash_items_count, pos = ljd.util.binstream.decode_uleb128(data, pos)
 
-		table.dictionary.append((key, value))
+	items_count = array_items_count + hash_items_count * 2
 
-		hash_items_count -= 1
+	while items_count > 0:
+		pos = _skip_table_item(data, pos)
+		items_count -= 1
 
-	return True
+	return pos
 
 
-def _read_table_item(parser):
-	data_type = parser.stream.read_uleb128()
+def _skip_table_item(data, pos):
+	data_type, pos = ljd.util.binstream.decode_uleb128(data, pos)
 
 	if data_type >= BCDUMP_KTAB_STR:
-		length = data_type - BCDUMP_KTAB_STR
-		# zzw 20180714 support str encode
-		return parser.stream.read_bytes(length).decode(gconfig.gFlagDic['strEncode'])
+		pos += data_type - BCDUMP_KTAB_STR
+
+		if pos > len(data):
+			raise IndexError("String is out of the data")
 
 	elif data_type == BCDUMP_KTAB_INT:
-		return _read_signed_int(parser)
+		pos = _skip_uleb128(data, pos)
 
 	elif data_type == BCDUMP_KTAB_NUM:
-		return _read_number(parser)
+		pos = _skip_uleb128(data, pos)
+		pos = _skip_uleb128(data, pos)
 
-	elif data_type == BCDUMP_KTAB_TRUE:
-		return True
+	return pos
 
-	elif data_type == BCDUMP_KTAB_FALSE:
-		return False
 
-	else:
-		assert data_type == BCDUMP_KTAB_NIL
+def _skip_uleb128(data, pos):
+	while data[pos] >= 0x80:
+		pos += 1
+
+	return pos + 1
+
+
+class _TableTemplate():
+	def __init__(self, data, encoding):
+		self.data = data
+		self.encoding = encoding
+
+	def items(self):
+		data = self.data
+
+		array_items_count, pos = ljd.util.binstream.decode_uleb128(data, 0)
+		hash_items_count, pos = ljd.util.binstream.decode_uleb128(data, pos)
+
+		index = 0
+
+		while index < array_items_count:
+			value, pos = self._decode_item(pos)
+
+			yield True, index, value
+
+			index += 1
+
+		while hash_items_count > 0:
+			key, pos = self._decode_item(pos)
+			value, pos = self._decode_item(pos)
+
+			yield False, key, value
+
+			hash_items_count -= 1
+
+	def _decode_item(self, pos):
+		data = self.data
+
+		data_type, pos = ljd.util.binstream.decode_uleb128(data, pos)
+
+		if data_type >= BCDUMP_KTAB_STR:
+			end = pos + data_type - BCDUMP_KTAB_STR
+			# zzw 20180714 support str encode
+			return data[pos:end].decode(self.encoding), end
+
+		elif data_type == BCDUMP_KTAB_INT:
+			number, pos = ljd.util.binstream.decode_uleb128(data, pos)
+			return _process_sign(number), pos
+
+		elif data_type == BCDUMP_KTAB_NUM:
+			lo, pos = ljd.util.binstream.decode_uleb128(data, pos)
+			hi, pos = ljd.util.binstream.decode_uleb128(data, pos)
+			return _assemble_number(lo, hi), pos
+
+		elif data_type == BCDUMP_KTAB_TRUE:
+			return True, pos
+
+		elif data_type == BCDUMP_KTAB_FALSE:
+			return False, pos
+
+		else:
+			assert data_type == BCDUMP_KTAB_NIL
 
-		return None
+			return None, pos
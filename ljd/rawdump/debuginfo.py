@@ -2,9 +2,18 @@
 # Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
 #
 
+import array
+import functools
 import sys
 
 import ljd.bytecode.debuginfo
+import ljd.util.binstream
+
+
+# Debug info handling modes of the parser
+MODE_FULL = "full"
+MODE_LAZY = "lazy"
+MODE_SKIP = "skip"
 
 
 VARNAME_END = 0
@@ -28,72 +37,156 @@ INTERNAL_VARNAMES = [
 ]
 
 
+# Array typecodes for the line number widths
+_LINEINFO_TYPECODES = {
+	array.array(typecode).itemsize: typecode
+		for typecode in ("L", "I", "H", "B")
+}
+
+
+#
+# The whole debug info section is read at once and decoded from the buffer
+# instead of pulling it out of the stream value by value. In the lazy mode
+# the buffer is kept and decoded on the first lookup, in the skip mode it
+# isn't even read and the lookups find nothing.
+#
 def read(parser, line_offset, debuginfo):
-	r = True
+	if parser.debuginfo_mode == MODE_SKIP:
+		parser.stream.skip(parser.debuginfo_size)
+		return True
+
+	# The lazy loader fails far away from the parser, so the errors tell
+	# where the debug info was
+	context = "{0}: debug info at {1:#x} of the function at line {2}" \
+			.format(parser.stream.name, parser.stream.pos, line_offset)
+
+	data = parser.stream.read_bytes(parser.debuginfo_size)
+
+	loader = functools.partial(_load, data, context,
+					parser.stream.data_byteorder,
+					line_offset,
+					parser.lines_count,
+					parser.instructions_count,
+					parser.upvalues_count)
+
+	if parser.debuginfo_mode == MODE_LAZY:
+		debuginfo.loader = loader
+	else:
+		loader(debuginfo)
+
+	return True
+
+
+def _load(data, context, byteorder, line_offset, lines_count,
+				instructions_count, upvalues_count, debuginfo):
+	try:
+		end = decode(data, byteorder, line_offset, lines_count,
+					instructions_count, upvalues_count,
+					debuginfo)
+	except IndexError:
+		raise IOError(context + ": Unexpected end of the debug info")
+	except UnicodeDecodeError as e:
+		raise IOError(context + ": Invalid name: " + str(e))
+
+	if end != len(data):
+		raise IOError("{0}: Debug info size mismatch: {1} bytes decoded"
+				" instead of {2}".format(context, end, len(data)))
 
-	r = r and _read_lineinfo(parser, line_offset, debuginfo.addr_to_line_map)
-	r = r and _read_upvalue_names(parser, debuginfo.upvalue_variable_names)
-	r = r and _read_variable_infos(parser, debuginfo.variable_info)
 
-	return r
+# Returns the offset right after the decoded data
+def decode(data, byteorder, line_offset, lines_count, instructions_count,
+						upvalues_count, debuginfo):
+	pos = _decode_lineinfo(data, byteorder, line_offset, lines_count,
+						instructions_count,
+						debuginfo.addr_to_line_map)
 
+	pos = _decode_upvalue_names(data, pos, upvalues_count,
+					debuginfo.upvalue_variable_names)
 
-def _read_lineinfo(parser, line_offset, lineinfo):
-	if parser.lines_count >= 65536:
+	return _decode_variable_infos(data, pos, debuginfo.variable_info)
+
+
+def _decode_lineinfo(data, byteorder, line_offset, lines_count,
+						instructions_count, lineinfo):
+	if lines_count >= 65536:
 		lineinfo_size = 4
-	elif parser.lines_count >= 256:
+	elif lines_count >= 256:
 		lineinfo_size = 2
 	else:
 		lineinfo_size = 1
 
+	end = instructions_count * lineinfo_size
+
+	if end > len(data):
+		raise IndexError("Line info is out of the debug info")
+
+	line_numbers = array.array(_LINEINFO_TYPECODES[lineinfo_size])
+	line_numbers.frombytes(data[:end])
+
+	if lineinfo_size > 1 and byteorder != sys.byteorder:
+		line_numbers.byteswap()
+
 	lineinfo.append(0)
+	lineinfo.extend(map(line_offset.__add__, line_numbers))
 
-	while len(lineinfo) < parser.instructions_count + 1:
-		line_number = parser.stream.read_uint(lineinfo_size)
-		lineinfo.append(line_offset + line_number)
+	return end
 
-	return True
 
+def _decode_upvalue_names(data, pos, upvalues_count, names):
+	while len(names) < upvalues_count:
+		end = _find_zstring_end(data, pos)
 
-def _read_upvalue_names(parser, names):
-	while len(names) < parser.upvalues_count:
-		string = parser.stream.read_zstring()
-		names.append(string.decode("utf-8"))
+		names.append(data[pos:end].decode("utf-8"))
 
-	return True
+		pos = end + 1
 
+	return pos
+
+
+def _decode_variable_infos(data, pos, infos):
+	decode_uleb128 = ljd.util.binstream.decode_uleb128
 
-def _read_variable_infos(parser, infos):
 	# pc - program counter
 	last_addr = 0
 
 	while True:
-		info = ljd.bytecode.debuginfo.VariableInfo()
+		internal_vartype = data[pos]
 
-		internal_vartype = parser.stream.read_byte()
+		if internal_vartype == VARNAME_END:
+			return pos + 1
+
+		info = ljd.bytecode.debuginfo.VariableInfo()
 
 		if internal_vartype >= VARNAME__MAX:
-			prefix = internal_vartype.to_bytes(1, sys.byteorder)
-			suffix = parser.stream.read_zstring()
+			# The type byte is the first character of the name
+			end = _find_zstring_end(data, pos)
 
-			info.name = (prefix + suffix).decode("utf-8")
+			info.name = data[pos:end].decode("utf-8")
 			info.type = info.T_VISIBILE
 
-		elif internal_vartype == VARNAME_END:
-			break
+			pos = end + 1
 		else:
-			index = internal_vartype
-			info.name = INTERNAL_VARNAMES[index]
+			info.name = INTERNAL_VARNAMES[internal_vartype]
 			info.type = info.T_INTERNAL
 
-		start_addr = last_addr + parser.stream.read_uleb128()
-		end_addr = start_addr + parser.stream.read_uleb128()
+			pos += 1
+
+		start_offset, pos = decode_uleb128(data, pos)
+		length, pos = decode_uleb128(data, pos)
 
-		info.start_addr = start_addr
-		info.end_addr = end_addr
+		info.start_addr = last_addr + start_offset
+		info.end_addr = info.start_addr + length
 
-		last_addr = start_addr
+		last_addr = info.start_addr
 
 		infos.append(info)
 
-	return True
+
+def _find_zstring_end(data, pos):
+	end = data.find(b'\x00', pos)
+
+	if end < 0:
+		raise IndexError("Unterminated string")
+
+	return end
+
@@ -5,13 +5,13 @@
 from ljd.util.log import errprint
 
 
-_MAGIC = b'\x1bLJ'
+MAGIC = b'\x1bLJ'
 
-_MAX_VERSION = 0x80
+MAX_VERSION = 0x80
 
-_FLAG_IS_BIG_ENDIAN = 0b00000001
-_FLAG_IS_STRIPPED = 0b00000010
-_FLAG_HAS_FFI = 0b00000100
+FLAG_IS_BIG_ENDIAN = 0b00000001
+FLAG_IS_STRIPPED = 0b00000010
+FLAG_HAS_FFI = 0b00000100
 
 
 class Flags():
@@ -45,7 +45,7 @@ def read(state, header):
 
 
 def _check_magic(state):
-    if state.stream.read_bytes(3) != _MAGIC:
+    if state.stream.read_bytes(3) != MAGIC:
         errprint("Invalid magic, not a LuaJIT format")
         return False
 
@@ -55,7 +55,7 @@ def _check_magic(state):
 def _read_version(state, header):
     header.version = state.stream.read_byte()
 
-    if header.version > _MAX_VERSION:
+    if header.version > MAX_VERSION:
         errprint("Version {0}: propritary modifications",
                         header.version)
         return False
@@ -66,14 +66,14 @@ def _read_version(state, header):
 def _read_flags(parser, header):
     bits = parser.stream.read_uleb128()
 
-    header.flags.is_big_endian = bits & _FLAG_IS_BIG_ENDIAN
-    bits &= ~_FLAG_IS_BIG_ENDIAN
+    header.flags.is_big_endian = bits & FLAG_IS_BIG_ENDIAN
+    bits &= ~FLAG_IS_BIG_ENDIAN
 
-    header.flags.is_stripped = bits & _FLAG_IS_STRIPPED
-    bits &= ~_FLAG_IS_STRIPPED
+    header.flags.is_stripped = bits & FLAG_IS_STRIPPED
+    bits &= ~FLAG_IS_STRIPPED
 
-    header.flags.has_ffi = bits & _FLAG_HAS_FFI
-    bits &= ~_FLAG_HAS_FFI
+    header.flags.has_ffi = bits & FLAG_HAS_FFI
+    bits &= ~FLAG_HAS_FFI
 
     # zzw.20180714 pitch: flag value is according to parser.flag when parse proto, not by header.flags
     parser.flags.is_big_endian = header.flags.is_big_endian
@@ -11,20 +11,38 @@ import ljd.bytecode.prototype
 
 import ljd.rawdump.header
 import ljd.rawdump.prototype
+import ljd.rawdump.debuginfo
 
 
 class _State():
-    def __init__(self):
+    def __init__(self, debuginfo):
         self.stream = ljd.util.binstream.BinStream()
         self.flags = ljd.rawdump.header.Flags()
         self.prototypes = []
+        self.debuginfo_mode = debuginfo
 
 
-def parse(filename):
-    parser = _State()
+#
+# The debuginfo is one of the ljd.rawdump.debuginfo.MODE_* values. Skipped
+# debug info looks just like a stripped one.
+#
+def parse(filename, debuginfo=ljd.rawdump.debuginfo.MODE_FULL):
+    parser = _State(debuginfo)
 
     parser.stream.open(filename)
 
+    return _parse(parser)
+
+
+def parse_bytes(data, name="", debuginfo=ljd.rawdump.debuginfo.MODE_FULL):
+    parser = _State(debuginfo)
+
+    parser.stream.open_bytes(data, name)
+
+    return _parse(parser)
+
+
+def _parse(parser):
     header = ljd.rawdump.header.Header()
 
     r = True
@@ -67,6 +85,12 @@ def _read_header(parser, header):
     else:
         parser.stream.data_byteorder = 'little'
 
+    # The prototypes are still read with their debug info sizes, only the
+    # result looks stripped
+    if parser.debuginfo_mode == ljd.rawdump.debuginfo.MODE_SKIP:
+        header.flags.is_stripped = True
+        header.name = parser.stream.name
+
     return True
 
 
@@ -28,6 +28,7 @@ class _State():
         self.numeric_constants_count = 0
         self.instructions_count = 0
         self.debuginfo_size = 0
+        self.end = 0
 '''
 zzw 20180716
 | size(1 uleb128) | flag(1 byte) | arguments_count(1 byte) 
@@ -51,6 +52,8 @@ def read(parser, prototype):
 
     start = parser.stream.pos
 
+    parser.end = start + size
+
     r = True
 
     r = r and _read_flags(parser, prototype)
@@ -111,10 +114,15 @@ def _read_counts_and_sizes(parser, prototype):
     if parser.debuginfo_size == 0:
         return True
 
-    prototype.first_line_number = parser.stream.read_uleb128()
-    prototype.lines_count = parser.stream.read_uleb128()
+    first_line_number = parser.stream.read_uleb128()
+    lines_count = parser.stream.read_uleb128()
+
+    parser.lines_count = lines_count
 
-    parser.lines_count = prototype.lines_count
+    # Leave the line range out just as a stripped dump does
+    if parser.debuginfo_mode != ljd.rawdump.debuginfo.MODE_SKIP:
+        prototype.first_line_number = first_line_number
+        prototype.lines_count = lines_count
 
     return True
 
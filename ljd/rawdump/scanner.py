@@ -0,0 +1,260 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import collections
+import concurrent.futures
+import os
+
+import ljd.rawdump.header as header
+import ljd.rawdump.prototype as prototype
+
+
+# Enough for the header and the first prototype headers of the most files
+_FIRST_READ_SIZE = 64 * 1024
+
+_KNOWN_PROTOTYPE_FLAGS = prototype.FLAG_HAS_CHILD	\
+			| prototype.FLAG_IS_VARIADIC	\
+			| prototype.FLAG_HAS_FFI	\
+			| prototype.FLAG_JIT_DISABLED	\
+			| prototype.FLAG_HAS_ILOOP
+
+_KNOWN_HEADER_FLAGS = header.FLAG_IS_BIG_ENDIAN	\
+			| header.FLAG_IS_STRIPPED	\
+			| header.FLAG_HAS_FFI
+
+
+class ScanError(Exception):
+	pass
+
+
+class Layout():
+	def __init__(self):
+		self.flags = 0
+		self.framesize = 0
+
+		self.instructions_offset = 0
+		self.instructions_count = 0
+
+
+class Summary():
+	def __init__(self):
+		self.origin = ""
+		self.is_luajit = False
+
+		self.offset = 0
+		self.size = 0
+
+		self.version = 0
+		self.is_big_endian = False
+		self.is_stripped = False
+		self.has_ffi = False
+		self.name = None
+
+		self.prototypes_count = 0
+		self.instructions_count = 0
+
+		self.error = None
+
+	def as_dict(self):
+		return {
+			"file": self.origin,
+			"luajit": self.is_luajit,
+			"offset": self.offset,
+			"size": self.size,
+			"version": self.version,
+			"big_endian": self.is_big_endian,
+			"stripped": self.is_stripped,
+			"ffi": self.has_ffi,
+			"name": self.name,
+			"prototypes": self.prototypes_count,
+			"instructions": self.instructions_count,
+			"error": self.error
+		}
+
+
+def scan(filename):
+	summary = Summary()
+	summary.origin = filename
+
+	try:
+		with open(filename, 'rb') as fd:
+			data = fd.read(_FIRST_READ_SIZE)
+
+			if not data.startswith(header.MAGIC):
+				return summary
+
+			if len(data) == _FIRST_READ_SIZE:
+				data += fd.read()
+	except OSError as e:
+		summary.error = str(e)
+		return summary
+
+	summary.is_luajit = True
+
+	try:
+		end = walk(data, 0, summary)
+	except ScanError as e:
+		summary.error = str(e)
+		return summary
+
+	if end != len(data):
+		summary.error = "Trailing data after the dump end"
+
+	return summary
+
+
+def scan_all(filenames, jobs=None):
+	if jobs is None:
+		jobs = min(32, (os.cpu_count() or 1) * 4)
+
+	# Keep a bounded window of pending files, so a huge corpus won't
+	# turn into a huge list of futures
+	window = jobs * 4
+
+	with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+		pending = collections.deque()
+
+		for filename in filenames:
+			pending.append(executor.submit(scan, filename))
+
+			if len(pending) >= window:
+				yield pending.popleft().result()
+
+		while len(pending) > 0:
+			yield pending.popleft().result()
+
+
+#
+# Walks the header and the size-prefixed prototype records starting at the
+# offset without decoding them. Fills the summary and returns the offset right
+# after the dump end. Works with any bytes-like object including mmap.
+#
+# If the layouts list is given, a Layout of every prototype is appended to it
+# in the dump order (children first, the main prototype last).
+#
+def walk(data, offset, summary, layouts=None):
+	summary.offset = offset
+
+	pos = offset
+
+	if data[pos:pos + 3] != header.MAGIC:
+		raise ScanError("Invalid magic, not a LuaJIT format")
+
+	pos += 3
+
+	summary.version = _byte(data, pos)
+	pos += 1
+
+	if summary.version > header.MAX_VERSION:
+		raise ScanError("Version {0}: propritary modifications"
+						.format(summary.version))
+
+	bits, pos = _read_uleb128(data, pos)
+
+	if bits & ~_KNOWN_HEADER_FLAGS:
+		raise ScanError("Unknown flags set: {0:08b}".format(bits))
+
+	summary.is_big_endian = bool(bits & header.FLAG_IS_BIG_ENDIAN)
+	summary.is_stripped = bool(bits & header.FLAG_IS_STRIPPED)
+	summary.has_ffi = bool(bits & header.FLAG_HAS_FFI)
+
+	if not summary.is_stripped:
+		length, pos = _read_uleb128(data, pos)
+
+		name = bytes(data[pos:pos + length])
+		pos += length
+
+		if len(name) != length:
+			raise ScanError("File truncated")
+
+		summary.name = name.decode("utf8", "replace")
+
+	while True:
+		size, pos = _read_uleb128(data, pos)
+
+		if size == 0:
+			break
+
+		end = pos + size
+
+		if end > len(data):
+			raise ScanError("File truncated")
+
+		layout = _walk_prototype(data, pos, end, summary.is_stripped)
+
+		if layouts is not None:
+			layouts.append(layout)
+
+		summary.instructions_count += layout.instructions_count
+		summary.prototypes_count += 1
+
+		pos = end
+
+	if summary.prototypes_count == 0:
+		raise ScanError("No prototypes in the dump")
+
+	summary.size = pos - offset
+
+	return pos
+
+
+def _walk_prototype(data, pos, end, is_stripped):
+	layout = Layout()
+
+	layout.flags = _byte(data, pos)
+
+	if layout.flags & ~_KNOWN_PROTOTYPE_FLAGS:
+		raise ScanError("Unknown prototype flags: {0:08b}"
+							.format(layout.flags))
+
+	layout.framesize = _byte(data, pos + 2)
+
+	# Skip flags, arguments count, framesize and upvalues count
+	pos += 4
+
+	_complex_constants_count, pos = _read_uleb128(data, pos)
+	_numeric_constants_count, pos = _read_uleb128(data, pos)
+	layout.instructions_count, pos = _read_uleb128(data, pos)
+
+	if not is_stripped:
+		debuginfo_size, pos = _read_uleb128(data, pos)
+
+		if debuginfo_size != 0:
+			_first_line_number, pos = _read_uleb128(data, pos)
+			_lines_count, pos = _read_uleb128(data, pos)
+
+	if pos + layout.instructions_count * 4 > end:
+		raise ScanError("Prototype is shorter than its instructions")
+
+	layout.instructions_offset = pos
+
+	return layout
+
+
+def _byte(data, pos):
+	try:
+		return data[pos]
+	except IndexError:
+		raise ScanError("File truncated")
+
+
+def _read_uleb128(data, pos):
+	value = _byte(data, pos)
+	pos += 1
+
+	if value >= 0x80:
+		bitshift = 0
+		value &= 0x7f
+
+		while True:
+			byte = _byte(data, pos)
+			pos += 1
+
+			bitshift += 7
+			value |= (byte & 0x7f) << bitshift
+
+			if byte < 0x80:
+				break
+
+	return value, pos
@@ -0,0 +1,249 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import base64
+import multiprocessing
+import os
+import signal
+import socketserver
+import stat
+import sys
+import threading
+
+import ljd.batch
+import ljd.client
+import ljd.pipeline
+import ljd.rawdump.debuginfo
+from ljd.util.log import errprint
+
+import gconfig
+
+
+# The base64 of the dumps takes a third more
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+_DEBUGINFO_MODES = (
+	ljd.rawdump.debuginfo.MODE_FULL,
+	ljd.rawdump.debuginfo.MODE_LAZY,
+	ljd.rawdump.debuginfo.MODE_SKIP
+)
+
+_FALLBACKS = (
+	ljd.pipeline.FALLBACK_OFF,
+	ljd.pipeline.FALLBACK_BUDGET,
+	ljd.pipeline.FALLBACK_ALL
+)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+	def handle(self):
+		while True:
+			try:
+				request = ljd.client.receive_message(self.request,
+						self.server.max_message_size)
+			except IOError as e:
+				errprint("Bad request: {0}", str(e))
+				return
+			except ValueError as e:
+				# The whole message is read, so the next one
+				# can still be served
+				response = {
+					"ok": False,
+					"error": "Invalid request: " + str(e)
+				}
+
+				ljd.client.send_message(self.request, response)
+				continue
+
+			if request is None:
+				return
+
+			response = self.server.process(request)
+
+			ljd.client.send_message(self.request, response)
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+	def __init__(self, socket_path, jobs=None, queue_size=None,
+					max_message_size=MAX_MESSAGE_SIZE):
+		# A stale socket of a previous run, anything else is left alone
+		if not _unlink_socket(socket_path) \
+					and os.path.lexists(socket_path):
+			raise IOError("{0} exists and is not a socket"
+							.format(socket_path))
+
+		socketserver.UnixStreamServer.__init__(self, socket_path,
+								_Handler)
+
+		flags = dict(gconfig.gFlagDic)
+
+		# The workers are forked with everything already imported and
+		# all the tables built, so they stay warm between the requests
+		self.pool = multiprocessing.Pool(jobs, ljd.batch.init_worker,
+								(flags,))
+
+		if queue_size is None:
+			queue_size = (jobs or os.cpu_count() or 1) * 8
+
+		# Requests over the limit wait for a free slot in the queue
+		self.queue = threading.BoundedSemaphore(queue_size)
+
+		self.max_message_size = max_message_size
+
+	def process(self, request):
+		try:
+			source = _make_source(request)
+			mode = _get_mode(request)
+			debuginfo = _get_debuginfo(request)
+			flags = _get_flags(request)
+		except (KeyError, ValueError) as e:
+			return {"ok": False, "error": "Invalid request: " + str(e)}
+
+		with self.queue:
+			result = self.pool.apply(_process,
+						(source, mode, debuginfo, flags))
+
+		if result.error is not None:
+			return {"ok": False, "error": result.error}
+
+		return {
+			"ok": True,
+			"output": result.text,
+			"fallbacks": result.fallbacks
+		}
+
+	def server_close(self):
+		socketserver.UnixStreamServer.server_close(self)
+
+		self.pool.terminate()
+		self.pool.join()
+
+		_unlink_socket(self.server_address)
+
+
+def _unlink_socket(path):
+	try:
+		if not stat.S_ISSOCK(os.lstat(path).st_mode):
+			return False
+	except FileNotFoundError:
+		return False
+
+	os.unlink(path)
+
+	return True
+
+
+def _make_source(request):
+	if not isinstance(request, dict):
+		raise ValueError("not an object")
+
+	if "data" in request:
+		data = base64.b64decode(_get_string(request, "data"),
+							validate=True)
+		name = _get_string(request, "name", "")
+
+		return ljd.batch.Buffer(name, data, name)
+
+	path = _get_string(request, "path")
+
+	return ljd.batch.File(path, path)
+
+
+def _get_mode(request):
+	mode = request.get("mode", ljd.batch.MODE_LUA)
+
+	if mode not in (ljd.batch.MODE_LUA, ljd.batch.MODE_ASM):
+		raise ValueError("unknown mode {0!r}".format(mode))
+
+	return mode
+
+
+def _get_debuginfo(request):
+	debuginfo = request.get("debuginfo", ljd.rawdump.debuginfo.MODE_FULL)
+
+	if debuginfo not in _DEBUGINFO_MODES:
+		raise ValueError("unknown debuginfo {0!r}".format(debuginfo))
+
+	return debuginfo
+
+
+# The flags of the request on top of the ones of the server, see
+# ljd.pipeline.create_default_manager
+def _get_flags(request):
+	flags = {}
+
+	if "fallback" in request:
+		fallback = request["fallback"]
+
+		if fallback not in _FALLBACKS:
+			raise ValueError("unknown fallback {0!r}".format(fallback))
+
+		flags["fallback"] = fallback
+
+	if "budget" in request:
+		flags["budget_seconds"] = _get_positive(request, "budget",
+								(int, float))
+
+	if "budget_steps" in request:
+		flags["budget_steps"] = _get_positive(request, "budget_steps",
+								(int,))
+
+	return flags
+
+
+def _get_positive(request, key, types):
+	value = request[key]
+
+	# bool is an int as well
+	if isinstance(value, bool) or not isinstance(value, types) \
+							or not value > 0:
+		raise ValueError("{0} is not a positive number".format(key))
+
+	return value
+
+
+def _process(source, mode, debuginfo, flags):
+	# A worker is busy with a single request at a time
+	saved = dict(gconfig.gFlagDic)
+
+	gconfig.gFlagDic.update(flags)
+
+	try:
+		return ljd.batch.process(source, mode, debuginfo)
+	finally:
+		gconfig.gFlagDic.clear()
+		gconfig.gFlagDic.update(saved)
+
+
+def _get_string(request, key, default=None):
+	if default is None:
+		value = request[key]
+	else:
+		value = request.get(key, default)
+
+	if not isinstance(value, str):
+		raise ValueError("{0} is not a string".format(key))
+
+	return value
+
+
+def serve(socket_path, jobs=None, queue_size=None,
+				max_message_size=MAX_MESSAGE_SIZE):
+	server = Server(socket_path, jobs, queue_size, max_message_size)
+
+	# Clean up the socket and the workers on the polite kill too
+	signal.signal(signal.SIGTERM, _terminate)
+
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+
+def _terminate(signum, frame):
+	sys.exit(0)
@@ -0,0 +1,169 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+#
+# Framed streams of the dumps for the pipelines.
+#
+# The "length" framing:
+#	input record - 4-byte big-endian length and the dump itself. Records
+#	are numbered from zero in the order of arrival.
+#
+#	output record - 4-byte record number, 1-byte status (0 - ok, 1 - error),
+#	4-byte length and the UTF-8 output or error message. All big-endian.
+#
+#	A truncated record gets an error output record and ends the stream -
+#	there is no way to find the next record after it.
+#
+# The "jsonl" framing:
+#	input record - {"data": base64, "id": optional, "name": optional}
+#	output record - {"id": ..., "ok": true, "output": ...}
+#			or {"id": ..., "ok": false, "error": ...}
+#
+#	If there is no id in the input record, the record number is used. A
+#	malformed record gets an error output record of its own.
+#
+
+import base64
+import json
+import struct
+
+import ljd.batch
+
+
+FRAMING_LENGTH = "length"
+FRAMING_JSONL = "jsonl"
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_INPUT_HEADER = struct.Struct(">I")
+_OUTPUT_HEADER = struct.Struct(">IBI")
+
+
+# A source standing for a malformed input record, fails with the reason on read
+class InvalidRecord():
+	def __init__(self, name, error, id):
+		self.error = error
+		self.id = id
+
+		self.name = name
+		self.output_name = name
+
+	def read(self):
+		raise ValueError(self.error)
+
+
+def read_records(fd, framing):
+	if framing == FRAMING_JSONL:
+		return _read_jsonl_records(fd)
+	else:
+		return _read_length_records(fd)
+
+
+def write_record(fd, framing, result):
+	if framing == FRAMING_JSONL:
+		_write_jsonl_record(fd, result)
+	else:
+		_write_length_record(fd, result)
+
+	fd.flush()
+
+
+def _read_length_records(fd):
+	index = 0
+
+	while True:
+		header = fd.read(_INPUT_HEADER.size)
+
+		if len(header) == 0:
+			return
+
+		name = "<record #{0}>".format(index)
+
+		if len(header) != _INPUT_HEADER.size:
+			yield InvalidRecord(name, "Truncated record header",
+									index)
+			return
+
+		length = _INPUT_HEADER.unpack(header)[0]
+
+		data = fd.read(length)
+
+		if len(data) != length:
+			yield InvalidRecord(name, "Truncated record", index)
+			return
+
+		yield ljd.batch.Buffer(name, data, name, index)
+
+		index += 1
+
+
+def _read_jsonl_records(fd):
+	index = 0
+
+	for line in fd:
+		if line.strip() == b'':
+			continue
+
+		try:
+			record = json.loads(line.decode("utf-8"))
+		except ValueError as e:
+			record = e
+
+		yield _make_jsonl_source(record, index)
+
+		index += 1
+
+
+def _make_jsonl_source(record, index):
+	if not isinstance(record, dict):
+		name = "<record {0}>".format(index)
+
+		if isinstance(record, ValueError):
+			error = "Invalid JSON: {0}".format(record)
+		else:
+			error = "Record is not a JSON object"
+
+		return InvalidRecord(name, error, index)
+
+	record_id = record.get("id", index)
+	name = record.get("name", "<record {0}>".format(record_id))
+
+	if not isinstance(name, str):
+		name = "<record {0}>".format(record_id)
+
+	data = record.get("data")
+
+	if not isinstance(data, str):
+		return InvalidRecord(name, "No base64 data in the record",
+								record_id)
+
+	try:
+		data = base64.b64decode(data, validate=True)
+	except ValueError as e:
+		return InvalidRecord(name, "Invalid base64 data: {0}".format(e),
+								record_id)
+
+	return ljd.batch.Buffer(name, data, name, record_id)
+
+
+def _write_length_record(fd, result):
+	if result.error is None:
+		status = STATUS_OK
+		payload = result.text.encode("utf-8")
+	else:
+		status = STATUS_ERROR
+		payload = result.error.encode("utf-8")
+
+	fd.write(_OUTPUT_HEADER.pack(result.id, status, len(payload)))
+	fd.write(payload)
+
+
+def _write_jsonl_record(fd, result):
+	if result.error is None:
+		record = {"id": result.id, "ok": True, "output": result.text}
+	else:
+		record = {"id": result.id, "ok": False, "error": result.error}
+
+	fd.write(json.dumps(record).encode("utf-8") + b"\n")
@@ -0,0 +1,152 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import io
+import os
+import tarfile
+import time
+import zipfile
+
+
+_TAR_MODES = (
+	(".tar.gz", "gz"),
+	(".tgz", "gz"),
+	(".tar.bz2", "bz2"),
+	(".tbz2", "bz2"),
+	(".tar.xz", "xz"),
+	(".txz", "xz"),
+	(".tar", "")
+)
+
+
+#
+# The archives are told by the extension only - a dump is never taken for an
+# archive because its bytes happen to look like one
+#
+def is_zip(path):
+	return path.lower().endswith(".zip") and os.path.isfile(path)
+
+
+def is_tar(path):
+	return _get_tar_compression(path) is not None and os.path.isfile(path)
+
+
+#
+# The names come from the archive members and are not trusted. An absolute
+# name or a name going up out of the output root is rejected with ValueError,
+# the rest is normalized.
+#
+def check_name(name):
+	normalized = os.path.normpath(name.replace("\\", "/"))
+
+	if os.path.isabs(normalized) or os.path.splitdrive(normalized)[0]:
+		raise ValueError("Absolute output name: " + name)
+
+	parts = normalized.split(os.sep)
+
+	if normalized == os.curdir or os.pardir in parts:
+		raise ValueError("Output name outside of the output: " + name)
+
+	return normalized
+
+
+def zip_members(path):
+	with zipfile.ZipFile(path) as archive:
+		for info in archive.infolist():
+			if not info.is_dir():
+				yield info.filename
+
+
+#
+# Tar archives are read sequentially in the stream mode, so compressed
+# archives are not decompressed over and over for every member
+#
+def tar_members(path):
+	with tarfile.open(path, "r|*") as archive:
+		for member in archive:
+			if not member.isfile():
+				continue
+
+			yield member.name, archive.extractfile(member).read()
+
+
+class ZipWriter():
+	def __init__(self, path):
+		self.archive = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+
+	def write(self, name, text):
+		name = check_name(name)
+
+		self.archive.writestr(name, text.encode("utf-8"))
+
+	def close(self):
+		self.archive.close()
+
+
+class TarWriter():
+	def __init__(self, path, compression):
+		self.archive = tarfile.open(path, "w:" + compression)
+		self.mtime = time.time()
+
+	def write(self, name, text):
+		name = check_name(name)
+		data = text.encode("utf-8")
+
+		info = tarfile.TarInfo(name)
+		info.size = len(data)
+		info.mtime = self.mtime
+
+		self.archive.addfile(info, io.BytesIO(data))
+
+	def close(self):
+		self.archive.close()
+
+
+class DirectoryWriter():
+	def __init__(self, path):
+		self.path = path
+
+		os.makedirs(path, exist_ok=True)
+
+		self.root = os.path.realpath(path)
+
+	def write(self, name, text):
+		path = os.path.join(self.path, check_name(name))
+
+		# A symlink under the output could still point out of it
+		real_path = os.path.realpath(path)
+
+		if os.path.commonpath((self.root, real_path)) != self.root:
+			raise ValueError("Output name outside of the output: "
+									+ name)
+
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+
+		with open(path, "w", encoding="utf-8") as fd:
+			fd.write(text)
+
+	def close(self):
+		pass
+
+
+def open_writer(path):
+	if path.lower().endswith(".zip"):
+		return ZipWriter(path)
+
+	compression = _get_tar_compression(path)
+
+	if compression is not None:
+		return TarWriter(path, compression)
+
+	return DirectoryWriter(path)
+
+
+def _get_tar_compression(path):
+	path = path.lower()
+
+	for suffix, compression in _TAR_MODES:
+		if path.endswith(suffix):
+			return compression
+
+	return None
@@ -7,6 +7,57 @@ import os
 import sys
 
 
+_ZSTRING_CHUNK_SIZE = 256
+
+
+# The same as the BinStream methods below, but for the in-memory buffers.
+# Both return the value and the position right after it.
+
+def decode_uleb128(data, pos):
+	value = data[pos]
+	pos += 1
+
+	if value >= 0x80:
+		bitshift = 0
+		value &= 0x7f
+
+		while True:
+			byte = data[pos]
+			pos += 1
+
+			bitshift += 7
+			value |= (byte & 0x7f) << bitshift
+
+			if byte < 0x80:
+				break
+
+	return value, pos
+
+
+def decode_uleb128_from33bit(data, pos):
+	first_byte = data[pos]
+	pos += 1
+
+	is_number_bit = first_byte & 0x1
+	value = first_byte >> 1
+
+	if value >= 0x40:
+		bitshift = -1
+		value &= 0x3f
+
+		while True:
+			byte = data[pos]
+			pos += 1
+
+			bitshift += 7
+			value |= (byte & 0x7f) << bitshift
+
+			if byte < 0x80:
+				break
+
+	return is_number_bit, value, pos
+
+
 class BinStream():
 	def __init__(self):
 		self.fd = None
@@ -22,6 +73,11 @@ class BinStream():
 		self.fd = io.open(filename, 'rb')
 		self.size = os.stat(filename).st_size
 
+	def open_bytes(self, data, name=""):
+		self.name = name
+		self.fd = io.BytesIO(data)
+		self.size = len(data)
+
 	def close(self):
 		self.fd.close()
 		self.size = 0
@@ -43,6 +99,24 @@ class BinStream():
 
 		return data
 
+	def peek(self, size):
+		if not self.check_data_available(size):
+			raise IOError("Unexpected EOF while trying to peek {0} bytes"
+									.format(size))
+
+		data = self.fd.read(size)
+		self.fd.seek(-len(data), io.SEEK_CUR)
+
+		return data
+
+	def skip(self, size):
+		if not self.check_data_available(size):
+			raise IOError("Unexpected EOF while trying to skip {0} bytes"
+									.format(size))
+
+		self.fd.seek(size, io.SEEK_CUR)
+		self.pos += size
+
 	def read_byte(self):
 		if not self.check_data_available(1):
 			raise IOError("Unexpected EOF while trying to read 1 byte")
@@ -55,17 +129,26 @@ class BinStream():
 					signed=False)
 
 	def read_zstring(self):
-		string = b''
+		chunks = []
 
 		while not self.eof():
-			byte = self.read_bytes(1)
+			chunk = self.fd.read(min(_ZSTRING_CHUNK_SIZE,
+							self.size - self.pos))
+
+			end = chunk.find(b'\x00')
+
+			if end >= 0:
+				# Step back to right after the terminator
+				self.fd.seek(end + 1 - len(chunk), io.SEEK_CUR)
+				self.pos += end + 1
+
+				chunks.append(chunk[:end])
+				break
 
-			if byte == b'\x00':
-				return string
-			else:
-				string += byte
+			self.pos += len(chunk)
+			chunks.append(chunk)
 
-		return string
+		return b''.join(chunks)
 
 	def read_uleb128(self):
 		value = self.read_byte()
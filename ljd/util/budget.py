@@ -0,0 +1,59 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import time
+
+
+class BudgetExceeded(Exception):
+	pass
+
+
+#
+# Wall time and steps count limits of the work on a single function. The
+# passes call step() in their loops, so a pathological function is cut off
+# instead of spinning forever.
+#
+class Budget():
+	def __init__(self, seconds=None, steps=None):
+		self.seconds = seconds
+		self.steps = steps
+
+		self._deadline = None
+		self._steps_left = None
+
+	def start(self):
+		if self.seconds is not None:
+			self._deadline = time.monotonic() + self.seconds
+
+		self._steps_left = self.steps
+
+	def step(self, count=1):
+		if self._steps_left is not None:
+			self._steps_left -= count
+
+			if self._steps_left < 0:
+				raise BudgetExceeded("Over the budget of {0} steps"
+							.format(self.steps))
+
+		if self._deadline is not None and time.monotonic() > self._deadline:
+			raise BudgetExceeded("Over the budget of {0} seconds"
+							.format(self.seconds))
+
+
+# The budget of the function in processing, if any
+_active = None
+
+
+def activate(budget):
+	global _active
+
+	if budget is not None:
+		budget.start()
+
+	_active = budget
+
+
+def step(count=1):
+	if _active is not None:
+		_active.step(count)
@@ -4,14 +4,31 @@
 
 _TAB_WIDTH = " " * 8
 
+# Written pieces are kept in memory and passed to the fd in large chunks
+_FLUSH_THRESHOLD = 4096
+
 
 class IndentedStream():
 	def __init__(self, fd):
 		self.fd = fd
 
 		self.indent = 0
+		self.spaces = ""
 		self.line_open = False
 
+		self._pending = []
+
+	def flush(self):
+		if len(self._pending) > 0:
+			self.fd.write("".join(self._pending))
+			self._pending = []
+
+	def _write(self, text):
+		self._pending.append(text)
+
+		if len(self._pending) >= _FLUSH_THRESHOLD:
+			self.flush()
+
 	def write_multiline(self, fmt, *args, **kargs):
 		assert not self.line_open
 
@@ -28,16 +45,22 @@ class IndentedStream():
 		if lines[-1] == "":
 			lines.pop(-1)
 
-		spaces = "\t" * self.indent
+		spaces = self.spaces
 
 		for line in lines:
-			self.fd.write(spaces + line + "\n")
+			self._write(spaces + line + "\n")
+
+	# The text is already formatted and holds exactly one line
+	def write_formatted_line(self, text):
+		assert not self.line_open
+
+		self._write(self.spaces + text + "\n")
 
 	def start_line(self):
 		assert not self.line_open
 		self.line_open = True
 
-		self.fd.write("\t" * self.indent)
+		self._write(self.spaces)
 
 	def write(self, fmt="", *args, **kargs):
 		assert self.line_open
@@ -51,12 +74,12 @@ class IndentedStream():
 
 		assert "\n" not in text
 
-		self.fd.write(text)
+		self._write(text)
 
 	def end_line(self):
 		assert self.line_open
 
-		self.fd.write("\n")
+		self._write("\n")
 
 		self.line_open = False
 
@@ -70,9 +93,11 @@ class IndentedStream():
 			self.write_line(*args, **kargs)
 
 		self.indent += 1
+		self.spaces = "\t" * self.indent
 
 	def close_block(self, *args, **kargs):
 		if len(args) + len(kargs) > 0:
 			self.write_line(*args, **kargs)
 
 		self.indent -= 1
+		self.spaces = "\t" * self.indent
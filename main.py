@@ -23,17 +23,25 @@
 # SOFTWARE.
 #
 
+import argparse
+import json
+import os
 import sys
 
+import ljd.analysis.cost
 import ljd.rawdump.parser
+import ljd.rawdump.debuginfo
+import ljd.rawdump.scanner
+import ljd.rawdump.carver
 import ljd.pseudoasm.writer
-import ljd.ast.builder
-import ljd.ast.validator
-import ljd.ast.locals
-import ljd.ast.slotworks
-import ljd.ast.unwarper
-import ljd.ast.mutator
+import ljd.pseudoasm.export
+import ljd.pipeline
 import ljd.lua.writer
+import ljd.batch
+import ljd.server
+import ljd.stream
+import ljd.util.archive
+from ljd.util.log import errprint
 #zzw 20180714 support str encode
 import gconfig
 
@@ -73,53 +81,398 @@ def dump(name, obj, level=0):
 
 
 def main():
-    file_in = sys.argv[1]
+    args = _parse_arguments()
 
-    header, prototype = ljd.rawdump.parser.parse(file_in)
+    gconfig.gFlagDic['validate'] = args.validate
+    gconfig.gFlagDic['budget_seconds'] = args.budget
+    gconfig.gFlagDic['budget_steps'] = args.budget_steps
+    gconfig.gFlagDic['fallback'] = args.fallback
+
+    if args.serve is not None:
+        return _serve(args)
+
+    if args.stream is not None:
+        return _stream(args)
+
+    if args.scan:
+        return _scan(args)
+
+    if args.carve:
+        return _carve(args)
+
+    if args.export is not None:
+        return _export(args)
+
+    if args.calibrate:
+        return _calibrate(args)
+
+    if _is_batch(args):
+        return _batch(args)
+
+    file_in = args.files[0]
+
+    header, prototype = ljd.rawdump.parser.parse(file_in, args.debuginfo)
     #print ("good")
     if not prototype:
         return 1
 
-    # TODO: args
-    # ljd.pseudoasm.writer.write(sys.stdout, header, prototype)
+    if args.asm:
+        ljd.pseudoasm.writer.write(sys.stdout, header, prototype)
+        return 0
 
-    ast = ljd.ast.builder.build(prototype)
+    ast = ljd.pipeline.decompile(prototype)
 
-    assert ast is not None
+    ljd.lua.writer.write(sys.stdout, ast)
 
-    ljd.ast.validator.validate(ast, warped=True)
+    fallbacks = ljd.pipeline.count_fallbacks(ast)
 
-    ljd.ast.mutator.pre_pass(ast)
+    if fallbacks > 0:
+        errprint("{0}: {1} function(s) failed to decompile", file_in,
+                                                            fallbacks)
+        return 1
 
-    # ljd.ast.validator.validate(ast, warped=True)
+    return 0
 
-    ljd.ast.locals.mark_locals(ast)
 
-    # ljd.ast.validator.validate(ast, warped=True)
+def _parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="LuaJIT raw-bytecode decompiler")
 
-    ljd.ast.slotworks.eliminate_temporary(ast)
+    parser.add_argument("files", nargs="*", metavar="file",
+        help="raw LuaJIT bytecode dump, a directory or a zip/tar archive"
+            " of them (told by the extension)")
 
-    # ljd.ast.validator.validate(ast, warped=True)
+    parser.add_argument("--asm", action="store_true",
+        help="write the disassembly instead of the decompiled source")
 
-    if True:
-        ljd.ast.unwarper.unwarp(ast)
+    parser.add_argument("--scan", action="store_true",
+        help="print the header and metadata of each file as JSON lines"
+            " without decompiling it")
 
-        # ljd.ast.validator.validate(ast, warped=False)
+    parser.add_argument("--carve", action="store_true",
+        help="find the embedded dumps in arbitrary binaries and"
+            " decompile each of them")
 
-        if True:
-            ljd.ast.locals.mark_local_definitions(ast)
+    parser.add_argument("--export", default=None,
+        choices=(ljd.pseudoasm.export.FORMAT_JSONL,
+                    ljd.pseudoasm.export.FORMAT_CSV),
+        help="write a record per instruction in the given format"
+            " instead of the disassembly text")
 
-            # ljd.ast.validator.validate(ast, warped=False)
+    parser.add_argument("--calibrate", action="store_true",
+        help="time the decompilation of the files and write the least"
+            " squares fit of the time on the prototype features as JSON"
+            " (see ljd/analysis/cost.py)")
 
-            ljd.ast.mutator.primary_pass(ast)
+    parser.add_argument("--debuginfo", default=ljd.rawdump.debuginfo.MODE_FULL,
+        choices=(ljd.rawdump.debuginfo.MODE_FULL,
+                    ljd.rawdump.debuginfo.MODE_LAZY,
+                    ljd.rawdump.debuginfo.MODE_SKIP),
+        help="decode the debug info while parsing (full), on the first"
+            " use (lazy) or never, as if the dump was stripped (skip)")
 
-            ljd.ast.validator.validate(ast, warped=False)
+    parser.add_argument("--strict", dest="validate", action="store_const",
+        const=100, default=0,
+        help="check the AST of every function while decompiling")
 
-    ljd.lua.writer.write(sys.stdout, ast)
+    parser.add_argument("--validate", dest="validate", type=float,
+        metavar="PERCENT",
+        help="check the AST of the given percentage of the functions,"
+            " picked at random")
+
+    parser.add_argument("--budget", type=float, default=None,
+        metavar="SECONDS",
+        help="give up on a function taking longer than this and write its"
+            " disassembly as a comment instead")
+
+    parser.add_argument("--budget-steps", type=int, default=None,
+        metavar="STEPS",
+        help="the same as --budget, but in the decompiler loop steps")
+
+    parser.add_argument("--fallback", default=ljd.pipeline.FALLBACK_BUDGET,
+        choices=(ljd.pipeline.FALLBACK_OFF,
+                    ljd.pipeline.FALLBACK_BUDGET,
+                    ljd.pipeline.FALLBACK_ALL),
+        help="write the disassembly of a function as a comment instead of"
+            " failing: never (off), when over the budget or on an"
+            " unsupported construct (budget) or on any error (all)."
+            " The exit code is non-zero if any function falls back")
+
+    parser.add_argument("-o", "--output", default=None,
+        help="directory or zip/tar archive to write the decompiled"
+            " files into instead of stdout (a file for --export and"
+            " --calibrate)")
+
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+        help="number of parallel workers")
+
+    parser.add_argument("--stream", default=None,
+        choices=(ljd.stream.FRAMING_LENGTH, ljd.stream.FRAMING_JSONL),
+        help="read the framed dumps from stdin and write the framed"
+            " results to stdout (see ljd/stream.py for the format)")
+
+    parser.add_argument("--unordered", action="store_true",
+        help="write the --stream results as soon as they are ready"
+            " instead of the input order")
+
+    parser.add_argument("--serve", default=None, metavar="SOCKET",
+        help="keep running and serve the decompilation requests on the"
+            " unix domain socket (see client.py)")
+
+    parser.add_argument("--queue-size", type=int, default=None,
+        help="maximum number of the requests in processing for --serve")
+
+    parser.add_argument("--max-message-size", type=int,
+        default=ljd.server.MAX_MESSAGE_SIZE, metavar="BYTES",
+        help="maximum size of a request for --serve, the larger ones are"
+            " rejected")
+
+    args = parser.parse_args()
+
+    if args.serve is None and args.stream is None and len(args.files) == 0:
+        parser.error("at least one file is required")
+
+    return args
+
+
+def _expand_paths(paths):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+
+            for filename in sorted(files):
+                yield os.path.join(root, filename)
+
+
+def _scan(args):
+    filenames = _expand_paths(args.files)
+
+    for summary in ljd.rawdump.scanner.scan_all(filenames, args.jobs):
+        sys.stdout.write(json.dumps(summary.as_dict()) + "\n")
 
     return 0
 
 
+def _carve(args):
+    suffix = _output_suffix(args)
+
+    sources = (
+        ljd.batch.FileRegion(summary.origin, summary.offset, summary.size,
+                                                                    suffix)
+            for filename in _expand_paths(args.files)
+                for summary in ljd.rawdump.carver.carve_file(filename)
+    )
+
+    results = ljd.batch.run(sources, args.jobs, _mode(args),
+                                        debuginfo=args.debuginfo)
+
+    return _write_results(results, args.output)
+
+
+def _export(args):
+    if args.output is not None:
+        fd = open(args.output, "w", newline="")
+    else:
+        fd = sys.stdout
+
+    retval = 0
+
+    try:
+        writer = ljd.pseudoasm.export.open_writer(fd, args.export)
+
+        for source in _batch_sources(args.files):
+            try:
+                header, prototype = ljd.rawdump.parser.parse_bytes(
+                            source.read(), source.name, args.debuginfo)
+
+                if prototype is None:
+                    errprint("{0}: Failed to parse the dump", source.name)
+                    retval = 1
+                    continue
+
+                writer.write(ljd.pseudoasm.export.iterate(prototype,
+                                                            source.name))
+            except Exception as e:
+                errprint("{0}: {1}: {2}", source.name, type(e).__name__, e)
+                retval = 1
+    finally:
+        if fd is not sys.stdout:
+            fd.close()
+
+    return retval
+
+
+def _calibrate(args):
+    samples = []
+
+    retval = 0
+
+    for source in _batch_sources(args.files):
+        try:
+            header, prototype = ljd.rawdump.parser.parse_bytes(
+                            source.read(), source.name, args.debuginfo)
+
+            if prototype is None:
+                errprint("{0}: Failed to parse the dump", source.name)
+                retval = 1
+                continue
+
+            features = ljd.analysis.cost.extract(prototype)
+        except Exception as e:
+            errprint("{0}: {1}: {2}", source.name, type(e).__name__, e)
+            retval = 1
+            continue
+
+        # A dump the decompiler fails on says nothing about its cost
+        try:
+            seconds = ljd.analysis.cost.measure(prototype)
+        except Exception as e:
+            errprint("{0}: skipped: {1}: {2}", source.name,
+                                                type(e).__name__, e)
+            continue
+
+        samples.append((features, seconds))
+
+    if len(samples) == 0:
+        errprint("No samples to fit the model on")
+        return 1
+
+    model = ljd.analysis.cost.fit(samples)
+
+    if args.output is not None:
+        with open(args.output, "w") as fd:
+            ljd.analysis.cost.save(fd, model)
+    else:
+        ljd.analysis.cost.save(sys.stdout, model)
+
+    return retval
+
+
+def _stream(args):
+    output = sys.stdout.buffer
+
+    # Some passes print their complaints to stdout, keep them out of the
+    # framed output (the workers are forked after this too)
+    sys.stdout = sys.stderr
+
+    records = ljd.stream.read_records(sys.stdin.buffer, args.stream)
+
+    results = ljd.batch.run(records, args.jobs, _mode(args),
+                                        ordered=not args.unordered,
+                                        debuginfo=args.debuginfo)
+
+    try:
+        for result in results:
+            ljd.stream.write_record(output, args.stream, result)
+    except (IOError, ValueError) as e:
+        errprint("Broken input stream: {0}", str(e))
+        return 1
+
+    return 0
+
+
+def _serve(args):
+    ljd.server.serve(args.serve, args.jobs, args.queue_size,
+                                            args.max_message_size)
+
+    return 0
+
+
+def _is_batch(args):
+    if len(args.files) > 1 or args.output is not None:
+        return True
+
+    path = args.files[0]
+
+    return os.path.isdir(path)                          \
+        or ljd.util.archive.is_zip(path)                \
+        or ljd.util.archive.is_tar(path)
+
+
+def _batch(args):
+    sources = _batch_sources(args.files, _output_suffix(args))
+
+    results = ljd.batch.run(sources, args.jobs, _mode(args),
+                                        debuginfo=args.debuginfo)
+
+    return _write_results(results, args.output)
+
+
+def _mode(args):
+    return ljd.batch.MODE_ASM if args.asm else ljd.batch.MODE_LUA
+
+
+def _output_suffix(args):
+    return ljd.batch.OUTPUT_SUFFIXES[_mode(args)]
+
+
+def _batch_sources(paths, suffix=".lua"):
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in _expand_paths([path]):
+                relpath = os.path.relpath(filename, path)
+                yield ljd.batch.File(filename,
+                                    _output_name(relpath, suffix))
+
+        elif ljd.util.archive.is_zip(path):
+            for member in ljd.util.archive.zip_members(path):
+                yield ljd.batch.ArchiveMember(path, member,
+                                            _output_name(member, suffix))
+
+        elif ljd.util.archive.is_tar(path):
+            for member, data in ljd.util.archive.tar_members(path):
+                yield ljd.batch.Buffer(path + ":" + member, data,
+                                            _output_name(member, suffix))
+
+        else:
+            yield ljd.batch.File(path,
+                        _output_name(os.path.basename(path), suffix))
+
+
+def _output_name(path, suffix=".lua"):
+    return os.path.normpath(os.path.splitext(path)[0]) + suffix
+
+
+def _write_results(results, output):
+    retval = 0
+
+    if output is not None:
+        writer = ljd.util.archive.open_writer(output)
+    else:
+        writer = None
+
+    try:
+        for result in results:
+            if result.error is not None:
+                errprint("{0}: {1}", result.name, result.error)
+                retval = 1
+                continue
+
+            if result.fallbacks > 0:
+                errprint("{0}: {1} function(s) failed to decompile",
+                                            result.name, result.fallbacks)
+                retval = 1
+
+            if writer is None:
+                sys.stdout.write("-- " + result.name + "\n\n")
+                sys.stdout.write(result.text + "\n")
+            else:
+                try:
+                    writer.write(result.output_name, result.text)
+                except ValueError as e:
+                    errprint("{0}: {1}", result.name, e)
+                    retval = 1
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return retval
+
+
 if __name__ == "__main__":
     # zzw 20180714 support str encode
     gconfig.gFlagDic['strEncode'] = 'utf-8'
@@ -0,0 +1,166 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import io
+import os
+import sys
+
+import pytest
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.dirname(TEST_DIR))
+
+import gconfig
+
+gconfig.gFlagDic['strEncode'] = 'utf-8'
+
+import ljd.ast.nodes as nodes
+import ljd.ast.traverse as traverse
+import ljd.bytecode.prototype
+import ljd.lua.writer
+import ljd.pipeline
+import ljd.rawdump.debuginfo
+import ljd.rawdump.parser
+
+
+# The dumps of these are compiled out of the test/*.lua files, the _s ones are
+# stripped. There are dumps of a few corner cases besides them in test/dumps.
+DUMPS = ("primitive", "expression", "ifs", "loop", "breaks")
+
+
+@pytest.fixture
+def dump_path():
+	def get_path(name):
+		return os.path.join(TEST_DIR, "dumps", name + ".luac")
+
+	return get_path
+
+
+@pytest.fixture(params=DUMPS)
+def dump_name(request):
+	return request.param
+
+
+@pytest.fixture(params=("", "_s"), ids=("unstripped", "stripped"))
+def dump_suffix(request):
+	return request.param
+
+
+# The header and the main prototype of the dump
+@pytest.fixture
+def parse(dump_path):
+	def parse_dump(name, debuginfo=ljd.rawdump.debuginfo.MODE_FULL):
+		header, prototype = ljd.rawdump.parser.parse(dump_path(name),
+								debuginfo)
+
+		assert prototype is not None
+
+		return header, prototype
+
+	return parse_dump
+
+
+def _collect_prototypes(prototype, prototypes):
+	prototypes.append(prototype)
+
+	for constant in prototype.constants.complex_constants:
+		if isinstance(constant, ljd.bytecode.prototype.Prototype):
+			_collect_prototypes(constant, prototypes)
+
+	return prototypes
+
+
+# The prototype and all the nested ones, the outer ones first
+@pytest.fixture
+def collect_prototypes():
+	return lambda prototype: _collect_prototypes(prototype, [])
+
+
+@pytest.fixture
+def write_lua():
+	def write(ast):
+		fd = io.StringIO()
+		ljd.lua.writer.write(fd, ast)
+
+		return fd.getvalue()
+
+	return write
+
+
+@pytest.fixture
+def decompile(write_lua):
+	def decompile_prototype(prototype, manager=None):
+		return write_lua(ljd.pipeline.decompile(prototype, manager))
+
+	return decompile_prototype
+
+
+class _FunctionsCollector(traverse.Visitor):
+	def __init__(self):
+		self.result = []
+
+	def visit_function_definition(self, node):
+		self.result.append(node)
+
+
+# The function definitions of the AST, the outer ones first
+@pytest.fixture
+def collect_functions():
+	def collect(ast):
+		collector = _FunctionsCollector()
+		traverse.traverse(collector, ast)
+
+		return collector.result
+
+	return collect
+
+
+class NodeFactory():
+	def identifier(self, slot, identifier_type=nodes.Identifier.T_SLOT,
+								name=None):
+		node = nodes.Identifier()
+		node.type = identifier_type
+		node.slot = slot
+		node.name = name
+
+		return node
+
+	def constant(self, value, constant_type=nodes.Constant.T_INTEGER):
+		node = nodes.Constant()
+		node.type = constant_type
+		node.value = value
+
+		return node
+
+	def string(self, value):
+		return self.constant(value, nodes.Constant.T_STRING)
+
+	def element(self, table, key):
+		node = nodes.TableElement()
+		node.table = table
+		node.key = key
+
+		return node
+
+	def call(self, function, *arguments):
+		node = nodes.FunctionCall()
+		node.function = function
+		node.arguments.contents = list(arguments)
+
+		return node
+
+	def assignment(self, destination, expression):
+		node = nodes.Assignment()
+		node.type = nodes.Assignment.T_NORMAL
+		node.destinations.contents = [destination]
+		node.expressions.contents = [expression]
+
+		return node
+
+
+# Builds the AST nodes by hand
+@pytest.fixture
+def make():
+	return NodeFactory()
@@ -0,0 +1,177 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+import ljd.batch
+import ljd.util.archive as archive
+
+import main
+
+
+@pytest.mark.parametrize("name, expected", (
+	("a.lua", "a.lua"),
+	("dir/a.lua", os.path.join("dir", "a.lua")),
+	("dir/../a.lua", "a.lua"),
+	("./dir//a.lua", os.path.join("dir", "a.lua")),
+	("dir\\a.lua", os.path.join("dir", "a.lua"))
+))
+def test_check_name(name, expected):
+	assert archive.check_name(name) == expected
+
+
+@pytest.mark.parametrize("name", (
+	"/etc/a.lua",
+	"../a.lua",
+	"../../escaped.lua",
+	"dir/../../a.lua",
+	"..\\a.lua",
+	".",
+	""
+))
+def test_check_name_rejects(name):
+	with pytest.raises(ValueError):
+		archive.check_name(name)
+
+
+@pytest.mark.parametrize("member, expected", (
+	("a.luac", "a.lua"),
+	("dir/b.luac", os.path.join("dir", "b.lua")),
+	("c", "c.lua")
+))
+def test_output_name(member, expected):
+	assert main._output_name(member) == expected
+
+
+def test_output_name_suffix():
+	assert main._output_name("dir/b.luac", ".asm") \
+					== os.path.join("dir", "b.asm")
+
+
+@pytest.mark.parametrize("name", ("out.zip", "OUT.ZIP", "out.Zip"))
+def test_open_zip_writer(tmp_path, name):
+	writer = archive.open_writer(str(tmp_path / name))
+
+	try:
+		assert isinstance(writer, archive.ZipWriter)
+	finally:
+		writer.close()
+
+	assert zipfile.is_zipfile(str(tmp_path / name))
+
+
+def test_directory_writer(tmp_path):
+	root = tmp_path / "out" / "sub"
+	writer = archive.DirectoryWriter(str(root))
+
+	writer.write(main._output_name("dir/a.luac"), "return 1")
+
+	assert (root / "dir" / "a.lua").read_text() == "return 1"
+
+	for name in ("../../escaped.luac", "/abs.luac"):
+		with pytest.raises(ValueError):
+			writer.write(main._output_name(name), "return 1")
+
+	assert not (tmp_path / "escaped.lua").exists()
+
+
+def test_directory_writer_symlink(tmp_path):
+	root = tmp_path / "out"
+	outside = tmp_path / "outside"
+	outside.mkdir()
+
+	writer = archive.DirectoryWriter(str(root))
+	os.symlink(str(outside), str(root / "link"))
+
+	with pytest.raises(ValueError):
+		writer.write("link/a.lua", "return 1")
+
+	assert list(outside.iterdir()) == []
+
+
+@pytest.mark.parametrize("suffix", (".zip", ".tar", ".tar.gz", ".tgz"))
+def test_archive_writer_rejects(tmp_path, suffix):
+	writer = archive.open_writer(str(tmp_path / ("out" + suffix)))
+
+	try:
+		writer.write("a.lua", "return 1")
+
+		with pytest.raises(ValueError):
+			writer.write("../a.lua", "return 1")
+	finally:
+		writer.close()
+
+
+def _make_zip(path, members):
+	with zipfile.ZipFile(path, "w") as fd:
+		for name, data in members.items():
+			fd.writestr(name, data)
+
+
+def _make_tar(path, members):
+	with tarfile.open(path, "w") as fd:
+		for name, data in members.items():
+			info = tarfile.TarInfo(name)
+			info.size = len(data)
+			fd.addfile(info, io.BytesIO(data))
+
+
+def test_archives_by_extension(tmp_path):
+	zip_path = str(tmp_path / "a.zip")
+	_make_zip(zip_path, {"a.luac": b""})
+
+	disguised_path = str(tmp_path / "a.luac")
+	os.rename(zip_path, disguised_path)
+
+	assert not archive.is_zip(disguised_path)
+	assert not archive.is_tar(disguised_path)
+
+	tar_path = str(tmp_path / "b.TAR")
+	_make_tar(tar_path, {"b.luac": b""})
+
+	assert archive.is_tar(tar_path)
+	assert not archive.is_zip(tar_path)
+
+
+@pytest.mark.parametrize("suffix", (".zip", ".tar"))
+def test_batch_archive(tmp_path, dump_path, suffix):
+	with open(dump_path("ifs"), 'rb') as fd:
+		data = fd.read()
+
+	path = str(tmp_path / ("in" + suffix))
+
+	members = {"dir/ifs.luac": data, "../../escaped.luac": data}
+
+	if suffix == ".zip":
+		_make_zip(path, members)
+	else:
+		_make_tar(path, members)
+
+	output = tmp_path / "out" / "sub"
+
+	sources = main._batch_sources([path])
+	results = ljd.batch.run(sources, 1)
+
+	assert main._write_results(results, str(output)) == 1
+
+	assert (output / "dir" / "ifs.lua").exists()
+	assert not (tmp_path / "escaped.lua").exists()
+	assert ljd.batch._zip_file is None
+
+
+def test_batch_asm(tmp_path, dump_path):
+	output = tmp_path / "out"
+
+	sources = main._batch_sources([dump_path("ifs")], ".asm")
+	results = ljd.batch.run(sources, 1, ljd.batch.MODE_ASM)
+
+	assert main._write_results(results, str(output)) == 0
+
+	assert "FNEW" in (output / "ifs.asm").read_text()
+	assert not (output / "ifs.lua").exists()
@@ -0,0 +1,51 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import ljd.rawdump.carver as carver
+import ljd.rawdump.parser
+
+
+def _read(path):
+	with open(path, 'rb') as fd:
+		return fd.read()
+
+
+def test_carve_embedded_dumps(tmp_path, dump_path):
+	first = _read(dump_path("ifs"))
+	second = _read(dump_path("loop_s"))
+
+	# A stray magic in front of the dumps is a candidate only
+	blob = b"\x00junk\x1bLJ\x02garbage" + first + b"\xff" * 7 + second
+
+	path = tmp_path / "blob.bin"
+	path.write_bytes(blob)
+
+	summaries = list(carver.carve_file(str(path)))
+
+	assert [(summary.offset, summary.size) for summary in summaries] == [
+		(blob.index(first), len(first)),
+		(blob.index(second), len(second))
+	]
+
+	assert not summaries[0].is_stripped
+	assert summaries[1].is_stripped
+
+	for summary in summaries:
+		data = blob[summary.offset:summary.offset + summary.size]
+		header, prototype = ljd.rawdump.parser.parse_bytes(data)
+
+		assert prototype is not None
+
+
+def test_carve_truncated_dump(dump_path):
+	data = _read(dump_path("expression"))
+
+	assert list(carver.carve(data[:-10])) == []
+
+
+def test_carve_empty_file(tmp_path):
+	path = tmp_path / "empty.bin"
+	path.write_bytes(b"")
+
+	assert list(carver.carve_file(str(path))) == []
@@ -0,0 +1,110 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import pytest
+
+import ljd.bytecode.instructions as ins
+import ljd.bytecode.prototype
+import ljd.rawdump.debuginfo as debuginfo
+
+pytest.importorskip("numpy")
+
+import ljd.analysis.columnar as columnar
+
+
+_COMPLEX_TYPES = (ins.T_STR, ins.T_TAB, ins.T_FUN, ins.T_CDT)
+
+_JUMP_BIAS = 0x8000
+
+
+# The dump order: the children first, the last constant first
+def _collect_in_dump_order(prototype, prototypes):
+	for constant in reversed(prototype.constants.complex_constants):
+		if isinstance(constant, ljd.bytecode.prototype.Prototype):
+			_collect_in_dump_order(constant, prototypes)
+
+	prototypes.append(prototype)
+
+	return prototypes
+
+
+# The operand as it is stored in the dump, undoing ljd.rawdump.code
+def _to_raw(prototype, value, value_type):
+	if value_type in _COMPLEX_TYPES:
+		return len(prototype.constants.complex_constants) - value - 1
+	elif value_type == ins.T_JMP:
+		return value + _JUMP_BIAS
+	else:
+		return value
+
+
+def _parse(parse, name):
+	header, prototype = parse(name, debuginfo.MODE_SKIP)
+
+	return _collect_in_dump_order(prototype, [])
+
+
+def _read(dump_path, name):
+	path = dump_path(name)
+
+	with open(path, 'rb') as fd:
+		return columnar.from_bytes(fd.read(), path)
+
+
+def test_columns_match_parser(dump_path, parse, dump_name, dump_suffix):
+	columns = _read(dump_path, dump_name + dump_suffix)
+	prototypes = _parse(parse, dump_name + dump_suffix)
+
+	assert columns.prototypes_count == len(prototypes)
+	assert columns.offsets[-1] == len(columns)
+
+	spans = zip(columns.offsets[:-1], columns.offsets[1:])
+
+	for prototype, (start, end) in zip(prototypes, spans):
+		instructions = prototype.instructions[1:]
+
+		assert end - start == len(instructions)
+
+		for i, instruction in enumerate(instructions, start):
+			assert columns.opcode[i] == instruction.opcode
+
+			if instruction.A_type is not None:
+				assert columns.A[i] == _to_raw(prototype,
+						instruction.A, instruction.A_type)
+
+			if instruction.B_type is not None:
+				assert columns.B[i] == _to_raw(prototype,
+						instruction.B, instruction.B_type)
+			else:
+				assert columns.B[i] == 0
+
+			if instruction.CD_type is not None:
+				assert columns.CD[i] == _to_raw(prototype,
+						instruction.CD, instruction.CD_type)
+
+
+def test_jump_targets(dump_path, parse, dump_name, dump_suffix):
+	columns = _read(dump_path, dump_name + dump_suffix)
+
+	expected = []
+
+	for prototype in _parse(parse, dump_name + dump_suffix):
+		for addr, instruction in enumerate(prototype.instructions[1:], 1):
+			if instruction.CD_type == ins.T_JMP:
+				expected.append(1 + addr + instruction.CD)
+			else:
+				expected.append(-1)
+
+	targets = columnar.jump_targets(columns)
+
+	assert any(target >= 0 for target in expected)
+	assert targets.tolist() == expected
+
+
+def test_framesizes(dump_path, parse, dump_name):
+	columns = _read(dump_path, dump_name)
+	prototypes = _parse(parse, dump_name)
+
+	assert columns.framesizes.tolist() \
+			== [prototype.framesize for prototype in prototypes]
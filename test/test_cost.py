@@ -0,0 +1,83 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import argparse
+import json
+
+import pytest
+
+import ljd.analysis.cost as cost
+import ljd.pipeline
+
+import gconfig
+
+import main
+
+
+def test_measure(parse):
+	header, prototype = parse("getter")
+
+	assert cost.measure(prototype, repeats=1) > 0
+
+
+# The failing functions must not be timed as their fallback
+def test_measure_no_fallback(monkeypatch, parse):
+	monkeypatch.setitem(gconfig.gFlagDic, "fallback",
+						ljd.pipeline.FALLBACK_ALL)
+	monkeypatch.setitem(gconfig.gFlagDic, "budget_steps", 1)
+
+	header, primitive = parse("primitive")
+	header, getter = parse("getter")
+
+	with pytest.raises(AssertionError):
+		cost.measure(primitive, repeats=1)
+
+	assert cost.measure(getter, repeats=1) > 0
+
+
+def test_calibrate_skips_failures(tmp_path, dump_path):
+	output = tmp_path / "model.json"
+
+	args = argparse.Namespace(
+		files=[dump_path(name) for name in ("getter", "primitive",
+							"breaks", "ifs")],
+		debuginfo="full",
+		output=str(output)
+	)
+
+	assert main._calibrate(args) == 0
+
+	model = json.loads(output.read_text())
+
+	assert "coefficients" in model
+
+
+def _create_features(*values):
+	features = cost.Features()
+
+	for name, value in zip(cost.FEATURES, values):
+		setattr(features, name, value)
+
+	return features
+
+
+def test_fit():
+	model = cost.Model(0.5, (0.01, 0.02, 0.1, 0.001, 0.0, 0.2))
+
+	samples = []
+
+	for i in range(1, 20):
+		features = _create_features(i * 10, i % 4, i % 3, (i % 4) ** 2,
+								i % 5, i % 2)
+
+		samples.append((features, model.predict(features)))
+
+	fitted = cost.fit(samples)
+
+	assert fitted.intercept == pytest.approx(model.intercept, abs=1e-6)
+	assert fitted.coefficients == pytest.approx(model.coefficients,
+								abs=1e-6)
+
+	# The coefficients are saved by the feature names
+	assert set(fitted.as_dict()["coefficients"]) == set(cost.FEATURES)
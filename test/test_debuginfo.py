@@ -0,0 +1,164 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import io
+
+import pytest
+
+import ljd.bytecode.debuginfo
+import ljd.pseudoasm.writer
+import ljd.rawdump.debuginfo as debuginfo
+import ljd.rawdump.parser
+import ljd.util.binstream
+
+
+def _get_state(info):
+	return (
+		info.addr_to_line_map,
+		info.upvalue_variable_names,
+		[(var.name, var.type, var.start_addr, var.end_addr)
+			for var in info.variable_info]
+	)
+
+
+#
+# The value by value decoder the bulk one has replaced, reading the debug info
+# through the parser stream
+#
+def _decode_from_stream(data, byteorder, line_offset, lines_count,
+					instructions_count, upvalues_count):
+	stream = ljd.util.binstream.BinStream()
+	stream.open_bytes(data)
+	stream.data_byteorder = byteorder
+
+	if lines_count >= 65536:
+		lineinfo_size = 4
+	elif lines_count >= 256:
+		lineinfo_size = 2
+	else:
+		lineinfo_size = 1
+
+	lineinfo = [0]
+
+	while len(lineinfo) < instructions_count + 1:
+		lineinfo.append(line_offset + stream.read_uint(lineinfo_size))
+
+	names = []
+
+	while len(names) < upvalues_count:
+		names.append(stream.read_zstring().decode("utf-8"))
+
+	infos = []
+	last_addr = 0
+
+	while True:
+		vartype = stream.read_byte()
+
+		if vartype == debuginfo.VARNAME_END:
+			break
+
+		if vartype >= debuginfo.VARNAME__MAX:
+			name = (bytes((vartype,)) + stream.read_zstring())
+			name = name.decode("utf-8")
+			kind = ljd.bytecode.debuginfo.VariableInfo.T_VISIBILE
+		else:
+			name = debuginfo.INTERNAL_VARNAMES[vartype]
+			kind = ljd.bytecode.debuginfo.VariableInfo.T_INTERNAL
+
+		start_addr = last_addr + stream.read_uleb128()
+		end_addr = start_addr + stream.read_uleb128()
+
+		last_addr = start_addr
+
+		infos.append((name, kind, start_addr, end_addr))
+
+	assert stream.eof()
+
+	stream.close()
+
+	return lineinfo, names, infos
+
+
+def test_bulk_decoder_matches_stream(parse, collect_prototypes, dump_name):
+	header, prototype = parse(dump_name, debuginfo.MODE_LAZY)
+
+	prototypes = collect_prototypes(prototype)
+
+	for prototype in prototypes:
+		loader = prototype.debuginfo.loader
+
+		if loader is None:
+			continue
+
+		data, context = loader.args[:2]
+		expected = _decode_from_stream(data, *loader.args[2:])
+
+		prototype.debuginfo.load()
+
+		assert _get_state(prototype.debuginfo) == expected
+
+
+def test_lazy_matches_full(parse, collect_prototypes, dump_name):
+	header, full = parse(dump_name, debuginfo.MODE_FULL)
+	header, lazy = parse(dump_name, debuginfo.MODE_LAZY)
+
+	full = collect_prototypes(full)
+	lazy = collect_prototypes(lazy)
+
+	assert any(prototype.debuginfo.loader is not None
+						for prototype in lazy)
+
+	for full_prototype, lazy_prototype in zip(full, lazy):
+		lazy_info = lazy_prototype.debuginfo
+
+		addr = len(lazy_prototype.instructions) - 1
+
+		assert lazy_info.lookup_line_number(addr) \
+			== full_prototype.debuginfo.lookup_line_number(addr)
+
+		assert _get_state(lazy_info) \
+			== _get_state(full_prototype.debuginfo)
+
+
+def _disassemble(header, prototype):
+	fd = io.StringIO()
+	ljd.pseudoasm.writer.write(fd, header, prototype)
+
+	# Leave the "Disassemble of <file>" line out
+	return fd.getvalue().split("\n", 2)[2]
+
+
+@pytest.mark.parametrize("name", ("loop", "breaks", "getter"))
+def test_skip_looks_stripped(parse, name):
+	header, skipped = parse(name, debuginfo.MODE_SKIP)
+
+	assert header.flags.is_stripped
+
+	stripped_header, stripped = parse(name + "_s")
+
+	assert _disassemble(header, skipped) \
+			== _disassemble(stripped_header, stripped)
+
+
+def test_lazy_error_context(dump_path, collect_prototypes):
+	with open(dump_path("getter"), 'rb') as fd:
+		data = fd.read()
+
+	end = len(data) - 1
+
+	# Cut the main function debug info short by taking the terminator out
+	assert data[end] == 0 and data[end - 1] == 0
+
+	corrupt = data[:end - 1] + b"\x01" + data[end:]
+
+	header, prototype = ljd.rawdump.parser.parse_bytes(corrupt,
+					"corrupt.luac", debuginfo.MODE_LAZY)
+
+	prototypes = collect_prototypes(prototype)
+
+	with pytest.raises(IOError) as error:
+		prototypes[0].debuginfo.lookup_line_number(1)
+
+	assert "corrupt.luac" in str(error.value)
+	assert "debug info at 0x" in str(error.value)
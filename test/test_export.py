@@ -0,0 +1,178 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import csv
+import io
+import json
+import re
+
+import ljd.bytecode.instructions as ins
+import ljd.pseudoasm.export as export
+import ljd.pseudoasm.instructions
+import ljd.pseudoasm.writer
+
+
+# addr, line, opcode, A, B and CD of an instruction line of the listing
+_LISTING_LINE = re.compile(
+	r"^\t*\s*(\d+)\t\[\s*(\d+)\]\t(\w+)\s*\t\s*(-?\d*)\t(-?\d*)\t(-?\d*)\t;"
+)
+
+_CONSTANT_TYPES = (ins.T_STR, ins.T_NUM, ins.T_PRI, ins.T_TAB, ins.T_CDT)
+
+_PRIMITIVES = {None: "nil", True: "true", False: "false"}
+
+
+def _export(prototype):
+	return list(export.iterate(prototype, "x.luac"))
+
+
+def _get_listing(prototype):
+	fd = io.StringIO()
+	ljd.pseudoasm.writer.write_prototype(fd, prototype)
+
+	lines = fd.getvalue().split("\n")
+
+	return [match.groups() for match in map(_LISTING_LINE.match, lines)
+							if match is not None]
+
+
+def _to_column(value):
+	return "" if value is None else str(value)
+
+
+def _find_prototype(prototype, path):
+	for index in path.split("/")[1:]:
+		prototype = prototype.constants.complex_constants[int(index)]
+
+	return prototype
+
+
+# The state the writer translates the instructions of the prototype with
+def _create_state(prototype):
+	return ljd.pseudoasm.instructions._State(ljd.pseudoasm.writer._State(),
+							prototype,
+							prototype.instructions)
+
+
+def _format_constant(constant, value_type):
+	if value_type == ins.T_STR:
+		return '"' + constant + '"'
+	elif value_type == ins.T_PRI:
+		return _PRIMITIVES[constant]
+	else:
+		return str(constant)
+
+
+def test_columns(parse, dump_name, dump_suffix):
+	header, prototype = parse(dump_name + dump_suffix)
+
+	records = _export(prototype)
+	listing = _get_listing(prototype)
+
+	assert len(records) == len(listing)
+
+	for record, line in zip(records, listing):
+		addr, line_number, opcode, A, B, CD = line
+
+		assert str(record["addr"]) == addr
+		assert str(record["line"]) == line_number
+		assert record["opcode"] == opcode
+		assert _to_column(record["a"]) == A
+		assert _to_column(record["b"]) == B
+		assert _to_column(record["cd"]) == CD
+
+
+def test_operands(parse, dump_name, dump_suffix):
+	header, prototype = parse(dump_name + dump_suffix)
+
+	translate = ljd.pseudoasm.instructions._translate
+	lookup_local_name = ljd.pseudoasm.instructions._lookup_local_name
+
+	for record in _export(prototype):
+		child = _find_prototype(prototype, record["prototype"])
+		state = _create_state(child)
+
+		addr = record["addr"]
+		instruction = child.instructions[addr]
+
+		constant = None
+		target = None
+
+		for value, value_type in ((record["a"], instruction.A_type),
+					(record["b"], instruction.B_type),
+					(record["cd"], instruction.CD_type)):
+			if value_type in _CONSTANT_TYPES:
+				constant = translate(state, addr, value, value_type)
+				formatted = _format_constant(record["constant"],
+								value_type)
+			elif value_type == ins.T_FUN:
+				constant = record["prototype"] + "/" + str(value)
+				formatted = record["constant"]
+			elif value_type == ins.T_JMP:
+				target = translate(state, addr, value, value_type)
+
+		if constant is None:
+			assert record["constant"] is None
+		else:
+			assert formatted == constant
+
+		assert _to_column(record["target"]) == _to_column(target)
+
+		local = None
+
+		if instruction.A_type in export._SLOT_TYPES:
+			local = lookup_local_name(state, addr, record["a"])
+
+		if local is None:
+			assert record["local"] is None
+		elif record["local"][0] == "<":
+			assert "slot" + str(record["a"]) + record["local"] == local
+		else:
+			assert record["local"] == local
+
+
+def test_stripped(parse, dump_name):
+	header, prototype = parse(dump_name)
+	header, stripped = parse(dump_name + "_s")
+
+	records = _export(prototype)
+	stripped_records = _export(stripped)
+
+	assert any(record["local"] is not None for record in records)
+	assert all(record["local"] is None for record in stripped_records)
+	assert all(record["line"] == 0 for record in stripped_records)
+
+	# The same instructions, only without the debug info
+	def strip(record):
+		return dict(record, line=0, local=None, upvalue=None)
+
+	assert list(map(strip, records)) == list(map(strip, stripped_records))
+
+
+def test_csv(parse, dump_suffix):
+	header, prototype = parse("getter" + dump_suffix)
+
+	fd = io.StringIO()
+	export.open_writer(fd, export.FORMAT_CSV).write(_export(prototype))
+
+	reader = csv.DictReader(io.StringIO(fd.getvalue()))
+
+	assert tuple(reader.fieldnames) == export.FIELDS
+
+	expected = [{name: _to_column(value) for name, value in record.items()}
+					for record in _export(prototype)]
+
+	assert list(reader) == expected
+
+
+def test_jsonl(parse, dump_suffix):
+	header, prototype = parse("getter" + dump_suffix)
+
+	fd = io.StringIO()
+	export.open_writer(fd, export.FORMAT_JSONL).write(_export(prototype))
+
+	lines = fd.getvalue().splitlines()
+
+	assert [json.loads(line) for line in lines] == _export(prototype)
+	assert all(tuple(json.loads(line)) == export.FIELDS for line in lines)
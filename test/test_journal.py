@@ -0,0 +1,168 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import ljd.ast.builder
+import ljd.ast.journal
+import ljd.ast.mutator
+import ljd.ast.structure as structure
+import ljd.pipeline
+
+
+# The getter functions are get, set, loop, ifs and the main one - in the order
+# the manager runs them in
+def _decompile_getter(parse, journal=None):
+	header, prototype = parse("getter")
+
+	manager = ljd.pipeline.create_default_manager(validate=100)
+	manager.journal = journal
+
+	ast = ljd.pipeline.decompile(prototype, manager)
+
+	return ast, ljd.pipeline._gather_functions(ast)
+
+
+def _create_manager(seen, journal, incremental=True, before=None):
+	def see(function):
+		seen.append(function)
+
+	passes = [
+		ljd.pipeline.Pass("primary_pass",
+			ljd.pipeline._per_function(
+					ljd.ast.mutator.primary_pass),
+			per_function=True,
+			incremental=True),
+
+		ljd.pipeline.Pass("see", see, ("primary_pass",),
+			per_function=True,
+			incremental=incremental)
+	]
+
+	if before is not None:
+		passes.insert(0, ljd.pipeline.Pass("before", before,
+							per_function=True))
+
+	manager = ljd.pipeline.PassManager(passes)
+	manager.journal = journal
+
+	return manager
+
+
+def test_fresh_tree(parse):
+	journal = ljd.ast.journal.Journal()
+
+	header, prototype = parse("getter")
+
+	ast = ljd.ast.builder.build(prototype)
+
+	# With the blocks - there is no digest
+	journal.mark_clean(ast)
+
+	assert journal.is_dirty(ast)
+
+
+def test_mark_clean(parse):
+	journal = ljd.ast.journal.Journal()
+
+	ast, functions = _decompile_getter(parse)
+
+	structure.invalidate()
+
+	assert all(journal.is_dirty(function) for function in functions)
+
+	for function in functions:
+		journal.mark_clean(function)
+
+	assert not any(journal.is_dirty(function) for function in functions)
+
+	# In place, and only seen after the cached digests are dropped
+	functions[1].arguments.contents[1].name = "value"
+
+	structure.invalidate()
+
+	assert [journal.is_dirty(function) for function in functions] \
+				== [False, True, False, False, True]
+
+	functions[1].arguments.contents[1].name = "v"
+
+	structure.invalidate()
+
+	assert not any(journal.is_dirty(function) for function in functions)
+
+	journal.mark_dirty(functions[0])
+
+	assert journal.is_dirty(functions[0])
+
+	# Another journal knows nothing of the functions
+	assert ljd.ast.journal.Journal().is_dirty(functions[2])
+
+
+def test_incremental_run(parse):
+	ast, functions = _decompile_getter(parse)
+
+	seen = []
+	manager = _create_manager(seen, ljd.ast.journal.Journal())
+
+	manager.run(ast)
+
+	assert seen == functions
+
+	del seen[:]
+	manager.run(ast)
+
+	assert seen == []
+
+	functions[1].statements.contents.pop()
+	manager.run(ast)
+
+	assert seen == [functions[1], functions[4]]
+
+
+def test_incremental_run_after_other_pass(parse):
+	ast, functions = _decompile_getter(parse)
+
+	seen = []
+	manager = _create_manager(seen, ljd.ast.journal.Journal(),
+					before=lambda function: None)
+
+	manager.run(ast)
+
+	del seen[:]
+	manager.run(ast)
+
+	# Any pass may change the function
+	assert seen == functions
+
+
+def test_not_incremental_run(parse):
+	ast, functions = _decompile_getter(parse)
+
+	seen = []
+	manager = _create_manager(seen, ljd.ast.journal.Journal(), False)
+
+	manager.run(ast)
+
+	del seen[:]
+	manager.run(ast)
+
+	assert seen == functions
+
+
+def test_no_journal(parse):
+	ast, functions = _decompile_getter(parse)
+
+	seen = []
+	manager = _create_manager(seen, None)
+
+	manager.run(ast)
+	manager.run(ast)
+
+	assert seen == functions * 2
+
+
+def test_output(parse, write_lua):
+	with_journal, functions = _decompile_getter(parse,
+						ljd.ast.journal.Journal())
+	without, functions = _decompile_getter(parse)
+
+	assert write_lua(with_journal) == write_lua(without)
@@ -0,0 +1,112 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import re
+
+import ljd.ast.mutator
+import ljd.ast.nodes as nodes
+import ljd.ast.structure as structure
+import ljd.pipeline
+
+
+# The bigfill dumps are "local t = {} t.f0 = 0 ... t.f299 = 299 return t"
+BIGFILL_FIELDS = 300
+
+
+def _field(make, table, name):
+	return make.element(table, make.string(name))
+
+
+# self.x, with self as a local
+def _self_x(make):
+	self = make.identifier(0, nodes.Identifier.T_LOCAL, "self")
+
+	return _field(make, self, "x")
+
+
+# self.x.name = value
+def _set_field(make, name, value):
+	return make.assignment(_field(make, _self_x(make), name), value)
+
+
+def _fill(statements):
+	structure.invalidate()
+
+	node = nodes.StatementsList()
+	node.contents = statements
+
+	ljd.ast.mutator.MutatorVisitor().visit_statements_list(node)
+
+	return node.contents
+
+
+def _get_record_keys(constructor):
+	return [record.key.value for record in constructor.records.contents]
+
+
+def test_bigfill(parse, decompile, dump_suffix):
+	header, prototype = parse("bigfill" + dump_suffix)
+
+	manager = ljd.pipeline.create_default_manager(validate=0)
+	manager.fallback = ljd.pipeline.FALLBACK_OFF
+
+	result = decompile(prototype, manager)
+
+	assert result.count("{") == 1
+	assert ".f" not in result
+
+	fields = re.findall(r"^\tf(\d+) = (\d+),?$", result, re.MULTILINE)
+
+	assert fields == [(str(i), str(i)) for i in range(BIGFILL_FIELDS)]
+
+
+def test_fill(make):
+	constructor = nodes.TableConstructor()
+
+	y = make.identifier(1, nodes.Identifier.T_LOCAL, "y")
+
+	statements = _fill([
+		make.assignment(_self_x(make), constructor),
+		_set_field(make, "a", make.constant(1)),
+		_set_field(make, "b", make.constant(2)),
+		make.assignment(_field(make, y, "c"), make.constant(3))
+	])
+
+	assert len(statements) == 2
+	assert _get_record_keys(constructor) == ["a", "b"]
+
+
+def test_fill_stops_on_self_reference(make):
+	constructor = nodes.TableConstructor()
+
+	# self.x = {a = 1}; self.x.b = self.x; self.x.c = 3 - the last two can't
+	# go into the constructor, the table doesn't exist there yet
+	statements = _fill([
+		make.assignment(_self_x(make), constructor),
+		_set_field(make, "a", make.constant(1)),
+		_set_field(make, "b", _self_x(make)),
+		_set_field(make, "c", make.constant(3))
+	])
+
+	assert len(statements) == 3
+	assert _get_record_keys(constructor) == ["a"]
+
+
+def test_fill_stops_on_multiple_destinations(make):
+	constructor = nodes.TableConstructor()
+
+	y = make.identifier(1, nodes.Identifier.T_LOCAL, "y")
+
+	multiple = _set_field(make, "b", make.constant(2))
+	multiple.destinations.contents.append(y)
+	multiple.expressions.contents.append(make.constant(3))
+
+	statements = _fill([
+		make.assignment(_self_x(make), constructor),
+		_set_field(make, "a", make.constant(1)),
+		multiple
+	])
+
+	assert statements[-1] is multiple
+	assert _get_record_keys(constructor) == ["a"]
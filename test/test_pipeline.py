@@ -0,0 +1,339 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import io
+import time
+
+import pytest
+
+import ljd.ast.nodes
+import ljd.pipeline
+import ljd.pseudoasm.writer
+import ljd.util.budget
+
+
+def _create_manager(fallback, steps=None):
+	manager = ljd.pipeline.create_default_manager(validate=0)
+	manager.fallback = fallback
+
+	if steps is not None:
+		manager.budget = ljd.util.budget.Budget(steps=steps)
+
+	return manager
+
+
+@pytest.mark.parametrize("suffix", ("", "_s"))
+def test_budget_fallback(parse, write_lua, suffix):
+	header, prototype = parse("getter" + suffix)
+
+	manager = _create_manager(ljd.pipeline.FALLBACK_BUDGET, steps=5)
+	ast = ljd.pipeline.decompile(prototype, manager)
+
+	fallbacks = ljd.pipeline.count_fallbacks(ast)
+	text = write_lua(ast)
+
+	# The loop and the if are over the budget, the rest is decompiled
+	assert fallbacks == 2
+	assert text.count("-- Failed to decompile: BudgetExceeded") == 2
+
+	name = "slot0" if suffix == "_s" else "self"
+
+	assert "\tget = function ({0})\n\t\treturn {0}.x\n".format(name) in text
+	assert "-- \t  5\t[" in text
+	assert "\tFORI \t" in text
+
+
+# The upvalues of a stripped dump have no names in the listing
+def test_budget_fallback_stripped_upvalues(parse, write_lua):
+	header, prototype = parse("ifs_s")
+
+	manager = _create_manager(ljd.pipeline.FALLBACK_BUDGET, steps=5)
+	ast = ljd.pipeline.decompile(prototype, manager)
+
+	fallbacks = ljd.pipeline.count_fallbacks(ast)
+	text = write_lua(ast)
+
+	assert fallbacks == 1
+	assert text.startswith("-- Failed to decompile: BudgetExceeded: "
+				"Over the budget of 5 steps\n--\n")
+	assert "\tUGET \t" in text
+	assert "= uv0\n" in text
+
+
+def test_budget_fallback_off(parse):
+	header, prototype = parse("ifs")
+
+	manager = _create_manager(ljd.pipeline.FALLBACK_OFF, steps=5)
+
+	with pytest.raises(ljd.util.budget.BudgetExceeded):
+		ljd.pipeline.decompile(prototype, manager)
+
+
+@pytest.mark.parametrize("name", ("primitive", "primitive_s"))
+def test_errors_not_hidden(parse, name):
+	header, prototype = parse(name)
+
+	manager = _create_manager(ljd.pipeline.FALLBACK_BUDGET)
+
+	with pytest.raises(AssertionError):
+		ljd.pipeline.decompile(prototype, manager)
+
+
+@pytest.mark.parametrize("name", ("primitive", "primitive_s"))
+def test_fallback_all(parse, name, write_lua):
+	header, prototype = parse(name)
+
+	manager = _create_manager(ljd.pipeline.FALLBACK_ALL)
+	ast = ljd.pipeline.decompile(prototype, manager)
+
+	fallbacks = ljd.pipeline.count_fallbacks(ast)
+	text = write_lua(ast)
+
+	assert fallbacks > 0
+	assert text.count("-- Failed to decompile: ") == fallbacks
+
+
+# A failure of the listing leaves the error alone
+def test_fallback_all_without_listing(parse, write_lua, monkeypatch):
+	header, prototype = parse("expression_s")
+
+	def fail(fd, prototype, source="N/A"):
+		raise TypeError("No listing")
+
+	monkeypatch.setattr(ljd.pseudoasm.writer, "write_prototype", fail)
+
+	manager = _create_manager(ljd.pipeline.FALLBACK_ALL)
+	ast = ljd.pipeline.decompile(prototype, manager)
+
+	fallbacks = ljd.pipeline.count_fallbacks(ast)
+	text = write_lua(ast)
+
+	assert fallbacks > 0
+	assert "-- Failed to decompile: AssertionError" in text
+	assert "\t;;;; instructions ;;;;" not in text
+
+
+def test_disassembly_header(parse):
+	header, prototype = parse("loop")
+
+	fd = io.StringIO()
+	ljd.pseudoasm.writer.write(fd, header, prototype)
+
+	listing = io.StringIO()
+	ljd.pseudoasm.writer.write_prototype(listing, prototype, header.name)
+
+	text = fd.getvalue()
+
+	assert text.endswith(listing.getvalue())
+	assert text.startswith(";\n; Disassemble of ")
+
+
+# The main function with the inner one assigned to a local
+def _create_tree(make):
+	inner = ljd.ast.nodes.FunctionDefinition()
+
+	outer = ljd.ast.nodes.FunctionDefinition()
+	outer.statements.contents = [
+		make.assignment(make.identifier(0), inner)
+	]
+
+	return outer, inner
+
+
+class _Log():
+	def __init__(self, names):
+		self.calls = []
+		self.names = names
+
+	def pass_(self, name, requires=(), per_function=False):
+		def run(node):
+			self.calls.append((name, self.names[id(node)]))
+
+		return ljd.pipeline.Pass(name, run, requires, per_function)
+
+
+def _create_log(make):
+	outer, inner = _create_tree(make)
+
+	return outer, _Log({id(outer): "outer", id(inner): "inner"})
+
+
+def test_schedule_order(make):
+	ast, log = _create_log(make)
+
+	manager = ljd.pipeline.PassManager([
+		log.pass_("c", ("b",)),
+		log.pass_("a"),
+		log.pass_("b", ("a",))
+	])
+
+	assert [pass_.name for pass_ in manager.schedule()] == ["a", "b", "c"]
+
+	manager.run(ast)
+
+	assert log.calls == [("a", "outer"), ("b", "outer"), ("c", "outer")]
+
+
+@pytest.mark.parametrize("requires", (("b",), ("missing",)),
+						ids=("cycle", "unknown"))
+def test_schedule_errors(make, requires):
+	ast, log = _create_log(make)
+
+	manager = ljd.pipeline.PassManager([
+		log.pass_("a", requires),
+		log.pass_("b", ("a",))
+	])
+
+	with pytest.raises(ljd.pipeline.PipelineError) as error:
+		manager.schedule()
+
+	assert "prerequisites of: a, b" in str(error.value)
+
+	with pytest.raises(ljd.pipeline.PipelineError):
+		manager.run(ast)
+
+	assert log.calls == []
+
+
+def test_manager_errors(make):
+	ast, log = _create_log(make)
+
+	manager = ljd.pipeline.PassManager([log.pass_("a")])
+
+	with pytest.raises(ljd.pipeline.PipelineError):
+		manager.add(log.pass_("a"))
+
+	with pytest.raises(ljd.pipeline.PipelineError):
+		manager.skip("b")
+
+	with pytest.raises(ljd.pipeline.PipelineError):
+		manager.replace("b", lambda node: None)
+
+
+def test_skip(make):
+	ast, log = _create_log(make)
+
+	manager = ljd.pipeline.PassManager([
+		log.pass_("a"),
+		log.pass_("b", ("a",), per_function=True)
+	])
+
+	manager.skip("a")
+
+	# Still satisfies the prerequisites of b
+	assert [pass_.name for pass_ in manager.schedule()] == ["b"]
+
+	manager.run(ast)
+
+	assert log.calls == [("b", "inner"), ("b", "outer")]
+
+	del log.calls[:]
+
+	manager.skip("a", False)
+	manager.run(ast)
+
+	assert log.calls == [("a", "outer"), ("b", "inner"), ("b", "outer")]
+
+
+def test_replace(make):
+	ast, log = _create_log(make)
+
+	manager = ljd.pipeline.PassManager([
+		log.pass_("a", per_function=True),
+		log.pass_("b", ("a",))
+	])
+
+	replaced = []
+
+	manager.replace("a", replaced.append)
+
+	pass_ = manager.schedule()[0]
+
+	assert pass_.name == "a" and pass_.per_function
+
+	manager.run(ast)
+
+	assert log.calls == [("b", "outer")]
+	assert [log.names[id(node)] for node in replaced] == ["inner", "outer"]
+
+
+def test_per_function_groups(make):
+	ast, log = _create_log(make)
+
+	manager = ljd.pipeline.PassManager([
+		log.pass_("a", per_function=True),
+		log.pass_("b", ("a",), per_function=True),
+		log.pass_("c", ("b",)),
+		log.pass_("d", ("c",), per_function=True)
+	])
+
+	manager.run(ast)
+
+	# A function is done with the whole group before the next one, the
+	# inner ones first, and the tree pass splits the groups
+	assert log.calls == [
+		("a", "inner"), ("b", "inner"),
+		("a", "outer"), ("b", "outer"),
+		("c", "outer"),
+		("d", "inner"), ("d", "outer")
+	]
+
+
+def test_hooks(make):
+	ast, log = _create_log(make)
+
+	manager = ljd.pipeline.PassManager([
+		log.pass_("a"),
+		log.pass_("b", ("a",), per_function=True)
+	])
+
+	hooked = []
+
+	def first(pass_, node, run):
+		hooked.append(("first", pass_.name))
+		run(node)
+
+	# The later hooks wrap the earlier ones
+	def second(pass_, node, run):
+		hooked.append(("second", pass_.name))
+
+		if pass_.name != "a":
+			run(node)
+
+	manager.add_hook(first)
+	manager.add_hook(second)
+
+	manager.run(ast)
+
+	assert hooked == [
+		("second", "a"),
+		("second", "b"), ("first", "b"),
+		("second", "b"), ("first", "b")
+	]
+
+	assert log.calls == [("b", "inner"), ("b", "outer")]
+
+
+def test_pass_timer(monkeypatch, make):
+	ast, log = _create_log(make)
+
+	clock = iter(range(100))
+	monkeypatch.setattr(time, "perf_counter", lambda: next(clock))
+
+	manager = ljd.pipeline.PassManager([
+		log.pass_("a"),
+		log.pass_("b", ("a",), per_function=True)
+	])
+
+	timer = ljd.pipeline.PassTimer()
+	manager.add_hook(timer)
+
+	manager.run(ast)
+
+	# Every run takes a tick, b runs for both of the functions
+	assert timer.totals == {"a": 1, "b": 2}
+
+	manager.run(ast)
+
+	assert timer.totals == {"a": 2, "b": 4}
@@ -0,0 +1,39 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import io
+
+import pytest
+
+import ljd.rawdump.parser
+import ljd.pseudoasm.instructions
+import ljd.pseudoasm.writer
+
+
+def test_partial_listing_on_failure(monkeypatch, dump_path):
+	header, prototype = ljd.rawdump.parser.parse(dump_path("loop"))
+
+	write_instruction = ljd.pseudoasm.instructions._write_instruction
+	calls = []
+
+	def failing_write(*args):
+		calls.append(args)
+
+		if len(calls) == 20:
+			raise RuntimeError("broken")
+
+		write_instruction(*args)
+
+	monkeypatch.setattr(ljd.pseudoasm.instructions, "_write_instruction",
+								failing_write)
+
+	fd = io.StringIO()
+
+	with pytest.raises(RuntimeError):
+		ljd.pseudoasm.writer.write(fd, header, prototype)
+
+	lines = fd.getvalue().splitlines()
+
+	assert "; Disassemble of " + dump_path("loop") in lines
+	assert any(line.lstrip().startswith("19\t") for line in lines)
@@ -0,0 +1,83 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import ljd.rawdump.scanner as scanner
+
+
+# The parser adds the FUNCF/FUNCV header, there is no such in the dump
+def _get_parsed_opcodes(prototype):
+	return tuple(instruction.opcode
+			for instruction in prototype.instructions[1:])
+
+
+def _get_scanned_opcodes(data, layout):
+	start = layout.instructions_offset
+	end = start + layout.instructions_count * 4
+
+	return tuple(data[start:end:4])
+
+
+def test_scan_matches_parser(dump_path, parse, collect_prototypes, dump_name,
+								dump_suffix):
+	path = dump_path(dump_name + dump_suffix)
+
+	summary = scanner.scan(path)
+
+	assert summary.error is None
+	assert summary.is_luajit
+	assert summary.is_stripped == (dump_suffix == "_s")
+
+	header, main = parse(dump_name + dump_suffix)
+	prototypes = collect_prototypes(main)
+
+	assert summary.version == header.version
+	assert summary.prototypes_count == len(prototypes)
+	assert summary.instructions_count == sum(
+			len(prototype.instructions) - 1
+				for prototype in prototypes)
+
+
+def test_walk_finds_instructions(dump_path, parse, collect_prototypes,
+						dump_name, dump_suffix):
+	path = dump_path(dump_name + dump_suffix)
+
+	with open(path, 'rb') as fd:
+		data = fd.read()
+
+	layouts = []
+	end = scanner.walk(data, 0, scanner.Summary(), layouts)
+
+	assert end == len(data)
+
+	header, main = parse(dump_name + dump_suffix)
+
+	scanned = sorted(_get_scanned_opcodes(data, layout)
+					for layout in layouts)
+	parsed = sorted(_get_parsed_opcodes(prototype)
+				for prototype in collect_prototypes(main))
+
+	assert scanned == parsed
+
+
+def test_scan_reports_truncated(tmp_path, dump_path):
+	with open(dump_path("ifs"), 'rb') as fd:
+		data = fd.read()
+
+	path = tmp_path / "truncated.luac"
+	path.write_bytes(data[:len(data) // 2])
+
+	summary = scanner.scan(str(path))
+
+	assert summary.is_luajit
+	assert summary.error is not None
+
+
+def test_scan_ignores_non_dumps(tmp_path):
+	path = tmp_path / "text.lua"
+	path.write_bytes(b"return 1\n")
+
+	summary = scanner.scan(str(path))
+
+	assert not summary.is_luajit
+	assert summary.error is None
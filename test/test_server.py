@@ -0,0 +1,210 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import socket
+import threading
+
+import pytest
+
+import ljd.client
+import ljd.server
+
+
+def _serve(tmp_path, **kwargs):
+	path = str(tmp_path / "ljd.sock")
+
+	server = ljd.server.Server(path, jobs=1, **kwargs)
+	thread = threading.Thread(target=server.serve_forever)
+	thread.start()
+
+	yield path
+
+	server.shutdown()
+	thread.join()
+	server.server_close()
+
+
+@pytest.fixture
+def server(tmp_path):
+	yield from _serve(tmp_path)
+
+
+@pytest.fixture
+def small_server(tmp_path):
+	yield from _serve(tmp_path, max_message_size=1024)
+
+
+@pytest.fixture
+def client(server):
+	client = ljd.client.Client(server)
+
+	yield client
+
+	client.close()
+
+
+def test_decompile(client, dump_path):
+	with open(dump_path("ifs"), 'rb') as fd:
+		data = fd.read()
+
+	response = client.decompile_bytes(data, "ifs.luac")
+
+	assert response["ok"]
+	assert "if" in response["output"]
+
+	response = client.decompile_file(dump_path("loop_s"), mode="asm")
+
+	assert response["ok"]
+	assert "FORI" in response["output"]
+
+
+@pytest.mark.parametrize("request_", (
+	[],
+	"path",
+	None,
+	{},
+	{"path": 1},
+	{"data": "not base64!"},
+	{"data": ""},
+	{"path": "a.luac", "mode": "bogus"},
+	{"path": "a.luac", "mode": ["lua"]},
+	{"path": "a.luac", "debuginfo": "none"},
+	{"path": "a.luac", "fallback": "bogus"},
+	{"path": "a.luac", "budget": 0},
+	{"path": "a.luac", "budget": "1"},
+	{"path": "a.luac", "budget": True},
+	{"path": "a.luac", "budget_steps": 1.5},
+	{"path": "a.luac", "budget_steps": -1}
+))
+def test_invalid_requests(client, request_):
+	response = client._request(request_)
+
+	assert not response["ok"]
+
+	# The connection is still served
+	response = client._request({"path": "/nonexistent.luac"})
+
+	assert not response["ok"]
+	assert "nonexistent" in response["error"]
+
+
+def test_fallbacks(client, dump_path):
+	response = client.decompile_file(dump_path("getter"))
+
+	assert response["ok"]
+	assert response["fallbacks"] == 0
+
+	# The loop and the if are over the budget
+	response = client.decompile_file(dump_path("getter"),
+						budget_steps=5)
+
+	assert response["ok"]
+	assert response["fallbacks"] == 2
+	assert "-- Failed to decompile: BudgetExceeded" in response["output"]
+
+	response = client.decompile_file(dump_path("getter"),
+						budget_steps=5, fallback="off")
+
+	assert not response["ok"]
+	assert "BudgetExceeded" in response["error"]
+
+
+def test_request_flags_reset(client, dump_path):
+	response = client.decompile_file(dump_path("primitive"),
+							fallback="all")
+
+	assert response["ok"]
+	assert response["fallbacks"] > 0
+
+	# The flags of the server again
+	response = client.decompile_file(dump_path("primitive"))
+
+	assert not response["ok"]
+	assert "AssertionError" in response["error"]
+
+
+def test_debuginfo(client, dump_path):
+	response = client.decompile_file(dump_path("getter"))
+
+	assert "return self.x" in response["output"]
+
+	response = client.decompile_file(dump_path("getter"),
+							debuginfo="skip")
+
+	assert response["ok"]
+	assert "return self.x" not in response["output"]
+
+
+def test_message_size(small_server, dump_path):
+	client = ljd.client.Client(small_server)
+
+	try:
+		response = client.decompile_bytes(b"\x00" * 1024)
+
+		assert not response["ok"]
+		assert "over the limit of 1024" in response["error"]
+
+		# The message is skipped, the connection is still served
+		response = client.decompile_file(dump_path("getter"))
+
+		assert response["ok"]
+	finally:
+		client.close()
+
+
+def test_bad_json(server):
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	sock.connect(server)
+
+	try:
+		sock.sendall(b"\x00\x00\x00\x03{]}")
+
+		assert not ljd.client.receive_message(sock)["ok"]
+
+		ljd.client.send_message(sock, {"path": "/nonexistent.luac"})
+
+		assert not ljd.client.receive_message(sock)["ok"]
+	finally:
+		sock.close()
+
+
+def test_truncated_message(server):
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	sock.connect(server)
+
+	try:
+		sock.sendall(b"\x00\x00\x01\x00{")
+		sock.shutdown(socket.SHUT_WR)
+
+		assert ljd.client.receive_message(sock) is None
+	finally:
+		sock.close()
+
+	client = ljd.client.Client(server)
+
+	try:
+		assert not client.decompile_file("/nonexistent.luac")["ok"]
+	finally:
+		client.close()
+
+
+def test_keeps_other_files(tmp_path):
+	path = tmp_path / "ljd.sock"
+	path.write_text("precious")
+
+	with pytest.raises(IOError):
+		ljd.server.Server(str(path), jobs=1)
+
+	assert path.read_text() == "precious"
+
+
+def test_replaces_stale_socket(tmp_path):
+	path = str(tmp_path / "ljd.sock")
+
+	stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	stale.bind(path)
+	stale.close()
+
+	server = ljd.server.Server(path, jobs=1)
+	server.server_close()
@@ -0,0 +1,149 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import base64
+import io
+import itertools
+import json
+import struct
+
+import pytest
+
+import ljd.batch
+import ljd.stream as stream
+
+
+def _read(path):
+	with open(path, 'rb') as fd:
+		return fd.read()
+
+
+def _run(data, framing, jobs=1, ordered=True):
+	records = stream.read_records(io.BytesIO(data), framing)
+
+	output = io.BytesIO()
+
+	for result in ljd.batch.run(records, jobs, ordered=ordered):
+		stream.write_record(output, framing, result)
+
+	return output.getvalue()
+
+
+def _parse_length_output(data):
+	records = []
+	pos = 0
+
+	while pos < len(data):
+		index, status, length = struct.unpack(">IBI", data[pos:pos + 9])
+		pos += 9
+
+		records.append((index, status, data[pos:pos + length]))
+		pos += length
+
+	return records
+
+
+def test_length_framing(dump_path):
+	dumps = [_read(dump_path(name)) for name in ("ifs", "breaks_s")]
+	dumps.append(b"garbage")
+
+	data = b"".join(struct.pack(">I", len(dump)) + dump for dump in dumps)
+
+	records = _parse_length_output(_run(data, stream.FRAMING_LENGTH))
+
+	assert [(index, status) for index, status, text in records] == [
+		(0, stream.STATUS_OK),
+		(1, stream.STATUS_OK),
+		(2, stream.STATUS_ERROR)
+	]
+
+	assert b"if" in records[0][2]
+
+
+@pytest.mark.parametrize("jobs", (1, 2))
+@pytest.mark.parametrize("tail", (b"\x00\x01", b"\x00\x00\x01\x00abc"),
+					ids=("header", "data"))
+def test_truncated_length_record(dump_path, jobs, tail):
+	dump = _read(dump_path("getter"))
+	data = (struct.pack(">I", len(dump)) + dump) * 3 + tail
+
+	records = _parse_length_output(_run(data, stream.FRAMING_LENGTH, jobs))
+
+	# The results before the broken record are not lost
+	assert [(index, status) for index, status, text in records] == [
+		(0, stream.STATUS_OK),
+		(1, stream.STATUS_OK),
+		(2, stream.STATUS_OK),
+		(3, stream.STATUS_ERROR)
+	]
+
+	assert b"Truncated record" in records[3][2]
+
+
+def test_jsonl_framing(dump_path):
+	dump = base64.b64encode(_read(dump_path("ifs"))).decode("ascii")
+
+	lines = [
+		json.dumps({"data": dump, "id": "first", "name": "ifs.luac"}),
+		json.dumps({"id": "no data"}),
+		json.dumps([1, 2]),
+		"{not json",
+		"",
+		json.dumps({"data": 5}),
+		json.dumps({"data": "!!!"}),
+		json.dumps({"data": dump})
+	]
+
+	data = "\n".join(lines).encode("utf-8") + b"\n"
+
+	output = _run(data, stream.FRAMING_JSONL).decode("utf-8")
+	records = [json.loads(line) for line in output.splitlines()]
+
+	assert [record["id"] for record in records] == [
+		"first", "no data", 2, 3, 4, 5, 6
+	]
+
+	assert [record["ok"] for record in records] == [
+		True, False, False, False, False, False, True
+	]
+
+	assert records[0]["output"] == records[-1]["output"]
+
+
+@pytest.mark.parametrize("ordered", (True, False))
+def test_parallel_stream(dump_path, ordered):
+	dumps = [_read(dump_path(name + "_s")) for name in ("breaks", "getter")] * 8
+	data = b"".join(struct.pack(">I", len(dump)) + dump for dump in dumps)
+
+	records = _parse_length_output(_run(data, stream.FRAMING_LENGTH, 2,
+								ordered))
+
+	indices = [index for index, status, text in records]
+
+	if ordered:
+		assert indices == list(range(len(dumps)))
+	else:
+		assert sorted(indices) == list(range(len(dumps)))
+
+	assert all(status == stream.STATUS_OK
+			for index, status, text in records)
+
+
+@pytest.mark.parametrize("ordered", (True, False))
+def test_bounded_read_ahead(ordered):
+	pulled = []
+
+	def sources():
+		for index in itertools.count():
+			pulled.append(index)
+			yield ljd.batch.Buffer(str(index), b"", str(index), index)
+
+	results = ljd.batch.run(sources(), 2, ordered=ordered)
+
+	for result in itertools.islice(results, 10):
+		assert result.error is not None
+
+	results.close()
+
+	assert len(pulled) < 200
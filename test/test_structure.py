@@ -0,0 +1,184 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import itertools
+
+import pytest
+
+import ljd.ast.builder
+import ljd.ast.helpers
+import ljd.ast.nodes as nodes
+import ljd.ast.structure as structure
+import ljd.ast.traverse as traverse
+
+
+_COMPARED_TYPES = (nodes.Identifier, nodes.Constant, nodes.TableElement)
+
+
+# helpers.is_equal before the structure keys. The keys also keep 1 apart from
+# 1.0, the old one only does that with the strict flag.
+def _old_is_equal(a, b, strict=False):
+	if type(a) != type(b):
+		return False
+
+	if isinstance(a, nodes.Identifier):
+		return a.type == b.type and a.slot == b.slot
+	elif isinstance(a, nodes.TableElement):
+		return _old_is_equal(a.table, b.table, strict)		\
+			and _old_is_equal(a.key, b.key, strict)
+	else:
+		assert isinstance(a, nodes.Constant)
+
+		if strict and type(a.value) != type(b.value):
+			return False
+
+		return a.type == b.type and a.value == b.value
+
+
+def _is_comparable(node):
+	if isinstance(node, nodes.TableElement):
+		return _is_comparable(node.table) and _is_comparable(node.key)
+
+	return isinstance(node, _COMPARED_TYPES)
+
+
+class _NodesCollector(traverse.Visitor):
+	def __init__(self):
+		self.result = []
+
+	def _visit_node(self, handler, node):
+		if _is_comparable(node):
+			self.result.append(node)
+
+		traverse.Visitor._visit_node(self, handler, node)
+
+
+def _build(parse, name):
+	header, prototype = parse(name)
+
+	return ljd.ast.builder.build(prototype)
+
+
+@pytest.fixture(autouse=True)
+def fresh_keys():
+	structure.invalidate()
+	yield
+	structure.invalidate()
+
+
+def test_old_semantics(parse, dump_name):
+	collector = _NodesCollector()
+	traverse.traverse(collector, _build(parse, dump_name))
+
+	compared = collector.result[:300]
+
+	assert compared
+
+	equal = 0
+
+	for a, b in itertools.combinations(compared, 2):
+		result = structure.is_equal(a, b)
+
+		assert result == _old_is_equal(a, b, True)
+
+		equal += result
+
+	assert equal > 0
+
+
+def test_old_semantics_numbers(make):
+	integer = make.constant(1)
+	float_integer = make.constant(1.0)
+
+	# Equal for the old one, which compared the values only
+	assert _old_is_equal(integer, float_integer)
+	assert not structure.is_equal(integer, float_integer)
+
+	nan = make.constant(float("nan"), nodes.Constant.T_FLOAT)
+
+	assert structure.is_equal(nan, nan)
+	assert not structure.is_equal(nan, make.constant(nan.value,
+						nodes.Constant.T_FLOAT))
+
+	assert not structure.is_equal(make.constant(True), integer)
+	assert structure.is_equal(make.string("1"), make.string("1"))
+
+
+def test_old_semantics_names(make):
+	a = make.identifier(3)
+	a.name = "a"
+
+	b = make.identifier(3)
+	b.name = "b"
+
+	assert structure.is_equal(a, b)
+	assert not structure.is_equal(a, make.identifier(3,
+					nodes.Identifier.T_LOCAL))
+
+
+def test_keys_are_kept_until_invalidate(make):
+	a = make.element(make.identifier(0), make.constant(1))
+	b = make.element(make.identifier(0), make.constant(1))
+
+	assert ljd.ast.helpers.is_equal(a, b)
+
+	b.key.value = 2
+
+	# The changed node keeps its key until the next pass run
+	assert ljd.ast.helpers.is_equal(a, b)
+
+	structure.invalidate()
+
+	assert not ljd.ast.helpers.is_equal(a, b)
+
+	b.key.value = 1
+
+	structure.invalidate()
+
+	assert ljd.ast.helpers.is_equal(a, b)
+
+
+def test_find_duplicates(make):
+	statements = nodes.StatementsList()
+
+	function = make.identifier(0, nodes.Identifier.T_BUILTIN)
+
+	def call(value):
+		table = make.identifier(1)
+
+		return make.call(function, make.element(table,
+						make.constant(value)))
+
+	first = call(1)
+	second = call(1)
+	other = call(2)
+
+	statements.contents = [first, other, second]
+
+	groups = structure.find_duplicates(statements)
+
+	assert len(groups) == 2
+
+	calls, elements = groups
+
+	assert calls[0] is first and calls[1] is second
+	assert elements == [first.arguments.contents[0],
+					second.arguments.contents[0]]
+
+
+def test_find_duplicates_dump(parse):
+	ast = _build(parse, "ifs")
+
+	groups = structure.find_duplicates(ast)
+
+	assert groups
+
+	for group in groups:
+		assert len(set(map(id, group))) == len(group)
+
+		for node in group[1:]:
+			assert structure.is_equal(group[0], node)
+
+			if _is_comparable(node):
+				assert _old_is_equal(group[0], node)
@@ -0,0 +1,140 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import pytest
+
+import ljd.ast.builder
+import ljd.ast.unwarper
+
+
+# The boolexpr dumps are "local a, b, c, d, e, f = ..." and then x (returned)
+# is a chain of (a == i and b ~= i) ors for i in 0..39
+BOOLEXPR_TERMS = 40
+
+
+def test_flow_only_shapes(parse, collect_functions):
+	header, prototype = parse("getter")
+
+	functions = collect_functions(ljd.ast.builder.build(prototype))
+
+	# The main function and get/set just flow, the loop and the if don't
+	assert [function._is_flow_only for function in functions] \
+					== [True, True, True, False, False]
+
+
+@pytest.mark.parametrize("name", ("getter", "getter_s", "breaks", "ifs"))
+def test_flow_only_path_output(monkeypatch, parse, decompile, name):
+	header, prototype = parse(name)
+
+	fast = decompile(prototype)
+
+	monkeypatch.setattr(ljd.ast.builder, "_is_flow_only",
+							lambda blocks: False)
+
+	assert decompile(prototype) == fast
+
+
+def _get_boolexpr_chain(a, b):
+	terms = ("({0} == {2} and {1} ~= {2})".format(a, b, i)
+					for i in range(BOOLEXPR_TERMS))
+
+	return " or ".join(terms)
+
+
+def test_long_chain(parse, decompile):
+	header, prototype = parse("boolexpr")
+
+	result = decompile(prototype)
+
+	assert result == "local a, b, c, d, e, f = ...\n" \
+			"local x = " + _get_boolexpr_chain("a", "b") + "\n" \
+			"\n" \
+			"return x\n"
+
+
+def test_long_chain_stripped(parse, decompile):
+	header, prototype = parse("boolexpr_s")
+
+	result = decompile(prototype)
+
+	assert result == "slot0, slot1, slot2, slot3, slot4, slot5 = ...\n" \
+			"\n" \
+			"return " + _get_boolexpr_chain("slot0", "slot1") + "\n"
+
+
+# Both take the start block first and the end block and the search last
+def _count_searches(monkeypatch, name):
+	uncached = getattr(ljd.ast.unwarper, name)
+	calls = []
+
+	def counted(*args):
+		calls.append((id(args[-1]), args[0], args[-2]))
+		return uncached(*args)
+
+	monkeypatch.setattr(ljd.ast.unwarper, name, counted)
+
+	return calls
+
+
+class _Counting(dict):
+	gets = 0
+
+	def get(self, key, default=None):
+		_Counting.gets += 1
+		return dict.get(self, key, default)
+
+
+def test_long_chain_searches(monkeypatch, parse, decompile):
+	expressions = _count_searches(monkeypatch,
+					"_find_expressions_uncached")
+	subexpressions = _count_searches(monkeypatch,
+					"_find_subexpressions_uncached")
+
+	original_init = ljd.ast.unwarper._ExpressionsSearch.__init__
+
+	def counting_init(self, blocks):
+		original_init(self, blocks)
+		self.scans = _Counting()
+
+	monkeypatch.setattr(ljd.ast.unwarper._ExpressionsSearch, "__init__",
+								counting_init)
+	monkeypatch.setattr(_Counting, "gets", 0)
+
+	header, prototype = parse("boolexpr")
+
+	decompile(prototype)
+
+	# Every range of the blocks is searched once
+	assert len(set(expressions)) == len(expressions)
+	assert len(set(subexpressions)) == len(subexpressions)
+
+	# A scan step per state - linear in the chain length, about 3300 steps
+	# without the memo
+	assert _Counting.gets < BOOLEXPR_TERMS * 10
+
+
+class _Forgetful(dict):
+	def __setitem__(self, key, value):
+		pass
+
+
+@pytest.mark.parametrize("name", ("getter", "breaks", "ifs", "boolexpr"))
+def test_search_memo_output(monkeypatch, parse, decompile, name):
+	header, prototype = parse(name)
+
+	memoized = decompile(prototype)
+
+	original_init = ljd.ast.unwarper._ExpressionsSearch.__init__
+
+	def forgetful_init(self, blocks):
+		original_init(self, blocks)
+
+		self.expressions = _Forgetful()
+		self.subexpressions = _Forgetful()
+		self.scans = _Forgetful()
+
+	monkeypatch.setattr(ljd.ast.unwarper._ExpressionsSearch, "__init__",
+								forgetful_init)
+
+	assert decompile(prototype) == memoized
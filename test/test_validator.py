@@ -0,0 +1,240 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import random
+
+import pytest
+
+import ljd.ast.builder
+import ljd.ast.nodes as nodes
+import ljd.ast.validator as validator
+import ljd.pipeline
+
+
+# function () local a; a = 1; return a.x end, unwarped
+def _function(make):
+	function = nodes.FunctionDefinition()
+
+	local = make.identifier(0, nodes.Identifier.T_LOCAL, "a")
+
+	value = make.element(make.identifier(0, nodes.Identifier.T_LOCAL, "a"),
+							make.string("x"))
+
+	ret = nodes.Return()
+	ret.returns.contents = [value]
+
+	function.statements.contents = [
+		make.assignment(local, make.constant(1)),
+		ret
+	]
+
+	return function
+
+
+def _assignment(function):
+	return function.statements.contents[0]
+
+
+def _value(function):
+	return function.statements.contents[1].returns.contents[0]
+
+
+def _wrong_child_type(function, make):
+	_assignment(function).expressions = nodes.VariablesList()
+
+
+def _missing_field(function, make):
+	_value(function).table = None
+
+
+def _expression_as_statement(function, make):
+	function.statements.contents.append(make.constant(2))
+
+
+def _foreign_child(function, make):
+	function.statements.contents[1].returns.contents.append(object())
+
+
+def _operator_type(function, make):
+	operator = nodes.BinaryOperator()
+	operator.type = -1
+	operator.left = make.constant(1)
+	operator.right = make.constant(2)
+
+	_assignment(function).expressions.contents = [operator]
+
+
+def _constant_type(function, make):
+	_assignment(function).expressions.contents[0].type = -1
+
+
+def _unnamed_local(function, make):
+	_assignment(function).destinations.contents[0].name = None
+
+
+def _negative_slot(function, make):
+	_assignment(function).destinations.contents[0].slot = -1
+
+
+def _mixed_records(function, make):
+	constructor = nodes.TableConstructor()
+
+	array = nodes.ArrayRecord()
+	array.value = make.constant(1)
+
+	record = nodes.TableRecord()
+	record.key = make.string("k")
+	record.value = make.constant(2)
+
+	constructor.array.contents = [array, record]
+
+	_assignment(function).expressions.contents = [constructor]
+
+
+_BREAKS = {
+	"wrong child type": (_wrong_child_type, "Invalid node type in "
+				"Assignment.expressions: VariablesList"),
+	"missing field": (_missing_field, "Invalid node type in "
+				"TableElement.table: NoneType"),
+	"expression as statement": (_expression_as_statement,
+				"Invalid node type in StatementsList.contents"),
+	"foreign child": (_foreign_child,
+				"Invalid node type in ExpressionsList.contents"),
+	"operator type": (_operator_type, "Invalid operator type: -1"),
+	"constant type": (_constant_type, "Invalid constant type: -1"),
+	"unnamed local": (_unnamed_local, "Invalid identifier type"),
+	"negative slot": (_negative_slot, "Invalid slot: -1"),
+	"mixed records": (_mixed_records, "Mixed array and hash records")
+}
+
+
+def _break(function, name, make):
+	breaker, message = _BREAKS[name]
+	breaker(function, make)
+
+	return message
+
+
+def test_valid(make):
+	validator.validate(_function(make), warped=False)
+
+
+@pytest.mark.parametrize("name", sorted(_BREAKS))
+def test_invalid(make, name):
+	function = _function(make)
+
+	message = _break(function, name, make)
+
+	with pytest.raises(validator.ValidationError) as error:
+		validator.validate(function, warped=False)
+
+	assert message in str(error.value)
+
+
+def test_unknown_root():
+	with pytest.raises(validator.ValidationError) as error:
+		validator.validate(object())
+
+	assert "Unknown node" in str(error.value)
+
+
+def test_warped_tables(parse, make):
+	header, prototype = parse("getter")
+
+	warped = ljd.ast.builder.build(prototype)
+
+	validator.validate(warped, warped=True)
+
+	# The blocks are not statements and the statements are not blocks
+	with pytest.raises(validator.ValidationError):
+		validator.validate(warped, warped=False)
+
+	with pytest.raises(validator.ValidationError):
+		validator.validate(_function(make), warped=True)
+
+
+def test_decompiled(parse):
+	header, prototype = parse("getter")
+
+	manager = ljd.pipeline.create_default_manager(validate=100)
+
+	validator.validate(ljd.pipeline.decompile(prototype, manager),
+								warped=False)
+
+
+def test_nested(make):
+	outer = _function(make)
+	inner = _function(make)
+
+	_assignment(outer).expressions.contents = [inner]
+
+	_break(inner, "operator type", make)
+
+	validator.validate(outer, warped=False, nested=False)
+
+	with pytest.raises(validator.ValidationError):
+		validator.validate(outer, warped=False)
+
+
+def _sample(functions, percent):
+	sampled = []
+
+	for function in functions:
+		try:
+			validator.validate_sampled(function, percent, False)
+		except validator.ValidationError:
+			sampled.append(function)
+
+	return sampled
+
+
+def _create_invalid(make, count):
+	functions = [_function(make) for i in range(count)]
+
+	for function in functions:
+		_break(function, "constant type", make)
+
+	return functions
+
+
+def test_sampled_none(make):
+	functions = _create_invalid(make, 100)
+
+	assert _sample(functions, 0) == []
+
+
+def test_sampled_all(make):
+	functions = _create_invalid(make, 100)
+
+	assert _sample(functions, 100) == functions
+
+
+def _get_positions(functions, sampled):
+	sampled = set(map(id, sampled))
+
+	return [i for i, function in enumerate(functions)
+					if id(function) in sampled]
+
+
+def test_sampled_subset(monkeypatch, make):
+	monkeypatch.setattr(random, "random", random.Random(1).random)
+
+	functions = _create_invalid(make, 1000)
+
+	sampled = _sample(functions, 30)
+
+	assert 200 < len(sampled) < 400
+
+	# The pick is kept, so the unwarped check sees the same ones
+	assert _sample(functions, 30) == sampled
+	assert _sample(functions, 100) == sampled
+	assert _sample(functions, 0) == sampled
+
+	# And it is the same for the same random numbers
+	monkeypatch.setattr(random, "random", random.Random(1).random)
+
+	again = _create_invalid(make, 1000)
+
+	assert _get_positions(again, _sample(again, 30)) \
+				== _get_positions(functions, sampled)
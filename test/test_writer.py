@@ -0,0 +1,35 @@
+#
+# Copyright (C) 2013 Andrian Nord. See Copyright Notice in main.py
+#
+
+import ljd.ast.nodes as nodes
+import ljd.pipeline
+
+
+def _local(make, slot, name):
+	return make.identifier(slot, nodes.Identifier.T_LOCAL, name)
+
+
+# The marks of the visited nodes are left on the tree
+def test_write_twice(parse, write_lua):
+	header, prototype = parse("getter")
+
+	ast = ljd.pipeline.decompile(prototype)
+
+	text = write_lua(ast)
+
+	assert "function" in text
+	assert write_lua(ast) == text
+
+
+# A node shared by the parents is written in each of them
+def test_shared_node(make, write_lua):
+	value = make.constant(1)
+
+	function = nodes.FunctionDefinition()
+	function.statements.contents = [
+		make.assignment(_local(make, 0, "a"), value),
+		make.assignment(_local(make, 1, "b"), value)
+	]
+
+	assert write_lua(function) == "a = 1\nb = 1\n"